@@ -1,5 +1,12 @@
 
+import asyncio
+import importlib.util
 import os
+import weakref
+from functools import lru_cache
+
+import httpx
+import openai
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -9,3 +16,168 @@ load_dotenv(os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env'))
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 OPENAI_API_BASE = os.getenv("OPENAI_API_BASE")
 OPENAI_MODEL = os.getenv("OPENAI_MODEL")
+
+# Shared HTTP connection pool
+# One keep-alive pool per process, so repeated calls skip the TCP + TLS handshake
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "50"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "120"))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "30"))
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "2"))
+# HTTP/2 multiplexes many requests over one connection (needs: pip install "httpx[http2]")
+HTTP2 = os.getenv("HTTP2", "false").lower() in ("1", "true", "yes")
+# Open the connection while the lab starts instead of on the first real call
+HTTP_WARMUP = os.getenv("HTTP_WARMUP", "false").lower() in ("1", "true", "yes")
+
+# Cassettes (see core/cassette.py) - "record" stores every API response,
+# "replay" serves them back offline with no API key or network needed
+CASSETTE_MODE = os.getenv("CASSETTE_MODE", "off").lower()
+CASSETTE_PATH = os.getenv(
+    "CASSETTE_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), ".cache", "cassettes", "default.sqlite"),
+)
+# Seconds each replayed response waits, or "recorded" for the original latency
+CASSETTE_LATENCY = os.getenv("CASSETTE_LATENCY", "0")
+if CASSETTE_MODE == "replay":
+    # The SDK refuses to start without a key; replayed calls never send it
+    OPENAI_API_KEY = OPENAI_API_KEY or "replay"
+
+# Token estimator (see core/tokens.py) - BPE vocabulary is downloaded once and reused offline
+TIKTOKEN_CACHE_DIR = os.getenv(
+    "TIKTOKEN_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), ".cache", "tiktoken"),
+)
+
+# Model prices in USD per 1K tokens (used for pre-flight cost projections);
+# cached_input is what prompt tokens served from the provider's prompt cache cost
+MODEL_PRICES = {
+    "gpt-4.1-mini": {"input": 0.0008, "cached_input": 0.0002, "output": 0.0032},
+    "gpt-4.1-nano": {"input": 0.0001, "cached_input": 0.000025, "output": 0.0004},
+    "gpt-4.1": {"input": 0.002, "cached_input": 0.0005, "output": 0.008},
+    "gpt-4o-mini": {"input": 0.00015, "cached_input": 0.000075, "output": 0.0006},
+    "gemini-2.5-flash": {"input": 0.0003, "cached_input": 0.000075, "output": 0.0025},
+    "gemini-2.5-pro": {"input": 0.00125, "cached_input": 0.00031, "output": 0.01},
+}
+
+
+def get_model_price(model=None):
+    """Per-1K-token prices for `model` (dated names like gpt-4.1-mini-2025-04-14 match their base)"""
+    model = model or OPENAI_MODEL or ""
+    for name in sorted(MODEL_PRICES, key=len, reverse=True):
+        if model.startswith(name):
+            return MODEL_PRICES[name]
+    raise KeyError(f"No price configured for model '{model}' - add it to settings.MODEL_PRICES")
+
+
+def _transport_options():
+    """Pool and protocol options shared by the sync and async transports"""
+    return {
+        "limits": httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+        ),
+        # Fall back to HTTP/1.1 keep-alive when the h2 package is missing
+        "http2": HTTP2 and importlib.util.find_spec("h2") is not None,
+    }
+
+
+def _wrap_transport(transport):
+    """Put the cassette (when CASSETTE_MODE is set) in front of the network"""
+    if CASSETTE_MODE in ("record", "replay"):
+        from core.cassette import CassetteTransport, get_cassette
+
+        transport = CassetteTransport(transport, get_cassette(), CASSETTE_MODE, CASSETTE_LATENCY)
+    return transport
+
+
+@lru_cache(maxsize=None)
+def get_http_client():
+    """Process-wide sync HTTP client (one connection pool for every lab)"""
+    client = httpx.Client(
+        transport=_wrap_transport(httpx.HTTPTransport(**_transport_options())),
+        timeout=httpx.Timeout(HTTP_TIMEOUT, connect=10.0),
+    )
+    # Nothing to warm up when responses come from a cassette
+    if HTTP_WARMUP and CASSETTE_MODE != "replay":
+        warm_up(client)
+    return client
+
+
+class LoopLocalTransport(httpx.AsyncBaseTransport):
+    """AsyncHTTPTransport with one connection pool per event loop.
+
+    Pooled connections belong to the loop that opened them, so a second
+    asyncio.run() - or a loop in another thread - gets a pool of its own
+    instead of reusing sockets from a closed loop.
+    """
+
+    def __init__(self):
+        self._transports = weakref.WeakKeyDictionary()
+
+    def _transport(self) -> httpx.AsyncHTTPTransport:
+        loop = asyncio.get_running_loop()
+        transport = self._transports.get(loop)
+        if transport is None:
+            transport = self._transports[loop] = httpx.AsyncHTTPTransport(**_transport_options())
+        return transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        return await self._transport().handle_async_request(request)
+
+    async def aclose(self) -> None:
+        transport = self._transports.pop(asyncio.get_running_loop(), None)
+        if transport is not None:
+            await transport.aclose()
+
+
+@lru_cache(maxsize=None)
+def get_async_http_client():
+    """Process-wide async HTTP client, safe to use from any number of event loops"""
+    return httpx.AsyncClient(
+        transport=_wrap_transport(LoopLocalTransport()),
+        timeout=httpx.Timeout(HTTP_TIMEOUT, connect=10.0),
+    )
+
+
+def warm_up(client=None):
+    """Open a pooled connection to the API so the first real call skips the handshake"""
+    client = client or get_http_client()
+    try:
+        client.get(OPENAI_API_BASE or "https://api.openai.com/v1")
+    except httpx.HTTPError:
+        pass
+
+
+async def async_warm_up(client=None):
+    """Async version of warm_up()"""
+    client = client or get_async_http_client()
+    try:
+        await client.get(OPENAI_API_BASE or "https://api.openai.com/v1")
+    except httpx.HTTPError:
+        pass
+
+
+@lru_cache(maxsize=None)
+def get_openai_client():
+    """Shared openai.OpenAI client on top of the pooled HTTP client"""
+    return openai.OpenAI(
+        api_key=OPENAI_API_KEY,
+        base_url=OPENAI_API_BASE,
+        timeout=HTTP_TIMEOUT,
+        max_retries=HTTP_MAX_RETRIES,
+        http_client=get_http_client(),
+    )
+
+
+@lru_cache(maxsize=None)
+def get_async_openai_client():
+    """Shared openai.AsyncOpenAI client on top of the pooled async HTTP client"""
+    return openai.AsyncOpenAI(
+        api_key=OPENAI_API_KEY,
+        base_url=OPENAI_API_BASE,
+        timeout=HTTP_TIMEOUT,
+        max_retries=HTTP_MAX_RETRIES,
+        http_client=get_async_http_client(),
+    )
+
@@ -0,0 +1,69 @@
+"""
+Token Estimator
+Count prompt tokens and estimate a call's cost BEFORE paying for it.
+
+Token counts come from tiktoken's BPE vocabulary. The vocabulary file is
+cached on disk (settings.TIKTOKEN_CACHE_DIR), so after the first download it
+loads offline. When the vocabulary cannot be loaded at all, a ~4 characters
+per token estimate is used instead.
+
+    tokens = count_message_tokens([{"role": "user", "content": prompt}])
+    cost = estimate_cost(tokens, expected_output_tokens=200)
+"""
+
+import os
+from functools import lru_cache
+from typing import Iterable, Optional
+
+from core import settings
+
+# Every chat message costs a few tokens of framing on top of its content,
+# and every reply is primed with a few more (OpenAI chat format)
+TOKENS_PER_MESSAGE = 3
+TOKENS_PER_REPLY = 3
+CHARS_PER_TOKEN = 4
+DEFAULT_ENCODING = "o200k_base"
+
+
+@lru_cache(maxsize=None)
+def get_encoding(model: Optional[str] = None):
+    """tiktoken encoding for `model`, loaded once per process (None when unavailable)"""
+    os.environ.setdefault("TIKTOKEN_CACHE_DIR", settings.TIKTOKEN_CACHE_DIR)
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model or settings.OPENAI_MODEL or "")
+        except KeyError:
+            return tiktoken.get_encoding(DEFAULT_ENCODING)
+    except Exception:
+        # Vocabulary not cached and no network - fall back to the estimate
+        return None
+
+
+def count_text(text: str, model: Optional[str] = None) -> int:
+    """Tokens in a plain string"""
+    encoding = get_encoding(model)
+    if encoding is None:
+        return max(1, -(-len(text) // CHARS_PER_TOKEN)) if text else 0
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def count_message_tokens(messages: Iterable[dict], model: Optional[str] = None) -> int:
+    """Input tokens for a chat.completions `messages` list"""
+    total = TOKENS_PER_REPLY
+    for message in messages:
+        total += (TOKENS_PER_MESSAGE + count_text(message.get("role", "user"), model)
+                  + count_text(str(message.get("content") or ""), model))
+    return total
+
+
+def estimate_cost(input_tokens: int, expected_output_tokens: int, model: Optional[str] = None) -> Optional[float]:
+    """USD for a call of this size, or None when `model` has no entry in settings.MODEL_PRICES"""
+    try:
+        price = settings.get_model_price(model)
+    except KeyError:
+        return None
+    return input_tokens / 1000 * price["input"] + expected_output_tokens / 1000 * price["output"]
@@ -7,6 +7,13 @@ Learn what libraries we need for AI API calls.
 import openai
 import os
 
-print("Step 1 Complete: Libaries imported!")
-print("- openai: For making an API calls")
-print(" -os: For accessing environment variables")
+
+def main(client=None):
+    print("Step 1 Complete: Libaries imported!")
+    print("- openai: For making an API calls")
+    print(" -os: For accessing environment variables")
+
+
+if __name__ == "__main__":
+    main()
+
@@ -4,7 +4,6 @@ Learn how to connect to OpenAI's servers.
 """
 
 import sys
-import openai
 import os 
 
 # Add parent directory to sys.path to allow importing from core
@@ -15,12 +14,18 @@ from core import settings
 # The OpenAI client needs two things:
 # 1. API Key - Your authentication (like a password)
 # 2. Base URL - Where to send requests (like an address)
+#
+# settings.get_openai_client() builds it ONCE with both values and a
+# keep-alive connection pool, so every task reuses the same connection.
 
-client = openai.OpenAI(
-    api_key = settings.OPENAI_API_KEY,
-    base_url = settings.OPENAI_API_BASE
-)
 
-print("Step 2 Complete: Connected to OpenAI!")
-print(f" - API Key: {settings.OPENAI_API_KEY[:10]}...")
-print(f" - Base URL: {os.getenv("OPENAI_API_BASE")}")
\ No newline at end of file
+def main(client=None):
+    client = client or settings.get_openai_client()
+
+    print("Step 2 Complete: Connected to OpenAI!")
+    print(f" - API Key: {settings.OPENAI_API_KEY[:10]}...")
+    print(f" - Base URL: {os.getenv("OPENAI_API_BASE")}")
+
+
+if __name__ == "__main__":
+    main()
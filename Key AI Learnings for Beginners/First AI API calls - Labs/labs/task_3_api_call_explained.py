@@ -3,7 +3,6 @@ Task 3: Making Your First API Call
 Understand EVERY part of the chat completion call.
 """
 
-import openai
 import sys
 import os
 
@@ -12,11 +11,6 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from core import settings 
 
-client = openai.OpenAI(
-    api_key = settings.OPENAI_API_KEY,
-    base_url = settings.OPENAI_API_BASE
-)
-
 # ==========================================
 # UNDERSTANDING THE API CALL STRUCTURE
 # ==========================================
@@ -30,25 +24,6 @@ client = openai.OpenAI(
 # - content: What they are saying
 # ==========================================
 
-# TODO: Read each line below carefully to understand what it does
-
-try:
-    response = client.chat.completions.create(
-        model =  settings.OPENAI_MODEL,
-        messages = [
-            {
-                "role": "user",
-                "content": "Hello AI, please introduce yourself...!"
-            }
-        ],
-        timeout=30.0
-    )
-    api_error = None
-except Exception as e:
-    print(f"Error during API call: {e}")
-    response = None
-    api_error = e
-
 # ==========================================
 # REAL RESPONSE OBJECT STRUCTURE
 # This is an ACTUAL response from OpenAI:
@@ -93,28 +68,63 @@ ChatCompletion(
 )
 """
 
-# Once you uncomment and run the code above, this will execute:
 
-try:
-    if 'response' in locals() and response:
-        print(f"\n\nResponse: {response} \n")
-        ai_text = response.choices[0].message.content
+def main(client=None):
+    """Make the call and explain the result - returns the response (None on failure)"""
+    client = client or settings.get_openai_client()
+
+    # TODO: Read each line below carefully to understand what it does
+
+    try:
+        response = client.chat.completions.create(
+            model =  settings.OPENAI_MODEL,
+            messages = [
+                {
+                    "role": "user",
+                    "content": "Hello AI, please introduce yourself...!"
+                }
+            ],
+            timeout=30.0
+        )
+        api_error = None
+    except Exception as e:
+        print(f"Error during API call: {e}")
+        response = None
+        api_error = e
 
-        print("API call successful!!")
-        print(f"AI said: {ai_text}")
+    # Once you uncomment and run the code above, this will execute:
 
-        print(f"Total tokens used: {response.usage.total_tokens}")
+    try:
+        if 'response' in locals() and response:
+            print(f"\n\nResponse: {response} \n")
+            ai_text = response.choices[0].message.content
+
+            print("API call successful!!")
+            print(f"AI said: {ai_text}")
+
+            print(f"Total tokens used: {response.usage.total_tokens}")
+            # Prompts of 1024+ tokens are cached by OpenAI: a repeated leading prefix
+            # (static instructions first, the changing part last) is billed at the cached rate
+            details = response.usage.prompt_tokens_details
+            cached = (details.cached_tokens or 0) if details else 0
+            print(f"Cached prompt tokens: {cached} of {response.usage.prompt_tokens}")
 
-    else:
-        print("API call failed")
-        if api_error:
-             print(f"Reason: {api_error}")
         else:
-             print("Required Parameters missing or invalid")
-             print(f"1. model: {settings.OPENAI_MODEL}")
-             print("2. messages: [{'role': 'user', 'content': 'your message'}]")
-
-except NameError:
-    print("\n Required values:")
-    print(f" - model: {settings.OPENAI_MODEL}")
-    print(" - messages: [{'role': 'user', 'content': 'your message'}]")
+            print("API call failed")
+            if api_error:
+                 print(f"Reason: {api_error}")
+            else:
+                 print("Required Parameters missing or invalid")
+                 print(f"1. model: {settings.OPENAI_MODEL}")
+                 print("2. messages: [{'role': 'user', 'content': 'your message'}]")
+
+    except NameError:
+        print("\n Required values:")
+        print(f" - model: {settings.OPENAI_MODEL}")
+        print(" - messages: [{'role': 'user', 'content': 'your message'}]")
+
+    return response
+
+
+if __name__ == "__main__":
+    main()
@@ -4,7 +4,6 @@ Learn the EXACT path to get the AI's answer from the response object.
 """
 
 import sys
-import openai
 import os
 
 # Add parent directory to sys.path to allow importing from core
@@ -12,67 +11,73 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from core import settings
 
-client = openai.OpenAI(
-    api_key = settings.OPENAI_API_KEY,
-    base_url = settings.OPENAI_API_BASE
-)
 
-# Make a simple API call to get a response
-response = client.chat.completions.create(
-    model = settings.OPENAI_MODEL,
-    messages = [{
-        "role" : "user",
-        "content": "What is Python is one sentence and why its been used for AI and Machine Learning?" 
-    }]
-)
+def main(client=None):
+    """Call the API and pull the answer out of the response - returns the response"""
+    client = client or settings.get_openai_client()
 
-# ==========================================
-# THE MAGIC PATH TO THE AI'S ANSWER
-# ==========================================
-#
-# After making an API call, the AI's text is ALWAYS at:
-# response.choices[0].message.content
-#
-# Let's understand each part:
-# ┌─────────┐     response: The complete response object from OpenAI
-# │response │
-# └────┬────┘
-#      │
-#      ▼
-# ┌─────────┐     .choices: List of possible responses (usually just one)
-# │.choices │
-# └────┬────┘
-#      │
-#      ▼
-# ┌─────────┐     [0]: Get the first (and typically only) choice
-# │  [0]    │
-# └────┬────┘
-#      │
-#      ▼
-# ┌─────────┐     .message: The message object containing the response
-# │.message │
-# └────┬────┘
-#      │
-#      ▼
-# ┌─────────┐     .content: The actual text string from the AI!
-# │.content │
-# └─────────┘
-# ==========================================
+    # Make a simple API call to get a response
+    response = client.chat.completions.create(
+        model = settings.OPENAI_MODEL,
+        messages = [{
+            "role" : "user",
+            "content": "What is Python is one sentence and why its been used for AI and Machine Learning?" 
+        }]
+    )
 
-# TODO: Extract the AI's text response using the exact path
+    # ==========================================
+    # THE MAGIC PATH TO THE AI'S ANSWER
+    # ==========================================
+    #
+    # After making an API call, the AI's text is ALWAYS at:
+    # response.choices[0].message.content
+    #
+    # Let's understand each part:
+    # ┌─────────┐     response: The complete response object from OpenAI
+    # │response │
+    # └────┬────┘
+    #      │
+    #      ▼
+    # ┌─────────┐     .choices: List of possible responses (usually just one)
+    # │.choices │
+    # └────┬────┘
+    #      │
+    #      ▼
+    # ┌─────────┐     [0]: Get the first (and typically only) choice
+    # │  [0]    │
+    # └────┬────┘
+    #      │
+    #      ▼
+    # ┌─────────┐     .message: The message object containing the response
+    # │.message │
+    # └────┬────┘
+    #      │
+    #      ▼
+    # ┌─────────┐     .content: The actual text string from the AI!
+    # │.content │
+    # └─────────┘
+    # ==========================================
 
-ai_text = response.choices[0].message.content
+    # TODO: Extract the AI's text response using the exact path
 
-print("Successfully extracted the AI's response!")
-print("\n" + "="*60) 
-print("Question: What is Python is one sentence and why its been used for AI and Machine Learning?")
-print("\nAI's Answer:")
-print(ai_text) 
-print("="*60)
+    ai_text = response.choices[0].message.content
 
-# Show the magic path one more time
-print("\n🔑 THE GOLDEN PATH - Memorize this:")
-print("   response.choices[0].message.content")
-print("\n   This path works for EVERY chat completion response!")
+    print("Successfully extracted the AI's response!")
+    print("\n" + "="*60) 
+    print("Question: What is Python is one sentence and why its been used for AI and Machine Learning?")
+    print("\nAI's Answer:")
+    print(ai_text) 
+    print("="*60)
 
-print("\n✅ Task 4 completed! You now know how to extract AI responses!")
\ No newline at end of file
+    # Show the magic path one more time
+    print("\n🔑 THE GOLDEN PATH - Memorize this:")
+    print("   response.choices[0].message.content")
+    print("\n   This path works for EVERY chat completion response!")
+
+    print("\n✅ Task 4 completed! You now know how to extract AI responses!")
+
+    return response
+
+
+if __name__ == "__main__":
+    main()
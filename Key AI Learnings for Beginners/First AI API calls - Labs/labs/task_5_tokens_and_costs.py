@@ -4,86 +4,121 @@ Learn how tokens work and calculate real business costs for AI usage.
 """
 
 import sys
-import openai
 import os
 
 # Add parent directory to sys.path to allow importing from core
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from core import settings
- 
-client = openai.OpenAI(
-    api_key = settings.OPENAI_API_KEY,
-    base_url = settings.OPENAI_API_BASE
-)
-
-prompt = "Explain the benefits of using AI for customer support in a business?"
-
-response = client.chat.completions.create(
-    model = settings.OPENAI_MODEL,
-    messages = [{"role": "user", "context": prompt}]
-)
-
-# ==========================================
-# WHAT ARE TOKENS?
-# ==========================================
-#
-# Think of tokens as "pieces of words" that AI uses:
-# - Simple words = 1 token (e.g., "cat", "run")
-# - Complex words = multiple tokens (e.g., "unbelievable" = 3 tokens)
-# - Rough estimate: 1 token ≈ 4 characters or 0.75 words
-#
-# The response.usage object tells you EXACTLY how many tokens you used:
-# ┌────────────────────────────────────┐
-# │ response.usage                      │
-# │  ├── prompt_tokens      (input)    │ ← What you asked
-# │  ├── completion_tokens  (output)   │ ← What AI answered
-# │  └── total_tokens       (sum)      │ ← What you pay for
-# └────────────────────────────────────┘
-# ==========================================
-
-# TODO: Extract the token counts from response.usage
-
-input_tokens = response.usage.prompt_tokens
-output_tokens = response.usage.completion_tokens
-total_tokens = response.usage.total_tokens
-
-print("📊 Token Usage Report:")
-print("="*50)
-print(f"  Your question used: {input_tokens} tokens")
-print(f"  AI's response used: {output_tokens} tokens")
-print(f"  Total tokens billed: {total_tokens} tokens")
-print("="*50)
-
-# ==========================================
-# CALCULATING REAL BUSINESS COSTS
-# ==========================================
-#
-# GPT-4.1-mini Official Pricing:
-# ┌─────────────────────────────────────┐
-# │ Input:  $0.80 per 1M tokens         │
-# │         = $0.0008 per 1K tokens     │
-# │                                      │
-# │ Output: $3.20 per 1M tokens         │
-# │         = $0.0032 per 1K tokens     │
-# └─────────────────────────────────────┘
-#
-# Notice: Output costs 4x more than input!
-# This is why keeping AI responses concise matters for your budget.
-# ==========================================
-
-input_price_per_1k_token = 0.0008
-output_price_per_1k_token = 0.0032
-
-input_cost = (input_tokens / 1000) * input_price_per_1k_token
-output_cost = (output_tokens / 1000) * output_price_per_1k_token
-total_cost = input_cost + output_cost
-
-print("\n💰 Cost Breakdown for This Call:")
-print("-"*50)
-print(f"  Input cost:  ${input_cost:.6f} ({input_tokens} tokens)")
-print(f"  Output cost: ${output_cost:.6f} ({output_tokens} tokens)")
-print(f"  TOTAL COST:  ${total_cost:.6f}")
-print("-"*50)
-
-print("\n✅ Task 5 completed! You now understand tokens and costs!")
\ No newline at end of file
+from core.tokens import count_message_tokens, estimate_cost
+
+# Rough size of the answer, for the pre-flight estimate
+EXPECTED_OUTPUT_TOKENS = 200
+
+
+def main(client=None):
+    """Call the API and report its token usage and cost - returns the response"""
+    client = client or settings.get_openai_client()
+
+    prompt = "Explain the benefits of using AI for customer support in a business?"
+    messages = [{"role": "user", "content": prompt}]
+
+    # ==========================================
+    # PRE-FLIGHT: KNOW THE PRICE BEFORE YOU PAY
+    # ==========================================
+    #
+    # tiktoken splits text into tokens exactly like the API does, so the
+    # size of a request - and most of its cost - is known before sending it
+    # ==========================================
+
+    estimated_tokens = count_message_tokens(messages)
+    estimated_cost = estimate_cost(estimated_tokens, EXPECTED_OUTPUT_TOKENS)
+    print("🔮 Pre-flight Estimate:")
+    print("="*50)
+    print(f"  Your question: ~{estimated_tokens} tokens (+ ~{EXPECTED_OUTPUT_TOKENS} expected in the answer)")
+    if estimated_cost is None:
+        print(f"  Estimated cost: unknown - add '{settings.OPENAI_MODEL}' to settings.MODEL_PRICES")
+    else:
+        print(f"  Estimated cost: ${estimated_cost:.6f}")
+    print("="*50 + "\n")
+
+    response = client.chat.completions.create(
+        model = settings.OPENAI_MODEL,
+        messages = messages
+    )
+
+    # ==========================================
+    # WHAT ARE TOKENS?
+    # ==========================================
+    #
+    # Think of tokens as "pieces of words" that AI uses:
+    # - Simple words = 1 token (e.g., "cat", "run")
+    # - Complex words = multiple tokens (e.g., "unbelievable" = 3 tokens)
+    # - Rough estimate: 1 token ≈ 4 characters or 0.75 words
+    #
+    # The response.usage object tells you EXACTLY how many tokens you used:
+    # ┌────────────────────────────────────┐
+    # │ response.usage                      │
+    # │  ├── prompt_tokens      (input)    │ ← What you asked
+    # │  ├── completion_tokens  (output)   │ ← What AI answered
+    # │  └── total_tokens       (sum)      │ ← What you pay for
+    # └────────────────────────────────────┘
+    # ==========================================
+
+    # TODO: Extract the token counts from response.usage
+
+    input_tokens = response.usage.prompt_tokens
+    output_tokens = response.usage.completion_tokens
+    total_tokens = response.usage.total_tokens
+
+    print("📊 Token Usage Report:")
+    print("="*50)
+    print(f"  Your question used: {input_tokens} tokens")
+    print(f"  AI's response used: {output_tokens} tokens")
+    print(f"  Total tokens billed: {total_tokens} tokens")
+    print("="*50)
+
+    # ==========================================
+    # CALCULATING REAL BUSINESS COSTS
+    # ==========================================
+    #
+    # GPT-4.1-mini Official Pricing:
+    # ┌─────────────────────────────────────┐
+    # │ Input:  $0.80 per 1M tokens         │
+    # │         = $0.0008 per 1K tokens     │
+    # │                                      │
+    # │ Output: $3.20 per 1M tokens         │
+    # │         = $0.0032 per 1K tokens     │
+    # └─────────────────────────────────────┘
+    #
+    # Notice: Output costs 4x more than input!
+    # This is why keeping AI responses concise matters for your budget.
+    # ==========================================
+
+    # Prices live in settings.MODEL_PRICES so every model has its own rate
+    try:
+        price = settings.get_model_price(response.model)
+    except KeyError:
+        print(f"\n⚠️ No price configured for '{response.model}' - add it to settings.MODEL_PRICES to see costs")
+        return response
+    input_price_per_1k_token = price["input"]
+    output_price_per_1k_token = price["output"]
+
+    input_cost = (input_tokens / 1000) * input_price_per_1k_token
+    output_cost = (output_tokens / 1000) * output_price_per_1k_token
+    total_cost = input_cost + output_cost
+
+    print("\n💰 Cost Breakdown for This Call:")
+    print("-"*50)
+    print(f"  Input cost:  ${input_cost:.6f} ({input_tokens} tokens)")
+    print(f"  Output cost: ${output_cost:.6f} ({output_tokens} tokens)")
+    print(f"  TOTAL COST:  ${total_cost:.6f}")
+    print("-"*50)
+
+    print("\n✅ Task 5 completed! You now understand tokens and costs!")
+
+    return response
+
+
+if __name__ == "__main__":
+    main()
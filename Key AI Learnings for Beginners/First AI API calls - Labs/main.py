@@ -1,5 +1,166 @@
+"""
+First AI API Calls - Lab Runner
+Run the labs in ONE Python process with ONE shared OpenAI client.
+
+Running each task as its own script pays for a fresh interpreter, a fresh
+`import openai` and a fresh TCP + TLS handshake every time. Here every task is
+a plain `main(client)` callable: they share settings.get_openai_client()
+(and its keep-alive connection pool), and independent tasks can run
+concurrently.
+
+    python main.py                 # every task, one after another
+    python main.py 3 4 5 -j 3      # tasks 3-5 at the same time
+"""
+
+import argparse
+import importlib
+import io
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Optional
+
+from core import settings
+
+# Task number -> module in labs/
+TASKS = {
+    "1": "task_1_import_setup",
+    "2": "task_2_client_initialization",
+    "3": "task_3_api_call_explained",
+    "4": "task_4_extract_response",
+    "5": "task_5_tokens_and_costs",
+}
+
+
+@dataclass
+class TaskResult:
+    """Timing and token usage of one task run."""
+    task: str
+    seconds: float
+    output: str = ""
+    prompt_tokens: Optional[int] = None
+    cached_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+    cost: Optional[float] = None
+    error: Optional[str] = None
+
+
+class _ThreadOutput(io.TextIOBase):
+    """sys.stdout stand-in that gives each task thread its own buffer.
+
+    Concurrent tasks would otherwise interleave their prints line by line.
+    """
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._local = threading.local()
+
+    def capture(self):
+        self._local.buffer = io.StringIO()
+
+    def release(self) -> str:
+        buffer = getattr(self._local, "buffer", None)
+        self._local.buffer = None
+        return buffer.getvalue() if buffer else ""
+
+    def write(self, text):
+        buffer = getattr(self._local, "buffer", None)
+        return (buffer or self._stream).write(text)
+
+    def flush(self):
+        self._stream.flush()
+
+
+def _usage(result: Any, task: TaskResult):
+    usage = getattr(result, "usage", None)
+    if usage is None:
+        return
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached = (getattr(details, "cached_tokens", 0) or 0) if details else 0
+    task.prompt_tokens = usage.prompt_tokens
+    task.cached_tokens = cached
+    task.completion_tokens = usage.completion_tokens
+    try:
+        price = settings.get_model_price(result.model)
+    except KeyError:
+        return
+    # Cached prompt tokens are billed at the provider's lower cached-input rate
+    task.cost = ((usage.prompt_tokens - cached) / 1000 * price["input"]
+                 + cached / 1000 * price.get("cached_input", price["input"])
+                 + usage.completion_tokens / 1000 * price["output"])
+
+
+def run_task(number: str, client, output: Optional[_ThreadOutput] = None) -> TaskResult:
+    """Import labs/<task>.py (once per process) and call its main() with the shared client"""
+    if output:
+        output.capture()
+    start = time.perf_counter()
+    task = TaskResult(task=f"{number}. {TASKS[number]}", seconds=0.0)
+    try:
+        module = importlib.import_module(f"labs.{TASKS[number]}")
+        _usage(module.main(client), task)
+    except Exception as e:
+        task.error = f"{type(e).__name__}: {e}"
+    task.seconds = time.perf_counter() - start
+    if output:
+        task.output = output.release()
+    return task
+
+
+def run_tasks(numbers, concurrency: int = 1):
+    """Run the given tasks with one shared client; tasks run in parallel when concurrency > 1"""
+    client = settings.get_openai_client()
+    if concurrency <= 1:
+        return [run_task(number, client) for number in numbers]
+
+    stdout = sys.stdout
+    output = sys.stdout = _ThreadOutput(stdout)
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(lambda number: run_task(number, client, output), numbers))
+    finally:
+        sys.stdout = stdout
+    # Print each task's output as one block, in the order they were asked for
+    for result in results:
+        print(f"\n----- Task {result.task} -----")
+        print(result.output, end="")
+    return results
+
+
+def print_report(results, wall: float):
+    def fmt(value, spec):
+        return format(value, spec) if value is not None else "-"
+
+    print("\n📊 Task Runner Report")
+    print("=" * 86)
+    print(f"{'task':<34}{'status':>8}{'seconds':>9}{'in tok':>8}{'cached':>8}{'out tok':>9}{'cost $':>10}")
+    print("-" * 86)
+    for r in results:
+        status = "error" if r.error else "ok"
+        print(f"{r.task:<34}{status:>8}{r.seconds:>9.2f}{fmt(r.prompt_tokens, 'd'):>8}"
+              f"{fmt(r.cached_tokens, 'd'):>8}{fmt(r.completion_tokens, 'd'):>9}{fmt(r.cost, '.6f'):>10}")
+    print("-" * 86)
+    tokens = sum((r.prompt_tokens or 0) + (r.completion_tokens or 0) for r in results)
+    cost = sum(r.cost or 0 for r in results)
+    print(f"{'total (wall clock)':<34}{'':>8}{wall:>9.2f}{tokens:>25}{cost:>10.6f}")
+    for r in results:
+        if r.error:
+            print(f"❌ Task {r.task}: {r.error}")
+
+
 def main():
-    print("Hello from local-first-ai-labs!")
+    parser = argparse.ArgumentParser(description="Run the labs in one process with a shared client")
+    parser.add_argument("tasks", nargs="*", choices=list(TASKS), metavar="TASK",
+                        help=f"task numbers to run ({', '.join(TASKS)}; default: all)")
+    parser.add_argument("-j", "--concurrency", type=int, default=1,
+                        help="run up to N tasks at the same time")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    results = run_tasks(args.tasks or list(TASKS), args.concurrency)
+    print_report(results, time.perf_counter() - start)
 
 
 if __name__ == "__main__":
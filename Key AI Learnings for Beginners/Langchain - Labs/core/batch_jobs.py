@@ -0,0 +1,326 @@
+"""
+Batch Jobs
+Run a chain over many inputs through a provider's batch endpoint.
+
+Overnight workloads don't need answers in seconds, and batch endpoints are
+much cheaper (settings.BATCH_DISCOUNT). A BatchJob:
+
+1. renders every input through the chain's prompt into a JSONL request file
+   (one chat completion request per line, keyed by custom_id)
+2. uploads it and submits the job
+3. polls until the job is finished
+4. streams the output file back through the chain's own parser into a
+   results JSONL
+
+Everything lives in one work directory, so an interrupted run picks up where
+it stopped when started again: a submitted job is polled instead of
+resubmitted, and results already collected are skipped. A job that ends
+failed, expired or cancelled is dropped; whatever it did answer is kept and
+the next run submits only the items still missing from the results.
+
+Backends:
+- OpenAIBatchBackend - the real Files + Batches API (openai SDK)
+- LocalBatchBackend  - an on-disk stand-in with the same file formats,
+  answering with core.mock_transport's canned responses; for tests and
+  dry runs, free and offline
+
+    job = BatchJob("tech_info", chains["pydantic"], LocalBatchBackend())
+    for record in job.run(inputs):
+        print(record["custom_id"], record["output"])
+"""
+
+import hashlib
+import json
+import os
+import time
+import uuid
+from enum import Enum
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence
+
+from pydantic import BaseModel
+
+from core import settings
+
+ENDPOINT = "/v1/chat/completions"
+TERMINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+# LangChain message type -> OpenAI chat role
+_ROLES = {"human": "user", "ai": "assistant", "system": "system"}
+
+
+def _chat_model(chain):
+    """The chat model step of a prompt | llm | parser chain"""
+    return chain.middle[0] if getattr(chain, "middle", None) else None
+
+
+def build_request_lines(chain, inputs: Sequence[dict], model: Optional[str] = None) -> List[dict]:
+    """One Batch API request per input, rendered through the chain's prompt"""
+    llm = _chat_model(chain)
+    model = model or getattr(llm, "model_name", None) or settings.OPENAI_MODEL
+    temperature = getattr(llm, "temperature", None)
+    lines = []
+    for index, item in enumerate(inputs):
+        messages = [{"role": _ROLES.get(m.type, m.type), "content": m.content}
+                    for m in chain.first.format_prompt(**item).to_messages()]
+        body = {"model": model, "messages": messages}
+        if temperature is not None:
+            body["temperature"] = temperature
+        lines.append({"custom_id": f"item-{index}", "method": "POST", "url": ENDPOINT, "body": body})
+    return lines
+
+
+def _write_jsonl(path: str, records) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+
+
+def _read_jsonl(path: str) -> Iterator[dict]:
+    if not os.path.exists(path):
+        return
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _to_jsonable(value: Any) -> Any:
+    if isinstance(value, BaseModel):
+        return value.model_dump()
+    if isinstance(value, Enum):
+        return value.value
+    return value
+
+
+class OpenAIBatchBackend:
+    """OpenAI Files + Batches API."""
+
+    name = "openai"
+
+    def __init__(self, client=None):
+        self.client = client or settings.get_openai_client()
+
+    def submit(self, path: str) -> str:
+        with open(path, "rb") as f:
+            upload = self.client.files.create(file=f, purpose="batch")
+        job = self.client.batches.create(
+            input_file_id=upload.id,
+            endpoint=ENDPOINT,
+            completion_window=settings.BATCH_COMPLETION_WINDOW,
+        )
+        return job.id
+
+    def status(self, job_id: str) -> dict:
+        job = self.client.batches.retrieve(job_id)
+        counts = job.request_counts
+        return {
+            "status": job.status,
+            "completed": counts.completed if counts else 0,
+            "failed": counts.failed if counts else 0,
+            "total": counts.total if counts else 0,
+            "output_file_id": job.output_file_id,
+            "error_file_id": job.error_file_id,
+        }
+
+    def iter_output(self, status: dict) -> Iterator[dict]:
+        """Output lines, then error lines (requests that failed outright)"""
+        for file_id in (status.get("output_file_id"), status.get("error_file_id")):
+            if file_id:
+                for line in self.client.files.content(file_id).iter_lines():
+                    if line.strip():
+                        yield json.loads(line)
+
+
+class LocalBatchBackend:
+    """On-disk stand-in for the batch endpoint, with the same input and output formats.
+
+    A job "runs" for `delay` seconds and is then answered line by line by
+    `responder` (the mock transport's canned lab answers by default). Models
+    missing from settings.MODEL_PRICES fail per line, like unknown models do.
+    """
+
+    name = "local"
+
+    def __init__(self, directory: Optional[str] = None, delay: float = 0.0,
+                 responder: Optional[Callable[[dict], Any]] = None):
+        self.directory = directory or os.path.join(settings.BATCH_DIR, "local_endpoint")
+        self.delay = delay
+        self.responder = responder
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, job_id: str, kind: str) -> str:
+        return os.path.join(self.directory, f"{job_id}.{kind}")
+
+    def submit(self, path: str) -> str:
+        job_id = f"batch_local_{uuid.uuid4().hex[:12]}"
+        with open(path, encoding="utf-8") as src, open(self._path(job_id, "input.jsonl"), "w", encoding="utf-8") as dst:
+            dst.write(src.read())
+        with open(self._path(job_id, "json"), "w", encoding="utf-8") as f:
+            json.dump({"created_at": time.time()}, f)
+        return job_id
+
+    def _answer(self, line: dict) -> dict:
+        from core.mock_transport import canned_lab_response, completion_payload
+        from core.tokens import count_prompt_tokens, get_model_price
+
+        body = line["body"]
+        result = {"id": f"batch_req_{uuid.uuid4().hex[:12]}", "custom_id": line["custom_id"],
+                  "response": None, "error": None}
+        try:
+            get_model_price(body.get("model"))
+        except KeyError:
+            result["error"] = {"code": "model_not_found", "message": f"Unknown model {body.get('model')!r}"}
+            return result
+        answer = (self.responder or canned_lab_response)(body)
+        if not isinstance(answer, dict):
+            answer = completion_payload(answer, body["model"], count_prompt_tokens(body["messages"], body["model"]))
+        result["response"] = {"status_code": 200, "request_id": result["id"], "body": answer}
+        return result
+
+    def status(self, job_id: str) -> dict:
+        with open(self._path(job_id, "json"), encoding="utf-8") as f:
+            job = json.load(f)
+        lines = list(_read_jsonl(self._path(job_id, "input.jsonl")))
+        output = self._path(job_id, "output.jsonl")
+        if time.time() - job["created_at"] < self.delay:
+            return {"status": "in_progress", "completed": 0, "failed": 0, "total": len(lines),
+                    "output_file_id": None, "error_file_id": None}
+        if not os.path.exists(output):
+            _write_jsonl(output + ".tmp", (self._answer(line) for line in lines))
+            os.replace(output + ".tmp", output)
+        failed = sum(1 for record in _read_jsonl(output) if record["error"])
+        return {"status": "completed", "completed": len(lines) - failed, "failed": failed,
+                "total": len(lines), "output_file_id": output, "error_file_id": None}
+
+    def iter_output(self, status: dict) -> Iterator[dict]:
+        yield from _read_jsonl(status["output_file_id"])
+
+
+class BatchJob:
+    """One chain over many inputs as a resumable batch job, kept in `workdir`."""
+
+    def __init__(self, name: str, chain, backend, workdir: Optional[str] = None,
+                 poll_interval: float = settings.BATCH_POLL_INTERVAL):
+        self.name = name
+        self.chain = chain
+        self.parser = chain.last
+        self.backend = backend
+        self.workdir = workdir or settings.BATCH_DIR
+        self.poll_interval = poll_interval
+        os.makedirs(self.workdir, exist_ok=True)
+        self.requests_path = os.path.join(self.workdir, f"{name}.requests.jsonl")
+        self.results_path = os.path.join(self.workdir, f"{name}.results.jsonl")
+        self.pending_path = os.path.join(self.workdir, f"{name}.pending.jsonl")
+        self.manifest_path = os.path.join(self.workdir, f"{name}.job.json")
+
+    # Manifest: which job belongs to which request file
+
+    def _load_manifest(self) -> dict:
+        if not os.path.exists(self.manifest_path):
+            return {}
+        with open(self.manifest_path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def _save_manifest(self, manifest: dict) -> None:
+        with open(self.manifest_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(self.manifest_path + ".tmp", self.manifest_path)
+
+    def prepare(self, inputs: Sequence[dict]) -> dict:
+        """Write the request file; keep the existing job if the requests are unchanged"""
+        lines = build_request_lines(self.chain, inputs)
+        digest = hashlib.sha256("\n".join(json.dumps(line, sort_keys=True) for line in lines).encode()).hexdigest()
+        manifest = self._load_manifest()
+        if manifest.get("requests_sha256") == digest and manifest.get("backend") == self.backend.name:
+            return manifest
+        _write_jsonl(self.requests_path, lines)
+        if os.path.exists(self.results_path):
+            os.remove(self.results_path)
+        manifest = {"backend": self.backend.name, "requests_sha256": digest, "job_id": None,
+                    "inputs": {line["custom_id"]: item for line, item in zip(lines, inputs)}}
+        self._save_manifest(manifest)
+        return manifest
+
+    def missing(self) -> List[dict]:
+        """Request lines whose custom_id has no record in the results file yet"""
+        done = {record["custom_id"] for record in _read_jsonl(self.results_path)}
+        return [line for line in _read_jsonl(self.requests_path) if line["custom_id"] not in done]
+
+    def submit(self, manifest: dict) -> str:
+        """The manifest's job, or a new one for the requests not collected yet"""
+        if not manifest.get("job_id"):
+            lines = self.missing()
+            path = self.requests_path
+            if len(lines) < sum(1 for _ in _read_jsonl(self.requests_path)):
+                _write_jsonl(self.pending_path, lines)
+                path = self.pending_path
+            manifest["job_id"] = self.backend.submit(path)
+            manifest["submitted_at"] = time.time()
+            self._save_manifest(manifest)
+        return manifest["job_id"]
+
+    def poll(self, job_id: str, on_progress: Optional[Callable[[dict], None]] = None) -> dict:
+        """Wait until the job reaches a terminal status"""
+        while True:
+            status = self.backend.status(job_id)
+            if on_progress:
+                on_progress(status)
+            if status["status"] in TERMINAL_STATUSES:
+                return status
+            time.sleep(self.poll_interval)
+
+    def _parse(self, record: dict) -> tuple:
+        """(output, error) for one output line, parsed by the chain's parser"""
+        if record.get("error"):
+            return None, record["error"].get("message") or str(record["error"])
+        response = record["response"]
+        if response["status_code"] != 200:
+            return None, f"HTTP {response['status_code']}: {response['body'].get('error', response['body'])}"
+        content = response["body"]["choices"][0]["message"]["content"]
+        try:
+            return _to_jsonable(self.parser.parse(content)), None
+        except Exception as e:
+            return None, f"{type(e).__name__}: {e}"
+
+    def collect(self, manifest: dict, status: dict) -> Iterator[dict]:
+        """Stream parsed results, appending each to the results file; done ones are skipped"""
+        done = {record["custom_id"] for record in _read_jsonl(self.results_path)}
+        with open(self.results_path, "a", encoding="utf-8") as results:
+            for record in self.backend.iter_output(status):
+                custom_id = record["custom_id"]
+                if custom_id in done:
+                    continue
+                output, error = self._parse(record)
+                usage = ((record.get("response") or {}).get("body") or {}).get("usage") or {}
+                result = {"custom_id": custom_id, "input": manifest["inputs"].get(custom_id),
+                          "output": output, "error": error, "usage": usage}
+                results.write(json.dumps(result) + "\n")
+                results.flush()
+                done.add(custom_id)
+                yield result
+
+    def results(self) -> List[dict]:
+        """Everything collected so far, in input order"""
+        return sorted(_read_jsonl(self.results_path), key=lambda r: int(r["custom_id"].split("-")[1]))
+
+    def run(self, inputs: Sequence[dict], on_progress: Optional[Callable[[dict], None]] = None) -> Iterator[dict]:
+        """prepare -> submit -> poll -> collect; safe to call again after an interruption"""
+        manifest = self.prepare(inputs)
+        if not self.missing():
+            return
+        job_id = self.submit(manifest)
+        status = self.poll(job_id, on_progress)
+        if status["status"] == "completed" or status.get("output_file_id") or status.get("error_file_id"):
+            yield from self.collect(manifest, status)
+        if status["status"] != "completed":
+            # Keep what it answered; the next run resubmits only the rest
+            manifest["job_id"] = None
+            self._save_manifest(manifest)
+            raise RuntimeError(f"Batch job {job_id} ended as '{status['status']}' with "
+                               f"{len(self.missing())} item(s) unanswered; run again to resubmit them")
+
+
+def get_batch_backend(name: str):
+    """Backend by name: 'openai' or 'local'"""
+    backends: Dict[str, Callable[[], Any]] = {"openai": OpenAIBatchBackend, "local": LocalBatchBackend}
+    return backends[name]()
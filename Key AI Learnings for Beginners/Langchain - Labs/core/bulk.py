@@ -0,0 +1,219 @@
+"""
+Bulk Runner
+Stream one chain over an input file of any size, with a checkpoint to resume from.
+
+core.batch loads every input into a list and keeps every result until the
+end - fine for a few hundred lines, not for millions of rows. Here records
+flow through a generator pipeline instead:
+
+    read_records(file) -> bounded queue -> async workers -> output JSONL
+
+- at most `max_concurrency` calls are in flight; the reader blocks when the
+  queue is full (backpressure) or when it gets `max_ahead` records past the
+  oldest unfinished one, so memory stays flat whatever the input size
+- every result is appended to the output JSONL as soon as it arrives
+  (completion order, tagged with the record's index in the input)
+- a checkpoint (records done + output size) is saved every
+  `checkpoint_every` results; rerunning the same chain over the same input
+  skips what is done and drops any output written after the last checkpoint,
+  so each record ends up in the output exactly once
+
+Throughput matches core.batch's arun_batch() (both run on one event loop);
+the thread-pool run_batch() can be ~25% faster against a near-zero-latency mock,
+where the event loop's own overhead is all there is to measure. Against a
+real endpoint the network dominates and the memory saving is what counts.
+
+    runner = BulkRunner(chains["analysis"], "analysis.jsonl", name="analysis")
+    stats = runner.run(read_records("technologies.csv", "technology"), source="technologies.csv")
+"""
+
+import asyncio
+import csv
+import json
+import os
+import time
+from dataclasses import dataclass
+from typing import Callable, Iterable, Iterator, Optional, Set
+
+from langchain_core.callbacks import UsageMetadataCallbackHandler
+
+from core import settings
+from core.batch_jobs import _to_jsonable
+
+
+def read_records(path: str, input_key: str) -> Iterator[dict]:
+    """Chain inputs from a .jsonl, .csv or plain-text file, read one line at a time.
+
+    JSONL lines may be objects (passed as they are) or bare values; CSV rows
+    use the `input_key` column, or the first column if there is none; any
+    other file is one input per non-empty line.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    with open(path, encoding="utf-8", newline="") as f:
+        if extension == ".csv":
+            reader = csv.DictReader(f)
+            column = input_key if input_key in (reader.fieldnames or []) else (reader.fieldnames or [input_key])[0]
+            for row in reader:
+                yield row if column == input_key else {input_key: row[column]}
+        elif extension in (".jsonl", ".ndjson"):
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    yield record if isinstance(record, dict) else {input_key: record}
+        else:
+            for line in f:
+                if line.strip():
+                    yield {input_key: line.strip()}
+
+
+@dataclass
+class BulkStats:
+    """Counters for one (possibly resumed) bulk run."""
+    processed: int = 0  # results written by this run
+    failed: int = 0
+    skipped: int = 0  # already done by an earlier run
+    elapsed: float = 0.0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    resumed: bool = False
+
+    @property
+    def items_per_second(self) -> float:
+        return self.processed / self.elapsed if self.elapsed else 0.0
+
+
+class BulkRunner:
+    """Runs `chain` over a stream of records into `output_path`, resumably."""
+
+    def __init__(self, chain, output_path: str, name: str = "chain", checkpoint_path: Optional[str] = None,
+                 max_concurrency: int = 8, max_ahead: int = settings.BULK_MAX_AHEAD,
+                 checkpoint_every: int = settings.BULK_CHECKPOINT_EVERY):
+        self.chain = chain
+        self.name = name
+        self.output_path = output_path
+        self.checkpoint_path = checkpoint_path or output_path + ".checkpoint.json"
+        self.max_concurrency = max_concurrency
+        self.max_ahead = max(max_ahead, max_concurrency)
+        self.checkpoint_every = checkpoint_every
+        # Every record below the watermark is done; _done holds finished ones above it
+        self._watermark = 0
+        self._done: Set[int] = set()
+
+    # Checkpoint: how far the output file is trustworthy
+
+    def _load_checkpoint(self, source: str) -> dict:
+        if os.path.exists(self.checkpoint_path) and os.path.exists(self.output_path):
+            with open(self.checkpoint_path, encoding="utf-8") as f:
+                checkpoint = json.load(f)
+            if checkpoint.get("chain") == self.name and checkpoint.get("source") == source:
+                return checkpoint
+        # Nothing to resume from: start over
+        return {"chain": self.name, "source": source, "watermark": 0, "done": [], "output_bytes": 0}
+
+    def _save_checkpoint(self, checkpoint: dict, output) -> None:
+        output.flush()
+        os.fsync(output.fileno())
+        checkpoint.update(watermark=self._watermark, done=sorted(self._done),
+                          output_bytes=output.tell(), updated_at=time.time())
+        with open(self.checkpoint_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(checkpoint, f)
+        os.replace(self.checkpoint_path + ".tmp", self.checkpoint_path)
+
+    def _finish(self, index: int) -> bool:
+        """Mark `index` done; True when the watermark moved"""
+        self._done.add(index)
+        moved = False
+        while self._watermark in self._done:
+            self._done.remove(self._watermark)
+            self._watermark += 1
+            moved = True
+        return moved
+
+    async def arun(self, records: Iterable[dict], source: str = "",
+                   on_checkpoint: Optional[Callable[[BulkStats], None]] = None) -> BulkStats:
+        """Process every record not done yet; `source` names the input for resuming"""
+        checkpoint = self._load_checkpoint(source)
+        stats = BulkStats(resumed=checkpoint["output_bytes"] > 0)
+        self._watermark, self._done = checkpoint["watermark"], set(checkpoint["done"])
+
+        # Output past the checkpoint belongs to records that will be redone
+        with open(self.output_path, "ab") as output:
+            output.truncate(checkpoint["output_bytes"])
+        usage = UsageMetadataCallbackHandler()
+        config = {"callbacks": [usage]}
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.max_concurrency * 2)
+        # Set once the watermark reaches what the blocked reader waits for
+        room = asyncio.Event()
+        waiting_for: Optional[int] = None
+        since_checkpoint = 0
+        start = time.perf_counter()
+
+        async def produce():
+            nonlocal waiting_for
+            for index, record in enumerate(records):
+                if index < self._watermark or index in self._done:
+                    stats.skipped += 1
+                    continue
+                while index - self._watermark >= self.max_ahead:
+                    waiting_for = index - self.max_ahead + 1
+                    room.clear()
+                    await room.wait()
+                await queue.put((index, record))
+            for _ in range(self.max_concurrency):
+                await queue.put(None)
+
+        async def work(output):
+            nonlocal since_checkpoint, waiting_for
+            while (item := await queue.get()) is not None:
+                index, record = item
+                try:
+                    result, error = _to_jsonable(await self.chain.ainvoke(record, config)), None
+                except Exception as e:
+                    result, error = None, f"{type(e).__name__}: {e}"
+                    stats.failed += 1
+                line = {"index": index, "input": record, "output": result, "error": error}
+                output.write((json.dumps(line, default=str) + "\n").encode("utf-8"))
+                stats.processed += 1
+                # Wake the reader only when it can go on, not on every result
+                if self._finish(index) and waiting_for is not None and self._watermark >= waiting_for:
+                    waiting_for = None
+                    room.set()
+                since_checkpoint += 1
+                if since_checkpoint >= self.checkpoint_every:
+                    since_checkpoint = 0
+                    self._save_checkpoint(checkpoint, output)
+                    if on_checkpoint:
+                        on_checkpoint(stats)
+
+        with open(self.output_path, "ab") as output:
+            try:
+                # A failing reader (bad line in the file) cancels the workers, and vice versa
+                async with asyncio.TaskGroup() as group:
+                    group.create_task(produce())
+                    for _ in range(self.max_concurrency):
+                        group.create_task(work(output))
+            finally:
+                # Also on Ctrl+C / cancellation: whatever was written so far is kept
+                self._save_checkpoint(checkpoint, output)
+                stats.elapsed = time.perf_counter() - start
+                for counts in usage.usage_metadata.values():
+                    stats.input_tokens += counts.get("input_tokens", 0)
+                    stats.output_tokens += counts.get("output_tokens", 0)
+        return stats
+
+    def run(self, records: Iterable[dict], source: str = "",
+            on_checkpoint: Optional[Callable[[BulkStats], None]] = None) -> BulkStats:
+        """Synchronous wrapper around arun()"""
+        return asyncio.run(self.arun(records, source, on_checkpoint))
+
+
+def print_bulk_summary(stats: BulkStats, runner: BulkRunner) -> None:
+    """Print the summary of a finished bulk run"""
+    print(f"\n📊 Bulk Summary: {runner.name}")
+    print("=" * 50)
+    resumed = f", {stats.skipped} done by an earlier run" if stats.resumed else ""
+    print(f"  Items:       {stats.processed} ({stats.processed - stats.failed} ok, {stats.failed} failed){resumed}")
+    print(f"  Wall time:   {stats.elapsed:.2f}s")
+    print(f"  Throughput:  {stats.items_per_second:.1f} items/s")
+    print(f"  Tokens:      {stats.input_tokens} in / {stats.output_tokens} out")
+    print(f"  Output:      {runner.output_path}")
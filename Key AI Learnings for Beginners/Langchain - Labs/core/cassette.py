@@ -0,0 +1,351 @@
+"""
+Cassettes
+Record real API traffic once, replay it offline - deterministic, free and fast.
+
+settings.CASSETTE_MODE:
+- "record": every request still goes to the provider; each response is
+  stored in the cassette next to a hash of its request
+- "replay": nothing leaves the process; responses come from the cassette,
+  optionally after settings.CASSETTE_LATENCY (seconds, or "recorded" to
+  wait as long as the original call took)
+- "off" (default)
+
+CassetteTransport sits innermost in the shared HTTP clients (see
+settings._wrap_transport), so raw openai SDK calls and ChatOpenAI replay
+through exactly the same rate limiting, coalescing and tracing code as live
+ones. Streamed responses are stored with their chunk boundaries and replayed
+chunk by chunk, usage chunk included. Gemini does not use those clients:
+CassetteCache is a LangChain cache to pass as its `cache=` instead.
+
+The cassette is one SQLite file (compressed bodies, indexed by request
+hash). Replay loads it into a dict once, so each lookup is O(1) and no I/O;
+the same request recorded several times is replayed in recorded order, round
+robin. A request missing from the cassette gets a 404 naming its hash.
+
+    CASSETTE_MODE=record python labs/task_5_complete_chain.py
+    CASSETTE_MODE=replay python labs/task_5_complete_chain.py
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+from langchain_core.caches import BaseCache
+
+from core import settings
+from core.response_cache import _dump_generations, _load_generations, request_key
+
+# Response headers worth keeping; the rest describe the original connection
+_KEPT_HEADERS = ("content-type", "x-request-id", "openai-processing-ms", "openai-model")
+
+# Raw request bodies remembered with their cassette key, so replaying a body seen
+# before skips re-canonicalizing its JSON
+MAX_ALIASES = 100_000
+
+# status, headers, body, chunk sizes (None when not streamed), seconds the call took
+Entry = Tuple[int, httpx.Headers, bytes, Optional[List[int]], float]
+
+
+def _digest(request: httpx.Request, body: bytes) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{request.method} {request.url.path}\n".encode("utf-8"))
+    digest.update(body)
+    return digest.hexdigest()
+
+
+def cassette_key(request: httpx.Request) -> str:
+    """Hash of method, path and canonical JSON body - key order and whitespace never matter"""
+    body = request.content
+    try:
+        body = json.dumps(json.loads(body), sort_keys=True, separators=(",", ":")).encode("utf-8")
+    except ValueError:
+        pass
+    return _digest(request, body)
+
+
+class Cassette:
+    """Recorded responses by request hash, in one SQLite file."""
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self.recorded = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT NOT NULL, seq INTEGER NOT NULL, status INTEGER NOT NULL, headers TEXT NOT NULL,"
+            " body BLOB NOT NULL, chunks TEXT, elapsed REAL NOT NULL, PRIMARY KEY (key, seq))"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS generations (key TEXT PRIMARY KEY, value BLOB NOT NULL)"
+        )
+        self._entries: Optional[Dict[str, List[Entry]]] = None
+        self._turns: Dict[str, int] = {}
+
+    # Record
+
+    def add(self, key: str, response: httpx.Response, body: bytes,
+            chunks: Optional[List[int]], elapsed: float) -> None:
+        headers = [(k, v) for k, v in response.headers.items() if k.lower() in _KEPT_HEADERS]
+        with self._lock:
+            seq = self._conn.execute("SELECT COUNT(*) FROM responses WHERE key = ?", (key,)).fetchone()[0]
+            self._conn.execute(
+                "INSERT INTO responses (key, seq, status, headers, body, chunks, elapsed) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, seq, response.status_code, json.dumps(headers), zlib.compress(body),
+                 json.dumps(chunks) if chunks is not None else None, elapsed),
+            )
+            self.recorded += 1
+            self._entries = None
+
+    # Replay
+
+    def _load(self) -> Dict[str, List[Entry]]:
+        entries: Dict[str, List[Entry]] = {}
+        rows = self._conn.execute(
+            "SELECT key, status, headers, body, chunks, elapsed FROM responses ORDER BY key, seq"
+        )
+        for key, status, headers, body, chunks, elapsed in rows:
+            entries.setdefault(key, []).append(
+                (status, httpx.Headers([tuple(h) for h in json.loads(headers)]), zlib.decompress(body),
+                 json.loads(chunks) if chunks else None, elapsed)
+            )
+        return entries
+
+    def lookup(self, key: str) -> Optional[Entry]:
+        """The next recorded response for `key`, or None"""
+        entries = self._entries
+        if entries is None:
+            with self._lock:
+                entries = self._entries = self._entries or self._load()
+        recorded = entries.get(key)
+        if not recorded:
+            self.misses += 1
+            return None
+        turn = self._turns.get(key, 0)
+        self._turns[key] = turn + 1
+        self.hits += 1
+        return recorded[turn % len(recorded)]
+
+    # Generations (for models that don't go through the HTTP clients)
+
+    def get_generations(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM generations WHERE key = ?", (key,)).fetchone()
+        return zlib.decompress(row[0]).decode("utf-8") if row else None
+
+    def set_generations(self, key: str, value: str) -> None:
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO generations (key, value) VALUES (?, ?)",
+                               (key, zlib.compress(value.encode("utf-8"))))
+            self.recorded += 1
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def summary(self) -> str:
+        return (f"{len(self)} responses in {self.path}: {self.recorded} recorded, "
+                f"{self.hits} replayed, {self.misses} missing")
+
+
+class _ReplayStream(httpx.SyncByteStream, httpx.AsyncByteStream):
+    """A recorded body, handed out in its original chunks."""
+
+    def __init__(self, body: bytes, chunks: List[int]):
+        self._body = body
+        self._chunks = chunks
+
+    def _parts(self):
+        start = 0
+        for size in self._chunks:
+            yield self._body[start:start + size]
+            start += size
+
+    def __iter__(self):
+        yield from self._parts()
+
+    async def __aiter__(self):
+        for part in self._parts():
+            yield part
+
+
+class _RecordingStream(httpx.SyncByteStream, httpx.AsyncByteStream):
+    """Passes a streamed body through and stores it in the cassette when it closes."""
+
+    def __init__(self, stream, save):
+        self._stream = stream
+        self._save = save
+        self._parts: List[bytes] = []
+        self._saved = False
+
+    def __iter__(self):
+        for chunk in self._stream:
+            self._parts.append(chunk)
+            yield chunk
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            self._parts.append(chunk)
+            yield chunk
+
+    def _save_once(self) -> None:
+        if not self._saved:
+            self._saved = True
+            self._save(b"".join(self._parts), [len(part) for part in self._parts])
+
+    def close(self) -> None:
+        self._save_once()
+        self._stream.close()
+
+    async def aclose(self) -> None:
+        self._save_once()
+        await self._stream.aclose()
+
+
+def _is_stream(response: httpx.Response) -> bool:
+    return response.headers.get("content-type", "").startswith("text/event-stream")
+
+
+def _events(body: bytes) -> List[int]:
+    """Chunk sizes for an event stream that arrived in one piece: one server-sent event each"""
+    events = body.split(b"\n\n")
+    sizes = [len(event) + 2 for event in events[:-1]]
+    return sizes + [len(events[-1])] if events[-1] else sizes
+
+
+class CassetteTransport(httpx.BaseTransport, httpx.AsyncBaseTransport):
+    """httpx transport that records responses into a cassette or replays them from it."""
+
+    def __init__(self, transport, cassette: Cassette, mode: str = "replay", latency: Any = 0.0):
+        self.transport = transport
+        self.cassette = cassette
+        self.mode = mode
+        self.latency = latency
+        self._aliases: Dict[str, str] = {}
+
+    def _key(self, request: httpx.Request) -> str:
+        raw = _digest(request, request.content)
+        key = self._aliases.get(raw)
+        if key is None:
+            key = cassette_key(request)
+            if self.mode == "replay" and len(self._aliases) < MAX_ALIASES:
+                self._aliases[raw] = key
+        return key
+
+    def _delay(self, entry: Entry) -> float:
+        return entry[4] if self.latency == "recorded" else float(self.latency or 0)
+
+    def _replay(self, request: httpx.Request, key: str, entry: Optional[Entry]) -> httpx.Response:
+        if entry is None:
+            return httpx.Response(404, request=request, json={"error": {
+                "message": f"No recorded response for request {key} in cassette {self.cassette.path}",
+                "type": "cassette_miss", "code": "cassette_miss"}})
+        status, headers, body, chunks, _ = entry
+        if chunks is None:
+            # A ready ByteStream rather than content=: an order of magnitude cheaper to build
+            return httpx.Response(status, headers=headers, stream=httpx.ByteStream(body), request=request)
+        return httpx.Response(status, headers=headers, stream=_ReplayStream(body, chunks), request=request)
+
+    def _record(self, key: str, response: httpx.Response, start: float) -> httpx.Response:
+        if _is_stream(response) and not response.is_stream_consumed:
+            response.stream = _RecordingStream(
+                response.stream,
+                lambda body, chunks: self.cassette.add(key, response, body, chunks, time.perf_counter() - start),
+            )
+        else:
+            chunks = _events(response.content) if _is_stream(response) else None
+            self.cassette.add(key, response, response.content, chunks, time.perf_counter() - start)
+        return response
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        key = self._key(request)
+        if self.mode == "replay":
+            entry = self.cassette.lookup(key)
+            if entry is not None and self._delay(entry):
+                time.sleep(self._delay(entry))
+            return self._replay(request, key, entry)
+        start = time.perf_counter()
+        response = self.transport.handle_request(request)
+        if not _is_stream(response):
+            response.read()
+        return self._record(key, response, start)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        key = self._key(request)
+        if self.mode == "replay":
+            entry = self.cassette.lookup(key)
+            if entry is not None and self._delay(entry):
+                await asyncio.sleep(self._delay(entry))
+            return self._replay(request, key, entry)
+        start = time.perf_counter()
+        response = await self.transport.handle_async_request(request)
+        if not _is_stream(response):
+            await response.aread()
+        return self._record(key, response, start)
+
+    def close(self) -> None:
+        self.transport.close()
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
+
+
+class CassetteMiss(LookupError):
+    """Replay mode met a model call that was never recorded."""
+
+
+class CassetteCache(BaseCache):
+    """LangChain cache that records / replays whole generations through a cassette.
+
+    For chat models that bring their own HTTP stack (ChatGoogleGenerativeAI):
+    in record mode every call goes to the provider and is stored, in replay
+    mode every call must come from the cassette.
+    """
+
+    def __init__(self, cassette: Cassette, mode: str = "replay"):
+        self.cassette = cassette
+        self.mode = mode
+
+    def lookup(self, prompt: str, llm_string: str):
+        if self.mode != "replay":
+            return None
+        key = request_key(prompt=prompt, llm=llm_string)
+        value = self.cassette.get_generations(key)
+        if value is None:
+            self.cassette.misses += 1
+            raise CassetteMiss(f"No recorded generation for {key} in cassette {self.cassette.path}")
+        self.cassette.hits += 1
+        return _load_generations(value)
+
+    def update(self, prompt: str, llm_string: str, return_val) -> None:
+        if self.mode == "record":
+            self.cassette.set_generations(request_key(prompt=prompt, llm=llm_string), _dump_generations(return_val))
+
+    def clear(self, **kwargs: Any) -> None:
+        pass
+
+
+@lru_cache(maxsize=None)
+def get_cassette() -> Optional[Cassette]:
+    """Process-wide cassette from settings, or None when CASSETTE_MODE is off"""
+    if settings.CASSETTE_MODE not in ("record", "replay"):
+        return None
+    return Cassette(settings.CASSETTE_PATH)
+
+
+def get_cassette_cache() -> Optional[CassetteCache]:
+    """CassetteCache for models outside the shared HTTP clients, or None when off"""
+    cassette = get_cassette()
+    return CassetteCache(cassette, settings.CASSETTE_MODE) if cassette else None
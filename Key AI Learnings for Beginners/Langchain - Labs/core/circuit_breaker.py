@@ -0,0 +1,251 @@
+"""
+Circuit Breakers
+Stop sending traffic to a provider that is failing, and notice when it recovers.
+
+Every provider/model gets a CircuitBreaker with three states:
+
+- closed: calls go through; each outcome lands in a rolling window. Errors
+  and calls slower than settings.BREAKER_SLOW_CALL count as failures.
+- open: tripped by settings.BREAKER_FAILURE_STREAK failures in a row, or a
+  failure rate of settings.BREAKER_FAILURE_RATE over the window. Calls are
+  rejected at once with CircuitOpenError - a millisecond instead of a
+  30-second timeout.
+- half-open: after settings.BREAKER_OPEN_SECONDS a probe call is let
+  through. Success closes the circuit again; failure reopens it for twice
+  as long (up to settings.BREAKER_MAX_OPEN_SECONDS).
+
+Client mistakes (4xx other than 408/429) say nothing about the provider's
+health and are not counted.
+
+With LangChain's with_fallbacks, a chain of breaker-guarded models skips a
+tripped provider immediately and moves on to the next one:
+
+    chain = fallback_chain({"Google": google_llm, "OpenAI": openai_llm})
+    chain.invoke("Explain cloud computing in one sentence")
+    print(get_breaker("Google/gemini-2.5-flash").summary())
+
+core/multi_provider.py and core/router.py consult the same breakers.
+"""
+
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+
+from langchain_core.runnables import RunnableLambda
+
+from core import settings
+from core.hedging import WorkerPool
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+# Sync calls with a deadline run in worker threads; a timed-out thread is abandoned, not
+# killed, and once all of them are stuck new calls fail fast with WorkerPoolFull
+_pool = WorkerPool(32, "breaker")
+
+
+# Shared by every caller in the process, so all of them see the same provider health
+_breakers: Dict[str, "CircuitBreaker"] = {}
+_breakers_lock = threading.Lock()
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling a provider whose circuit is open."""
+
+
+def model_name(llm: Any) -> str:
+    """The model a chat model instance calls ("models/" prefix dropped)"""
+    model = getattr(llm, "model_name", None) or getattr(llm, "model", None) or type(llm).__name__
+    return model.removeprefix("models/")
+
+
+def counts_as_failure(error: BaseException) -> bool:
+    """True for errors that say the provider is unhealthy (not bad requests)"""
+    status = getattr(error, "status_code", None)
+    return not (status and 400 <= status < 500 and status not in (408, 429))
+
+
+class CircuitBreaker:
+    """Closed / open / half-open state machine for one provider/model."""
+
+    def __init__(
+        self,
+        name: str,
+        failure_rate: float = settings.BREAKER_FAILURE_RATE,
+        window: int = settings.BREAKER_WINDOW,
+        min_calls: int = settings.BREAKER_MIN_CALLS,
+        failure_streak: int = settings.BREAKER_FAILURE_STREAK,
+        slow_call: float = settings.BREAKER_SLOW_CALL,
+        open_seconds: float = settings.BREAKER_OPEN_SECONDS,
+        max_open_seconds: float = settings.BREAKER_MAX_OPEN_SECONDS,
+        probes: int = settings.BREAKER_HALF_OPEN_PROBES,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.failure_streak = failure_streak
+        self.slow_call = slow_call
+        self.base_open_seconds = open_seconds
+        self.max_open_seconds = max_open_seconds
+        self.probes = probes
+        self.clock = clock
+        self.calls = 0
+        self.failures = 0
+        self.rejected = 0
+        self.trips = 0
+        self._outcomes: Deque[bool] = deque(maxlen=window)
+        self._streak = 0
+        self._state = CLOSED
+        self._open_seconds = open_seconds
+        self._opened_until = 0.0
+        self._probing = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self) -> str:
+        if self._state == OPEN and self.clock() >= self._opened_until:
+            self._state = HALF_OPEN
+        return self._state
+
+    def _open(self) -> None:
+        if self._state != OPEN:
+            self.trips += 1
+        self._state = OPEN
+        self._opened_until = self.clock() + self._open_seconds
+
+    def allow(self) -> bool:
+        """Whether a call may go out now; in half-open state this takes a probe slot"""
+        with self._lock:
+            state = self._current_state()
+            if state == CLOSED:
+                return True
+            if state == HALF_OPEN and self._probing < self.probes:
+                self._probing += 1
+                return True
+            self.rejected += 1
+            return False
+
+    def record(self, ok: bool, seconds: float = 0.0) -> None:
+        """Outcome of an allowed call; a slow success counts as a failure"""
+        failed = not ok or seconds > self.slow_call
+        with self._lock:
+            self.calls += 1
+            self.failures += failed
+            if self._current_state() == HALF_OPEN:
+                self._probing = max(0, self._probing - 1)
+                if failed:
+                    # Still down: wait longer before the next probe
+                    self._open_seconds = min(self._open_seconds * 2, self.max_open_seconds)
+                    self._open()
+                else:
+                    self._state = CLOSED
+                    self._open_seconds = self.base_open_seconds
+                    self._outcomes.clear()
+                    self._streak = 0
+                return
+            self._outcomes.append(not failed)
+            self._streak = self._streak + 1 if failed else 0
+            if self._state == CLOSED and (self._streak >= self.failure_streak or self._rate_tripped()):
+                self._open()
+
+    def _rate_tripped(self) -> bool:
+        outcomes = self._outcomes
+        return len(outcomes) >= self.min_calls and outcomes.count(False) / len(outcomes) >= self.failure_rate
+
+    def release(self) -> None:
+        """Give back a probe slot for a call that was cancelled before it finished"""
+        with self._lock:
+            self._probing = max(0, self._probing - 1)
+
+    def _check(self) -> None:
+        if not self.allow():
+            raise CircuitOpenError(f"{self.name}: circuit open, skipping the call")
+
+    def _finish(self, start: float, error: Optional[BaseException]) -> None:
+        if error is not None and not counts_as_failure(error):
+            self.release()
+        else:
+            self.record(error is None, time.perf_counter() - start)
+
+    def call(self, fn: Callable[[], Any], timeout: Optional[float] = None) -> Any:
+        """fn() through the breaker, optionally abandoned after `timeout` seconds"""
+        self._check()
+        start = time.perf_counter()
+        try:
+            if timeout is None:
+                result = fn()
+            else:
+                result = _pool.submit(fn).result(timeout=timeout)
+        except Exception as e:
+            self._finish(start, e)
+            raise
+        self._finish(start, None)
+        return result
+
+    async def acall(self, fn: Callable[[], Awaitable[Any]], timeout: Optional[float] = None) -> Any:
+        """Async version of call()"""
+        self._check()
+        start = time.perf_counter()
+        try:
+            async with asyncio.timeout(timeout):
+                result = await fn()
+        except asyncio.CancelledError:
+            self.release()
+            raise
+        except Exception as e:
+            self._finish(start, e)
+            raise
+        self._finish(start, None)
+        return result
+
+    def summary(self) -> str:
+        with self._lock:
+            state = self._current_state()
+            retry = (f", next probe in {self._opened_until - self.clock():.1f}s"
+                     if state == OPEN else "")
+            return (f"{self.name}: {state}{retry} | {self.calls} calls, {self.failures} failed, "
+                    f"{self.rejected} skipped, tripped {self.trips}x")
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """Process-wide CircuitBreaker for a "Provider/model" name"""
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = _breakers[name] = CircuitBreaker(name)
+        return breaker
+
+
+def breakers() -> Dict[str, CircuitBreaker]:
+    """Every breaker created so far, by name"""
+    with _breakers_lock:
+        return dict(_breakers)
+
+
+def breaker_runnable(runnable, name: str, timeout: Optional[float] = None) -> RunnableLambda:
+    """Wrap a chat model or chain so every invoke/ainvoke goes through breaker `name`"""
+    breaker = get_breaker(name)
+
+    def invoke(value, config):
+        return breaker.call(lambda: runnable.invoke(value, config), timeout)
+
+    async def ainvoke(value, config):
+        return await breaker.acall(lambda: runnable.ainvoke(value, config), timeout)
+
+    return RunnableLambda(invoke, afunc=ainvoke, name=f"Breaker[{name}]")
+
+
+def fallback_chain(llms: Dict[str, Any], timeouts: Optional[Dict[str, float]] = None):
+    """Breaker-guarded models tried in order: a failing or tripped one hands over to the next"""
+    timeouts = timeouts or {}
+    guarded = [breaker_runnable(llm, f"{provider}/{model_name(llm)}", timeouts.get(provider))
+               for provider, llm in llms.items()]
+    return guarded[0].with_fallbacks(guarded[1:]) if len(guarded) > 1 else guarded[0]
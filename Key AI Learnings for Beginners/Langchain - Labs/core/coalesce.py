@@ -0,0 +1,181 @@
+"""
+Request Coalescing
+Identical requests that are in flight at the same time share one upstream call.
+
+When several workers send a byte-identical chat completion request at the
+same moment (a batch with repeated inputs, the same chain invoked from many
+threads), only the first one - the leader - goes to the provider. Everyone
+else waits for it and gets their own copy of its response, or its error.
+
+Unlike the response cache nothing is kept afterwards: as soon as the leader
+finishes, the next identical request goes upstream again.
+
+CoalescingTransport is wrapped around the shared HTTP clients by settings, so
+raw SDK calls and ChatOpenAI are deduplicated alike, sync and async.
+Streaming requests are never coalesced.
+"""
+
+import asyncio
+import contextlib
+import hashlib
+import json
+import threading
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+import httpx
+
+_COALESCED_PATHS = ("/chat/completions", "/embeddings")
+# Headers that describe the original wire encoding, not the decoded copy
+_DROPPED_HEADERS = ("content-encoding", "content-length", "transfer-encoding")
+
+# Set while a request must go upstream on its own (e.g. a hedged duplicate)
+_bypass: ContextVar[bool] = ContextVar("coalesce_bypass", default=False)
+
+
+@contextlib.contextmanager
+def no_coalescing():
+    """Requests made inside this block are never merged with in-flight ones"""
+    token = _bypass.set(True)
+    try:
+        yield
+    finally:
+        _bypass.reset(token)
+
+
+@dataclass
+class CoalesceStats:
+    upstream: int = 0
+    coalesced: int = 0
+
+    def summary(self) -> str:
+        total = self.upstream + self.coalesced
+        saved = self.coalesced / total if total else 0.0
+        return f"{total} requests, {self.upstream} sent upstream, {self.coalesced} coalesced ({saved:.0%} saved)"
+
+
+# Shared by every CoalescingTransport in the process
+coalesce_stats = CoalesceStats()
+
+
+class _Flight:
+    """One upstream call and the result its followers are waiting for."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Optional[Tuple[int, list, bytes, dict]] = None
+        self.error: Optional[BaseException] = None
+
+
+def _snapshot(response: httpx.Response) -> Tuple[int, list, bytes, dict]:
+    headers = [(k, v) for k, v in response.headers.multi_items() if k.lower() not in _DROPPED_HEADERS]
+    extensions = {k: v for k, v in response.extensions.items() if k in ("http_version", "reason_phrase")}
+    return response.status_code, headers, response.content, extensions
+
+
+def _replay(result: Tuple[int, list, bytes, dict], request: httpx.Request) -> httpx.Response:
+    status_code, headers, content, extensions = result
+    return httpx.Response(status_code, headers=headers, content=content,
+                          request=request, extensions=extensions)
+
+
+class CoalescingTransport(httpx.BaseTransport, httpx.AsyncBaseTransport):
+    """httpx transport that merges concurrent identical requests into one."""
+
+    def __init__(self, transport, stats: CoalesceStats = coalesce_stats):
+        self.transport = transport
+        self.stats = stats
+        self._lock = threading.Lock()
+        self._flights: Dict[str, _Flight] = {}
+        # Futures belong to one event loop, so async flights are kept per loop
+        self._async_flights: Dict[Tuple[int, str], asyncio.Future] = {}
+
+    @staticmethod
+    def _key(request: httpx.Request) -> Optional[str]:
+        """Canonical key of a coalescable request (None = send it as is)"""
+        if _bypass.get() or request.method != "POST" or not request.url.path.endswith(_COALESCED_PATHS):
+            return None
+        try:
+            body = json.loads(request.content)
+        except ValueError:
+            return None
+        if not isinstance(body, dict) or body.get("stream"):
+            return None
+        # Same canonical form as response_cache.request_key (sorted keys)
+        canonical = json.dumps({"url": str(request.url), "body": body}, sort_keys=True, default=str)
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        key = self._key(request)
+        if key is None:
+            return self.transport.handle_request(request)
+
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.stats.upstream += 1
+            else:
+                self.stats.coalesced += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return _replay(flight.result, request)
+
+        try:
+            response = self.transport.handle_request(request)
+            response.read()
+            flight.result = _snapshot(response)
+            return response
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        key = self._key(request)
+        if key is None:
+            return await self.transport.handle_async_request(request)
+
+        loop_key = (id(asyncio.get_running_loop()), key)
+        future = self._async_flights.get(loop_key)
+        if future is not None:
+            self.stats.coalesced += 1
+            try:
+                return _replay(await asyncio.shield(future), request)
+            except asyncio.CancelledError:
+                # The leader was cancelled, not us - go upstream ourselves
+                if future.cancelled() and not asyncio.current_task().cancelling():
+                    return await self.handle_async_request(request)
+                raise
+
+        future = self._async_flights[loop_key] = asyncio.get_running_loop().create_future()
+        self.stats.upstream += 1
+        try:
+            response = await self.transport.handle_async_request(request)
+            await response.aread()
+            future.set_result(_snapshot(response))
+            return response
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Nobody may be waiting - don't warn about an unretrieved exception
+            future.exception()
+            raise
+        finally:
+            del self._async_flights[loop_key]
+
+    def close(self) -> None:
+        self.transport.close()
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
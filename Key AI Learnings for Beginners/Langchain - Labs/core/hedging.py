@@ -0,0 +1,311 @@
+"""
+Hedged Requests
+Cut tail latency by racing a duplicate request against a slow one.
+
+Every call's latency goes into a rolling per-model window. Once a call has
+been running longer than the model's p95 (settings.HEDGE_PERCENTILE), a
+second identical request is sent; whichever answers first wins and the other
+is cancelled. A budget (settings.HEDGE_MAX_EXTRA_LOAD) caps how many extra
+requests hedging may add, so it never turns into a load multiplier.
+
+The same window gives adaptive timeouts: instead of a fixed 30 s, a call is
+abandoned after a multiple of the observed p99.
+
+    response = hedged_create(client, model=..., messages=[...])
+    answer = hedge_runnable(prompt | llm | parser, settings.OPENAI_MODEL).invoke({...})
+"""
+
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextvars import copy_context
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+
+from langchain_core.runnables import RunnableLambda
+
+from core import settings
+from core.coalesce import no_coalescing
+
+
+class WorkerPoolFull(TimeoutError):
+    """Raised when every worker thread is still busy with an earlier, abandoned call."""
+
+
+class WorkerPool:
+    """Thread pool for sync calls with a deadline that refuses work instead of queueing it.
+
+    A timed-out call can't be killed: its thread runs on until the request
+    returns. Once every worker is stuck like that, submit() raises
+    WorkerPoolFull at once rather than queueing the call behind hung ones,
+    where it would spend its whole deadline waiting for a thread.
+    """
+
+    def __init__(self, workers: int, name: str):
+        self.workers = workers
+        self.name = name
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+        self._slots = threading.BoundedSemaphore(workers)
+
+    def submit(self, fn: Callable[..., Any], *args: Any) -> Future:
+        """fn(*args) in a worker thread, with the caller's context"""
+        if not self._slots.acquire(blocking=False):
+            raise WorkerPoolFull(f"all {self.workers} {self.name} workers are busy with unfinished calls")
+        try:
+            future = self._executor.submit(copy_context().run, fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+
+# Sync calls race in worker threads; a losing thread is abandoned, not killed
+_pool = WorkerPool(32, "hedge")
+
+
+def _percentile(values, pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+class LatencyTracker:
+    """Rolling window of recent call latencies per model."""
+
+    def __init__(self, window: int = settings.LATENCY_WINDOW, min_samples: int = settings.HEDGE_MIN_SAMPLES):
+        self.window = window
+        self.min_samples = min_samples
+        self._samples: Dict[str, Deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, model: str, seconds: float) -> None:
+        with self._lock:
+            self._samples.setdefault(model, deque(maxlen=self.window)).append(seconds)
+
+    def percentile(self, model: str, pct: float) -> Optional[float]:
+        """The pct-th percentile latency, or None until there are enough samples"""
+        with self._lock:
+            samples = list(self._samples.get(model, ()))
+        if len(samples) < self.min_samples:
+            return None
+        return _percentile(samples, pct)
+
+    def timeout_for(self, model: str) -> float:
+        """Adaptive timeout: a multiple of the observed p99, within [minimum, HTTP_TIMEOUT]"""
+        p99 = self.percentile(model, 99)
+        if p99 is None:
+            return settings.HTTP_TIMEOUT
+        timeout = p99 * settings.ADAPTIVE_TIMEOUT_FACTOR
+        return max(settings.ADAPTIVE_TIMEOUT_MIN, min(settings.HTTP_TIMEOUT, timeout))
+
+
+# Shared by every Hedger in the process
+latency_tracker = LatencyTracker()
+
+
+class Hedger:
+    """Runs calls for one model with hedging and an adaptive deadline."""
+
+    def __init__(
+        self,
+        model: str,
+        tracker: LatencyTracker = latency_tracker,
+        percentile: float = settings.HEDGE_PERCENTILE,
+        max_extra_load: float = settings.HEDGE_MAX_EXTRA_LOAD,
+    ):
+        self.model = model
+        self.tracker = tracker
+        self.hedge_percentile = percentile
+        self.max_extra_load = max_extra_load
+        self.calls = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        # What callers saw (with hedging) vs how long the first attempt took (without);
+        # a first attempt cancelled by a winning hedge only counts as long as it ran
+        self.latencies: Deque[float] = deque(maxlen=tracker.window)
+        self.primary_latencies: Deque[float] = deque(maxlen=tracker.window)
+        self._lock = threading.Lock()
+
+    def hedge_delay(self) -> Optional[float]:
+        """How long to wait before hedging (None = not enough history yet)"""
+        return self.tracker.percentile(self.model, self.hedge_percentile)
+
+    def _take_hedge(self) -> bool:
+        """Spend one hedge from the extra-load budget, if any is left"""
+        with self._lock:
+            if self.hedges + 1 > self.max_extra_load * self.calls:
+                return False
+            self.hedges += 1
+            return True
+
+    def _attempt(self, fn: Callable[[], Any], primary: bool) -> Any:
+        start = time.perf_counter()
+        succeeded = False
+        try:
+            result = fn()
+            succeeded = True
+            return result
+        finally:
+            elapsed = time.perf_counter() - start
+            # Only answers go into the shared window: a fast failure would drag
+            # the percentiles (and every timeout) down, a timeout would push them up
+            if succeeded:
+                self.tracker.observe(self.model, elapsed)
+            if primary:
+                self.primary_latencies.append(elapsed)
+
+    async def _aattempt(self, fn: Callable[[], Awaitable[Any]], primary: bool) -> Any:
+        start = time.perf_counter()
+        succeeded = False
+        try:
+            result = await fn()
+            succeeded = True
+            return result
+        finally:
+            elapsed = time.perf_counter() - start
+            # Cancelled or failed attempts never answered: keep them out of the shared window
+            if succeeded:
+                self.tracker.observe(self.model, elapsed)
+            # ...but a cancelled primary still counts, as a lower bound, in the unhedged stats
+            if primary:
+                self.primary_latencies.append(elapsed)
+
+    def call(self, fn: Callable[[], Any]) -> Any:
+        """Run fn(), hedging it with a second fn() when it is slower than usual"""
+        with self._lock:
+            self.calls += 1
+        start = time.perf_counter()
+        deadline = start + self.tracker.timeout_for(self.model)
+
+        def hedge():
+            # The duplicate must really go upstream, not join the slow request
+            with no_coalescing():
+                return self._attempt(fn, primary=False)
+
+        primary = _pool.submit(self._attempt, fn, True)
+        pending = {primary}
+        delay = self.hedge_delay()
+        if delay is not None:
+            done, _ = wait(pending, timeout=delay)
+            if not done and self._take_hedge():
+                try:
+                    pending.add(_pool.submit(hedge))
+                except WorkerPoolFull:
+                    with self._lock:
+                        self.hedges -= 1
+
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = wait(pending, timeout=max(0.0, deadline - time.perf_counter()),
+                                 return_when=FIRST_COMPLETED)
+            if not done:
+                raise TimeoutError(f"{self.model}: no answer within the adaptive timeout")
+            for future in done:
+                if future.exception() is None:
+                    for other in pending:
+                        other.cancel()
+                    self._finish(start, future is not primary)
+                    return future.result()
+                error = error or future.exception()
+        raise error
+
+    async def acall(self, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Async version of call(); the losing request is cancelled"""
+        with self._lock:
+            self.calls += 1
+        start = time.perf_counter()
+
+        async def hedge():
+            with no_coalescing():
+                return await self._aattempt(fn, primary=False)
+
+        primary = asyncio.create_task(self._aattempt(fn, primary=True))
+        pending = {primary}
+        try:
+            async with asyncio.timeout(self.tracker.timeout_for(self.model)):
+                delay = self.hedge_delay()
+                if delay is not None:
+                    done, _ = await asyncio.wait(pending, timeout=delay)
+                    if not done and self._take_hedge():
+                        pending.add(asyncio.create_task(hedge()))
+
+                error: Optional[BaseException] = None
+                while pending:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        if task.exception() is None:
+                            self._finish(start, task is not primary)
+                            return task.result()
+                        error = error or task.exception()
+                raise error
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+    def _finish(self, start: float, hedge_won: bool) -> None:
+        self.latencies.append(time.perf_counter() - start)
+        if hedge_won:
+            with self._lock:
+                self.hedge_wins += 1
+
+    def stats(self) -> dict:
+        def pct(values, p):
+            return _percentile(values, p) if values else None
+        return {
+            "calls": self.calls,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "extra_load": self.hedges / self.calls if self.calls else 0.0,
+            "p50": pct(self.latencies, 50),
+            "p99": pct(self.latencies, 99),
+            "unhedged_p50": pct(self.primary_latencies, 50),
+            "unhedged_p99": pct(self.primary_latencies, 99),
+            "timeout": self.tracker.timeout_for(self.model),
+        }
+
+    def summary(self) -> str:
+        s = self.stats()
+
+        def ms(value):
+            return f"{value * 1000:.0f} ms" if value is not None else "n/a"
+        return (f"{self.model}: {s['calls']} calls, {s['hedges']} hedged ({s['extra_load']:.0%} extra load, "
+                f"{s['hedge_wins']} won) | p50 {ms(s['p50'])}, p99 {ms(s['p99'])} "
+                f"(without hedging: p50 {ms(s['unhedged_p50'])}, p99 {ms(s['unhedged_p99'])}) | "
+                f"timeout {s['timeout']:.1f}s")
+
+
+@lru_cache(maxsize=None)
+def get_hedger(model: str) -> Hedger:
+    """Process-wide Hedger for `model`"""
+    return Hedger(model)
+
+
+def hedged_create(client, **kwargs):
+    """client.chat.completions.create() with hedging and an adaptive timeout"""
+    model = kwargs["model"]
+    kwargs.setdefault("timeout", latency_tracker.timeout_for(model))
+    return get_hedger(model).call(lambda: client.chat.completions.create(**kwargs))
+
+
+async def ahedged_create(client, **kwargs):
+    """Async version of hedged_create() for openai.AsyncOpenAI"""
+    model = kwargs["model"]
+    kwargs.setdefault("timeout", latency_tracker.timeout_for(model))
+    return await get_hedger(model).acall(lambda: client.chat.completions.create(**kwargs))
+
+
+def hedge_runnable(runnable, model: str) -> RunnableLambda:
+    """Wrap a chat model or chain so invoke/ainvoke are hedged as calls to `model`"""
+    hedger = get_hedger(model)
+
+    def invoke(value, config):
+        return hedger.call(lambda: runnable.invoke(value, config))
+
+    async def ainvoke(value, config):
+        return await hedger.acall(lambda: runnable.ainvoke(value, config))
+
+    return RunnableLambda(invoke, afunc=ainvoke, name=f"Hedged[{model}]")
@@ -0,0 +1,213 @@
+"""
+Mock Transport
+An in-process stand-in for the OpenAI HTTP API.
+
+FakeOpenAITransport plugs into httpx, so the real openai.OpenAI client and
+ChatOpenAI run their full code paths (request building, retries, JSON
+decoding, parsing) while the "network" returns canned ChatCompletion
+payloads - including streaming (SSE) responses - with optional latency.
+
+Used by the benchmarks in scripts/ and anywhere a deterministic, free
+endpoint is needed.
+"""
+
+import asyncio
+import itertools
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional, Union
+
+import httpx
+
+from core.prefix_cache import PROMPT_CACHE_MIN_TOKENS
+from core.tokens import count_prompt_tokens, count_text
+
+# A responder gets the decoded request body and returns the assistant text
+# (or a full ChatCompletion dict for complete control over the payload)
+Responder = Callable[[dict], Union[str, dict]]
+
+_ids = itertools.count(1)
+
+# Provider prompt caching: prefixes of at least PROMPT_CACHE_MIN_TOKENS, reused in 128-token steps
+PROMPT_CACHE_INCREMENT = 128
+# Message prefixes remembered for cached_tokens, least-recently-seen dropped first
+PROMPT_CACHE_MAX_PREFIXES = 10_000
+
+
+def completion_payload(content: str, model: str = "gpt-4.1-mini", prompt_tokens: int = 0,
+                       completion_tokens: Optional[int] = None, cached_tokens: int = 0) -> dict:
+    """A ChatCompletion response body in the exact shape the API returns"""
+    completion_tokens = count_text(content) if completion_tokens is None else completion_tokens
+    return {
+        "id": f"chatcmpl-mock{next(_ids)}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "finish_reason": "stop",
+            "logprobs": None,
+            "message": {"role": "assistant", "content": content, "refusal": None},
+        }],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "prompt_tokens_details": {"cached_tokens": cached_tokens, "audio_tokens": 0},
+            "completion_tokens_details": {"reasoning_tokens": 0, "audio_tokens": 0},
+        },
+    }
+
+
+def sse_payload(payload: dict, chunk_chars: int = 8) -> bytes:
+    """Turn a ChatCompletion dict into the server-sent-event stream the API would send"""
+    content = payload["choices"][0]["message"]["content"] or ""
+    base = {"id": payload["id"], "object": "chat.completion.chunk",
+            "created": payload["created"], "model": payload["model"]}
+    events = []
+    for i in range(0, len(content), chunk_chars):
+        delta = {"content": content[i:i + chunk_chars]}
+        if i == 0:
+            delta["role"] = "assistant"
+        events.append({**base, "choices": [{"index": 0, "delta": delta, "finish_reason": None}]})
+    events.append({**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+    events.append({**base, "choices": [], "usage": payload["usage"]})
+    body = b"".join(b"data: " + json.dumps(event).encode() + b"\n\n" for event in events)
+    return body + b"data: [DONE]\n\n"
+
+
+def _schema_answer(body: dict, answer: str) -> str:
+    """Reshape a text answer into JSON for a json_schema response_format request"""
+    from core.output_repair import repair_json
+
+    properties = body["response_format"]["json_schema"]["schema"].get("properties", {})
+    try:
+        data = repair_json(answer)
+    except ValueError:
+        data = None
+    if not isinstance(data, dict):
+        # A one-field object wrapping the plain answer (e.g. {"difficulty": "advanced"})
+        data = {name: answer.strip() for name in list(properties)[:1]}
+    return json.dumps({key: value for key, value in data.items() if key in properties})
+
+
+def canned_lab_response(body: dict) -> str:
+    """Answers shaped like the ones the lab chains expect, picked from the prompt text"""
+    if (body.get("response_format") or {}).get("type") == "json_schema":
+        # Pick the canned answer as if the schema's field names were in the prompt
+        fields = " ".join(f'"{name}"' for name in body["response_format"]["json_schema"]["schema"].get("properties", {}))
+        last = body["messages"][-1]
+        plain = {"messages": [*body["messages"][:-1], {**last, "content": f"{last.get('content') or ''} {fields}"}]}
+        return _schema_answer(body, canned_lab_response(plain))
+    # Instructions may sit in a system message (prefix layout), so look at all of them
+    parts = []
+    for message in body["messages"]:
+        content = message.get("content") or ""
+        if isinstance(content, list):
+            content = " ".join(part.get("text", "") for part in content)
+        parts.append(content)
+    text = "\n\n".join(parts)
+    if "one object per item" in text:
+        # A packed prompt (core/packing.py): answer each "[n] item" line
+        ids = re.findall(r"^\[(\d+)\]", text, flags=re.MULTILINE)
+        single = canned_lab_response({"messages": [{"content": text.split("\n\n")[0]}]})
+        return json.dumps([{"id": int(i), "answer": single} for i in ids])
+    if "TechInfo" in text or '"year_released"' in text or "Provide details about" in text:
+        return '{"name": "React", "year_released": 2013, "creator": "Meta", "tags": ["ui", "javascript"]}'
+    if '"answer"' in text and '"source"' in text:
+        return '```json\n{"answer": "Paris", "source": "https://en.wikipedia.org/wiki/Paris"}\n```'
+    if "JSON" in text:
+        return '{"name": "Python", "rank": 1, "attribute": "readability"}'
+    if "comma" in text:
+        return "supply chain tracking, digital identity, cross-border payments"
+    if "Confidence" in text:
+        return "Confidence: 85\nReasoning: Well studied but still evolving."
+    if "difficulty" in text.lower():
+        return "advanced"
+    return "Blockchain is a tamper-resistant shared ledger; it is slow and energy hungry."
+
+
+class FakeOpenAITransport(httpx.BaseTransport, httpx.AsyncBaseTransport):
+    """httpx transport that answers /chat/completions locally (sync and async)."""
+
+    def __init__(self, responder: Responder = canned_lab_response,
+                 latency: Union[float, Callable[[], float]] = 0.0, model: str = "gpt-4.1-mini",
+                 structured_output: bool = True, prompt_cache: bool = True):
+        self.responder = responder
+        # False: reject json_schema response formats like models without support do
+        self.structured_output = structured_output
+        # Message prefixes seen so far, to report cached_tokens like the real API
+        self.prompt_cache = prompt_cache
+        self._prefixes: "OrderedDict[str, None]" = OrderedDict()
+        self._prefixes_lock = threading.Lock()
+        self.latency = latency
+        self.model = model
+        self.requests = 0
+
+    def _latency(self) -> float:
+        """Seconds to wait; a callable latency is sampled per request (e.g. a heavy tail)"""
+        return self.latency() if callable(self.latency) else self.latency
+
+    def _cached_tokens(self, messages: list) -> int:
+        """Tokens of the longest leading run of messages sent before (whole messages only)"""
+        cached = 0
+        for end in range(1, len(messages) + 1):
+            key = json.dumps(messages[:end], sort_keys=True)
+            with self._prefixes_lock:
+                seen = key in self._prefixes
+                if seen:
+                    self._prefixes.move_to_end(key)
+                else:
+                    self._prefixes[key] = None
+                    if len(self._prefixes) > PROMPT_CACHE_MAX_PREFIXES:
+                        self._prefixes.popitem(last=False)
+            if seen:
+                cached = count_prompt_tokens(messages[:end])
+        if cached < PROMPT_CACHE_MIN_TOKENS:
+            return 0
+        return cached - cached % PROMPT_CACHE_INCREMENT
+
+    def _respond(self, request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content or b"{}")
+        if not self.structured_output and (body.get("response_format") or {}).get("type") == "json_schema":
+            return httpx.Response(400, json={"error": {
+                "message": "Invalid parameter: 'response_format' of type 'json_schema' is not supported with this model.",
+                "type": "invalid_request_error", "param": "response_format", "code": None,
+            }})
+        answer = self.responder(body)
+        if isinstance(answer, dict):
+            payload = answer
+        else:
+            messages = body.get("messages", [])
+            cached = self._cached_tokens(messages) if self.prompt_cache else 0
+            payload = completion_payload(answer, body.get("model") or self.model,
+                                         count_prompt_tokens(messages), cached_tokens=cached)
+        if body.get("stream"):
+            return httpx.Response(200, content=sse_payload(payload),
+                                  headers={"content-type": "text/event-stream"})
+        return httpx.Response(200, json=payload)
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        request.read()
+        self.requests += 1
+        latency = self._latency()
+        if latency:
+            time.sleep(latency)
+        return self._respond(request)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        await request.aread()
+        self.requests += 1
+        latency = self._latency()
+        if latency:
+            await asyncio.sleep(latency)
+        return self._respond(request)
+
+
+def mock_clients(transport: Optional[FakeOpenAITransport] = None):
+    """(httpx.Client, httpx.AsyncClient) pair routed to the fake transport"""
+    transport = transport or FakeOpenAITransport()
+    return httpx.Client(transport=transport), httpx.AsyncClient(transport=transport)
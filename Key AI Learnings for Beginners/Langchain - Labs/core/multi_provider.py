@@ -0,0 +1,100 @@
+"""
+Multi-Provider Executor
+Send the same prompt to every configured chat model at the same time.
+
+Calls go out concurrently with `ainvoke`, so wall time is close to the
+slowest provider (all results) or the fastest one (first valid answer wins)
+instead of the sum of every provider's latency. Each call goes through the
+provider/model's circuit breaker (core/circuit_breaker.py), so a provider
+that keeps failing is skipped in a millisecond instead of timing out again.
+"""
+
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional
+
+from core.circuit_breaker import get_breaker, model_name
+
+DEFAULT_TIMEOUT = 30.0
+
+
+@dataclass
+class ProviderResult:
+    """Outcome of one provider call."""
+    provider: str
+    content: Any = None
+    error: Optional[BaseException] = None
+    latency: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+async def _call_provider(name, llm, prompt, timeout) -> ProviderResult:
+    """Run one ainvoke under its own deadline and capture the outcome"""
+    breaker = get_breaker(f"{name}/{model_name(llm)}")
+    start = time.perf_counter()
+    try:
+        response = await breaker.acall(lambda: llm.ainvoke(prompt), timeout)
+        return ProviderResult(name, content=response.content, latency=time.perf_counter() - start)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        return ProviderResult(name, error=e, latency=time.perf_counter() - start)
+
+
+def _start_calls(llms, prompt, timeouts, default_timeout) -> Dict[asyncio.Task, str]:
+    timeouts = timeouts or {}
+    return {
+        asyncio.create_task(
+            _call_provider(name, llm, prompt, timeouts.get(name, default_timeout))
+        ): name
+        for name, llm in llms.items()
+    }
+
+
+async def run_all(
+    llms: Dict[str, Any],
+    prompt: Any,
+    timeouts: Optional[Dict[str, float]] = None,
+    default_timeout: float = DEFAULT_TIMEOUT,
+) -> Dict[str, ProviderResult]:
+    """Send the prompt to every provider and wait for all of them.
+
+    A timeout or error on one provider is recorded in its result and never
+    stops the others. Results keep the order of `llms`.
+    """
+    tasks = _start_calls(llms, prompt, timeouts, default_timeout)
+    results = await asyncio.gather(*tasks)
+    return {result.provider: result for result in results}
+
+
+async def run_first(
+    llms: Dict[str, Any],
+    prompt: Any,
+    timeouts: Optional[Dict[str, float]] = None,
+    default_timeout: float = DEFAULT_TIMEOUT,
+    is_valid: Optional[Callable[[ProviderResult], bool]] = None,
+) -> Optional[ProviderResult]:
+    """Send the prompt to every provider and return the first valid answer.
+
+    The remaining calls are cancelled as soon as a winner is found. Returns
+    None when every provider fails or `is_valid` rejects every answer.
+    """
+    is_valid = is_valid or (lambda result: bool(result.content))
+    pending = set(_start_calls(llms, prompt, timeouts, default_timeout))
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                result = task.result()
+                if result.ok and is_valid(result):
+                    return result
+        return None
+    finally:
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
@@ -0,0 +1,303 @@
+"""
+Output Repair
+Fix cosmetic parse failures locally before paying for an LLM round trip.
+
+Most "bad" outputs are only cosmetically wrong: JSON wrapped in a markdown
+fence or in prose, trailing commas, single quotes, Python literals,
+"2013" where an int is expected, "Advanced" instead of "advanced".
+LocalRepairParser tries the normal parser, then a deterministic local
+repair, and only then the (LLM-backed) OutputFixingParser / RetryOutputParser.
+"""
+
+import json
+import re
+import threading
+import typing
+from enum import Enum
+from typing import Any, Optional
+
+from langchain_core.exceptions import OutputParserException
+from langchain_core.output_parsers import BaseOutputParser, JsonOutputParser, PydanticOutputParser
+from pydantic import BaseModel, PrivateAttr, ValidationError
+
+_FENCE_RE = re.compile(r"```(?:json|JSON)?\s*(.*?)```", re.DOTALL)
+_TRAILING_COMMA_RE = re.compile(r",\s*([}\]])")
+_UNQUOTED_KEY_RE = re.compile(r'([{,]\s*)([A-Za-z_][A-Za-z0-9_]*)\s*:')
+_SINGLE_QUOTED_RE = re.compile(r"'((?:[^'\\]|\\.)*)'")
+_LINE_COMMENT_RE = re.compile(r"^\s*//.*$", re.MULTILINE)
+# A whole answer that is one number: optional currency sign, comma-grouped thousands
+_WHOLE_NUMBER_RE = re.compile(r"-?[$€£¥]?(\d{1,3}(?:,\d{3})+|\d+)(\.\d+)?")
+_SMART_QUOTES = str.maketrans({"“": '"', "”": '"', "‘": "'", "’": "'"})
+_PY_LITERALS = {"True": "true", "False": "false", "None": "null"}
+_PY_LITERAL_RE = re.compile(r"([:\[,]\s*)(True|False|None)(?=\s*(?:[,}\]]|$))")
+
+
+def extract_json_text(text: str) -> Optional[str]:
+    """Pull the JSON object/array out of a fence or surrounding prose"""
+    fenced = _FENCE_RE.search(text)
+    if fenced:
+        text = fenced.group(1)
+    start = min((i for i in (text.find("{"), text.find("[")) if i != -1), default=-1)
+    if start == -1:
+        return None
+
+    # Walk to the matching closing bracket, skipping brackets inside strings
+    depth, quote, escaped = 0, None, False
+    for i in range(start, len(text)):
+        char = text[i]
+        if quote:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == quote:
+                quote = None
+        elif char in "\"'":
+            quote = char
+        elif char in "{[":
+            depth += 1
+        elif char in "}]":
+            depth -= 1
+            if depth == 0:
+                return text[start:i + 1]
+    # Unterminated - return what there is and let the fixes below try
+    return text[start:]
+
+
+def _close_brackets(text: str) -> str:
+    """Close brackets a truncated response left open"""
+    stack = []
+    for c in re.sub(r'"(?:[^"\\]|\\.)*"', "", text):
+        if c in "{[":
+            stack.append("}" if c == "{" else "]")
+        elif c in "}]" and stack:
+            stack.pop()
+    return text + "".join(reversed(stack))
+
+
+# Applied one after another, cheapest and safest first; each result is re-tried
+_FIXES = [
+    lambda t: t.translate(_SMART_QUOTES),
+    lambda t: _LINE_COMMENT_RE.sub("", t),
+    _close_brackets,
+    lambda t: _TRAILING_COMMA_RE.sub(r"\1", t),
+    lambda t: _PY_LITERAL_RE.sub(lambda m: m.group(1) + _PY_LITERALS[m.group(2)], t),
+    lambda t: _UNQUOTED_KEY_RE.sub(r'\1"\2":', t),
+    # Last resort - would also touch apostrophes inside double-quoted strings
+    lambda t: _TRAILING_COMMA_RE.sub(
+        r"\1", _SINGLE_QUOTED_RE.sub(lambda m: json.dumps(m.group(1).replace("\\'", "'")), t)
+    ),
+]
+
+
+def repair_json(text: str) -> Any:
+    """Best-effort JSON decode of messy model output (raises ValueError when hopeless)"""
+    candidate = extract_json_text(text)
+    if candidate is None:
+        raise ValueError("no JSON object or array found")
+    try:
+        return json.loads(candidate)
+    except ValueError:
+        pass
+    for fix in _FIXES:
+        candidate = fix(candidate)
+        try:
+            return json.loads(candidate)
+        except ValueError:
+            continue
+    raise ValueError("could not repair JSON output")
+
+
+def normalise_enum(text: str, enum: type) -> Enum:
+    """Match 'Advanced', ' ADVANCED.', '"advanced"' or 'Difficulty.ADVANCED' to the enum member.
+
+    A longer answer is accepted only when it names exactly one member, and not
+    negated ("The difficulty is advanced."); anything ambiguous raises
+    ValueError so the LLM fixer can decide.
+    """
+    cleaned = text.strip().strip("\"'`.:;!").strip()
+    cleaned = cleaned.split(".")[-1].strip().lower()
+    for member in enum:
+        if cleaned in (str(member.value).lower(), member.name.lower()):
+            return member
+    lowered = text.lower()
+    mentioned = [member for member in enum
+                 if re.search(rf"\b{re.escape(str(member.value).lower())}\b", lowered)]
+    if len(mentioned) == 1:
+        value = re.escape(str(mentioned[0].value).lower())
+        if not re.search(rf"\b(?:not|no|isn't|never)\W+(?:\w+\W+)?{value}\b", lowered):
+            return mentioned[0]
+    raise ValueError(f"'{text}' is not one of {[m.value for m in enum]}")
+
+
+def _parse_number(text: str, annotation: type) -> Optional[float]:
+    """'1,299' -> 1299, '$1,299.99' -> 1299.99; None for ranges, prose or a fraction for an int"""
+    cleaned = text.strip().rstrip(".").replace(" ", "")
+    match = _WHOLE_NUMBER_RE.fullmatch(cleaned)
+    if not match:
+        return None
+    number = float(match.group(1).replace(",", "") + (match.group(2) or ""))
+    if cleaned.startswith("-"):
+        number = -number
+    if annotation is int:
+        return int(number) if number.is_integer() else None
+    return number
+
+
+def _coerce_value(value: Any, annotation: Any) -> Any:
+    origin = typing.get_origin(annotation)
+    if origin is typing.Union:
+        options = [arg for arg in typing.get_args(annotation) if arg is not type(None)]
+        return _coerce_value(value, options[0]) if len(options) == 1 else value
+    if annotation in (int, float) and isinstance(value, str):
+        number = _parse_number(value, annotation)
+        return value if number is None else number
+    if isinstance(annotation, type) and issubclass(annotation, Enum) and isinstance(value, str):
+        try:
+            return normalise_enum(value, annotation)
+        except ValueError:
+            return value
+    if origin in (list, typing.List) and isinstance(value, str):
+        return [part.strip() for part in value.split(",") if part.strip()]
+    return value
+
+
+def coerce_to_model(data: dict, model: type) -> BaseModel:
+    """Validate `data` against `model` after coercing near-miss field types"""
+    fields = model.model_fields
+    # Model keys may come back in a different case ("Name", "YEAR_RELEASED")
+    by_lower = {name.lower(): name for name in fields}
+    fixed = {}
+    for key, value in data.items():
+        name = key if key in fields else by_lower.get(str(key).lower(), key)
+        fixed[name] = _coerce_value(value, fields[name].annotation) if name in fields else value
+    return model.model_validate(fixed)
+
+
+class RepairStats:
+    """How parse failures were resolved: locally, by the LLM fallback, or not at all."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.parsed = 0
+        self.failures = 0
+        self.local_repaired = 0
+        self.fallback_repaired = 0
+        self.unrecovered = 0
+
+    def record(self, outcome: str) -> None:
+        with self._lock:
+            setattr(self, outcome, getattr(self, outcome) + 1)
+            if outcome != "parsed":
+                self.failures += 1
+
+    @property
+    def local_success_rate(self) -> float:
+        return self.local_repaired / self.failures if self.failures else 0.0
+
+    def summary(self) -> str:
+        return (f"{self.parsed} parsed first time, {self.failures} failures: "
+                f"{self.local_repaired} repaired locally ({self.local_success_rate:.0%}), "
+                f"{self.fallback_repaired} by LLM fallback, {self.unrecovered} unrecovered")
+
+
+# Shared counters for every LocalRepairParser unless one is given explicitly
+repair_stats = RepairStats()
+
+
+class LocalRepairParser(BaseOutputParser):
+    """Parser -> deterministic local repair -> optional LLM fixer, in that order.
+
+    `fallback` is usually OutputFixingParser.from_llm(...) or
+    RetryOutputParser.from_llm(...) wrapping the same `parser`.
+    """
+
+    parser: BaseOutputParser
+    fallback: Optional[BaseOutputParser] = None
+    _stats: RepairStats = PrivateAttr(default_factory=lambda: repair_stats)
+
+    def __init__(self, stats: Optional[RepairStats] = None, **kwargs: Any):
+        super().__init__(**kwargs)
+        if stats is not None:
+            self._stats = stats
+
+    @property
+    def stats(self) -> RepairStats:
+        return self._stats
+
+    @property
+    def _type(self) -> str:
+        return "local_repair"
+
+    def get_format_instructions(self) -> str:
+        return self.parser.get_format_instructions()
+
+    def repair(self, text: str) -> Any:
+        """Local, deterministic repair for the wrapped parser type (raises ValueError)"""
+        parser = self.parser
+        if isinstance(parser, PydanticOutputParser):
+            data = repair_json(text)
+            if isinstance(data, list) and len(data) == 1:
+                data = data[0]
+            try:
+                return coerce_to_model(data, parser.pydantic_object)
+            except (ValidationError, AttributeError) as e:
+                raise ValueError(str(e)) from e
+        if isinstance(parser, JsonOutputParser):
+            return repair_json(text)
+
+        enum = getattr(parser, "enum", None)
+        if isinstance(enum, type) and issubclass(enum, Enum):
+            return normalise_enum(text, enum)
+
+        schemas = getattr(parser, "response_schemas", None)
+        if schemas is not None:
+            data = repair_json(text)
+            missing = [s.name for s in schemas if s.name not in data]
+            if missing:
+                raise ValueError(f"missing keys: {missing}")
+            return data
+        raise ValueError(f"no local repair for {type(parser).__name__}")
+
+    def _parse_locally(self, text: str) -> tuple:
+        try:
+            result = self.parser.parse(text)
+            self._stats.record("parsed")
+            return True, result
+        except OutputParserException as error:
+            try:
+                result = self.repair(text)
+                self._stats.record("local_repaired")
+                return True, result
+            except ValueError:
+                return False, error
+
+    def parse(self, text: str) -> Any:
+        ok, result = self._parse_locally(text)
+        if ok:
+            return result
+        if self.fallback is None:
+            self._stats.record("unrecovered")
+            raise result
+        try:
+            fixed = self.fallback.parse(text)
+        except OutputParserException:
+            self._stats.record("unrecovered")
+            raise
+        self._stats.record("fallback_repaired")
+        return fixed
+
+    def parse_with_prompt(self, completion: str, prompt_value) -> Any:
+        ok, result = self._parse_locally(completion)
+        if ok:
+            return result
+        if self.fallback is None:
+            self._stats.record("unrecovered")
+            raise result
+        try:
+            fixed = self.fallback.parse_with_prompt(completion, prompt_value)
+        except OutputParserException:
+            self._stats.record("unrecovered")
+            raise
+        self._stats.record("fallback_repaired")
+        return fixed
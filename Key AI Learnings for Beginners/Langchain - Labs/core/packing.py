@@ -0,0 +1,255 @@
+"""
+Prompt Packing
+Answer many tiny classification / extraction inputs with one request.
+
+A call like "Rate the difficulty of learning {subject}" costs a few output
+tokens, but every request pays again for the instructions, the HTTP round
+trip and the per-request latency. A PromptPacker sends the instructions once
+with up to PACK_MAX_ITEMS numbered items and asks for a JSON array of
+answers keyed by item id:
+
+    [{"id": 1, "answer": "advanced"}, {"id": 2, "answer": "beginner"}]
+
+Each answer is parsed with the task's own parser (EnumOutputParser,
+RegexParser, ...) and handed back to its caller. An item whose answer is
+missing or does not parse falls back to the normal one-item chain, so a
+packed answer is never worse than an unpacked one.
+
+    packer = PromptPacker(llm, task)
+    packer.batch([{"subject": "Python"}, {"subject": "Quantum Physics"}])  # one request
+    packer.invoke({"subject": "Rust"})  # waits up to PACK_WINDOW_MS for company
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, List, Optional, Sequence
+
+from langchain_core.callbacks import UsageMetadataCallbackHandler
+from langchain_core.output_parsers import BaseOutputParser
+from langchain_core.runnables import Runnable, RunnableLambda
+
+from core import settings
+from core.output_repair import repair_json
+from core.prompt_registry import prompt_registry
+
+PACKED_TEMPLATE = """{instructions}
+
+Answer every item below on its own. Reply with ONLY a JSON array holding one object per item:
+[{{"id": <item id>, "answer": "<the answer for that item>"}}]
+
+Items:
+{items}"""
+
+# Packed requests are flushed on these threads, so the collector never blocks
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="pack")
+
+# Marks an item the packed answer did not cover (parsers may legitimately return None)
+_MISSING = object()
+
+
+@dataclass(frozen=True)
+class PackedTask:
+    """A small per-item prompt split into shared instructions and the item itself."""
+    name: str
+    instructions: str     # sent once per packed request
+    item_template: str    # one item, e.g. "{subject}"
+    parser: BaseOutputParser
+    single: Runnable      # the normal one-item chain, used as fallback
+
+
+class PackStats:
+    """Packed requests, fallbacks and tokens per item for one packer."""
+
+    def __init__(self):
+        self.items = 0
+        self.requests = 0
+        self.fallbacks = 0
+        self.usage = UsageMetadataCallbackHandler()
+        self._lock = threading.Lock()
+
+    def record(self, items: int, fallbacks: int) -> None:
+        with self._lock:
+            self.items += items
+            self.requests += 1
+            self.fallbacks += fallbacks
+
+    @property
+    def tokens(self) -> dict:
+        totals = {"input_tokens": 0, "output_tokens": 0}
+        for usage in self.usage.usage_metadata.values():
+            for key in totals:
+                totals[key] += usage.get(key, 0)
+        return totals
+
+    def summary(self) -> str:
+        tokens = self.tokens
+        per_item = (tokens["input_tokens"] / self.items) if self.items else 0.0
+        return (f"{self.items} items in {self.requests} packed requests "
+                f"({self.items / self.requests if self.requests else 0:.1f} items/request), "
+                f"{self.fallbacks} single-call fallbacks, {per_item:.0f} prompt tokens/item")
+
+
+class PromptPacker:
+    """Packs the inputs of one PackedTask into shared requests, with micro-batching."""
+
+    def __init__(
+        self,
+        llm,
+        task: PackedTask,
+        max_items: int = settings.PACK_MAX_ITEMS,
+        window: float = settings.PACK_WINDOW_MS / 1000,
+    ):
+        self.task = task
+        self.max_items = max_items
+        self.window = window
+        self.stats = PackStats()
+        prompt, _ = prompt_registry.compile(
+            f"{task.name}_packed",
+            PACKED_TEMPLATE,
+            partial_variables={"instructions": task.instructions},
+        )
+        self.chain = prompt | llm
+        self._config = {"callbacks": [self.stats.usage]}
+        # Micro-batching: invoke() callers queue here until the window closes
+        self._pending: List[tuple] = []
+        self._cond = threading.Condition()
+        self._collector: Optional[threading.Thread] = None
+
+    def render_items(self, inputs: Sequence[dict]) -> str:
+        return "\n".join(f"[{i}] {self.task.item_template.format(**item)}"
+                         for i, item in enumerate(inputs, start=1))
+
+    def split(self, text: str, count: int) -> list:
+        """Per-item parsed answers from a packed reply (_MISSING where unusable)"""
+        answers = [_MISSING] * count
+        try:
+            data = repair_json(text)
+        except ValueError:
+            return answers
+        if isinstance(data, dict):
+            # {"1": "...", "2": "..."} instead of the asked-for array
+            data = [{"id": key, "answer": value} for key, value in data.items()]
+        if not isinstance(data, list):
+            return answers
+        for entry in data:
+            if not isinstance(entry, dict) or "answer" not in entry:
+                continue
+            try:
+                index = int(entry.get("id")) - 1
+            except (TypeError, ValueError):
+                continue
+            if not 0 <= index < count or answers[index] is not _MISSING:
+                continue
+            try:
+                answers[index] = self.task.parser.parse(str(entry["answer"]))
+            except Exception:
+                continue
+        return answers
+
+    def _fallback_inputs(self, inputs, answers):
+        missing = [i for i, answer in enumerate(answers) if answer is _MISSING]
+        return missing, [inputs[i] for i in missing]
+
+    def _run_pack(self, inputs: Sequence[dict]) -> list:
+        """One packed request for up to max_items inputs; failed items are retried one by one"""
+        try:
+            reply = self.chain.invoke({"items": self.render_items(inputs)}, config=self._config)
+            answers = self.split(reply.content, len(inputs))
+        except Exception:
+            answers = [_MISSING] * len(inputs)
+        missing, retry = self._fallback_inputs(inputs, answers)
+        if retry:
+            singles = self.task.single.batch(retry, config=self._config, return_exceptions=True)
+            for index, result in zip(missing, singles):
+                answers[index] = result
+        self.stats.record(len(inputs), len(missing))
+        return answers
+
+    async def _arun_pack(self, inputs: Sequence[dict]) -> list:
+        try:
+            reply = await self.chain.ainvoke({"items": self.render_items(inputs)}, config=self._config)
+            answers = self.split(reply.content, len(inputs))
+        except Exception:
+            answers = [_MISSING] * len(inputs)
+        missing, retry = self._fallback_inputs(inputs, answers)
+        if retry:
+            singles = await self.task.single.abatch(retry, config=self._config, return_exceptions=True)
+            for index, result in zip(missing, singles):
+                answers[index] = result
+        self.stats.record(len(inputs), len(missing))
+        return answers
+
+    def _chunks(self, inputs: Sequence[dict]):
+        inputs = list(inputs)
+        return [inputs[i:i + self.max_items] for i in range(0, len(inputs), self.max_items)]
+
+    def batch(self, inputs: Sequence[dict], return_exceptions: bool = False) -> list:
+        """Answer every input, max_items per request, packs sent concurrently"""
+        results = [answer for pack in _executor.map(self._run_pack, self._chunks(inputs)) for answer in pack]
+        if not return_exceptions:
+            for result in results:
+                if isinstance(result, Exception):
+                    raise result
+        return results
+
+    async def abatch(self, inputs: Sequence[dict], return_exceptions: bool = False) -> list:
+        packs = await asyncio.gather(*(self._arun_pack(chunk) for chunk in self._chunks(inputs)))
+        results = [answer for pack in packs for answer in pack]
+        if not return_exceptions:
+            for result in results:
+                if isinstance(result, Exception):
+                    raise result
+        return results
+
+    # Micro-batching
+
+    def submit(self, inputs: dict) -> Future:
+        """Queue one input for the next packed request; the future gets its answer"""
+        future: Future = Future()
+        with self._cond:
+            self._pending.append((inputs, future))
+            if self._collector is None:
+                self._collector = threading.Thread(target=self._collect, name="pack-collector", daemon=True)
+                self._collector.start()
+            self._cond.notify()
+        return future
+
+    def invoke(self, inputs: dict, config: Optional[dict] = None) -> Any:
+        return self.submit(inputs).result()
+
+    async def ainvoke(self, inputs: dict, config: Optional[dict] = None) -> Any:
+        return await asyncio.wrap_future(self.submit(inputs))
+
+    def _collect(self) -> None:
+        """Close a pack when it is full or `window` seconds after its first item arrived"""
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                deadline = time.monotonic() + self.window
+                while len(self._pending) < self.max_items:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                group = self._pending[:self.max_items]
+                self._pending = self._pending[self.max_items:]
+            _executor.submit(self._flush, group)
+
+    def _flush(self, group: List[tuple]) -> None:
+        try:
+            answers = self._run_pack([inputs for inputs, _ in group])
+        except BaseException as e:
+            answers = [e] * len(group)
+        for (_, future), answer in zip(group, answers):
+            if isinstance(answer, BaseException):
+                future.set_exception(answer)
+            else:
+                future.set_result(answer)
+
+    def as_runnable(self) -> RunnableLambda:
+        """A Runnable whose invoke/ainvoke calls are micro-batched into packed requests"""
+        return RunnableLambda(self.invoke, afunc=self.ainvoke, name=f"Packed[{self.task.name}]")
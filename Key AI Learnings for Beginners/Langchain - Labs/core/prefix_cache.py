@@ -0,0 +1,126 @@
+"""
+Prefix Cache Report
+How much of each prompt the provider answered from its prompt cache, per template.
+
+Providers cache recently seen prompt prefixes on their side (OpenAI does it
+automatically from 1024 tokens) and bill those tokens at the much lower
+cached_input price from settings.MODEL_PRICES. Only an identical leading
+prefix counts, which is why prompt_registry's "prefix" layout puts every
+static instruction first.
+
+PrefixCacheTracker reads cached_tokens from every response and attributes it
+to the template whose static prefix opened the prompt (answers from the local
+response cache never reached the provider and are left out):
+
+    llm = settings.get_chat_openai(callbacks=[prefix_cache_tracker])
+    ...
+    for line in prefix_cache_tracker.report():
+        print(line)
+"""
+
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, List
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from core.prompt_registry import prompt_registry
+from core.response_cache import is_cache_hit
+from core.tokens import get_model_price
+
+INLINE = "(inline prompt)"
+# OpenAI only caches prompts from this length on
+PROMPT_CACHE_MIN_TOKENS = 1024
+
+
+@dataclass
+class TemplateCacheStats:
+    requests: int = 0
+    prompt_tokens: int = 0
+    cached_tokens: int = 0
+    saved: float = 0.0  # USD, versus paying the full input price for cached tokens
+
+    @property
+    def hit_ratio(self) -> float:
+        return self.cached_tokens / self.prompt_tokens if self.prompt_tokens else 0.0
+
+
+def cache_savings(model: str, cached_tokens: int) -> float:
+    """USD saved because `cached_tokens` prompt tokens were billed at the cached price"""
+    try:
+        price = get_model_price(model)
+    except KeyError:
+        return 0.0
+    return cached_tokens / 1000 * (price["input"] - price.get("cached_input", price["input"]))
+
+
+class PrefixCacheTracker(BaseCallbackHandler):
+    """Callback handler that collects cached prompt tokens per registered template."""
+
+    def __init__(self, registry=prompt_registry):
+        self.registry = registry
+        self.templates: Dict[str, TemplateCacheStats] = {}
+        self._runs: Dict[UUID, str] = {}
+        self._lock = threading.Lock()
+
+    def _template(self, messages) -> str:
+        first = messages[0] if messages else None
+        if first is not None and first.type == "system":
+            return self.registry.prefixes.get(first.content, INLINE)
+        return INLINE
+
+    def on_chat_model_start(self, serialized: dict, messages: List[list], *, run_id: UUID, **kwargs: Any) -> None:
+        self._runs[run_id] = self._template(messages[0] if messages else [])
+
+    def on_llm_end(self, response, *, run_id: UUID, **kwargs: Any) -> None:
+        name = self._runs.pop(run_id, INLINE)
+        for generations in response.generations:
+            for generation in generations:
+                if is_cache_hit(generation):
+                    # Answered by the local response cache: no provider call, nothing to count
+                    continue
+                message = getattr(generation, "message", None)
+                usage = getattr(message, "usage_metadata", None)
+                if usage:
+                    cached = (usage.get("input_token_details") or {}).get("cache_read", 0) or 0
+                    model = message.response_metadata.get("model_name", "")
+                    self.record(name, model, usage.get("input_tokens", 0), cached)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._runs.pop(run_id, None)
+
+    def record(self, template: str, model: str, prompt_tokens: int, cached_tokens: int) -> None:
+        with self._lock:
+            stats = self.templates.setdefault(template, TemplateCacheStats())
+            stats.requests += 1
+            stats.prompt_tokens += prompt_tokens
+            stats.cached_tokens += cached_tokens
+            stats.saved += cache_savings(model, cached_tokens)
+
+    def total(self) -> TemplateCacheStats:
+        total = TemplateCacheStats()
+        for stats in self.templates.values():
+            total.requests += stats.requests
+            total.prompt_tokens += stats.prompt_tokens
+            total.cached_tokens += stats.cached_tokens
+            total.saved += stats.saved
+        return total
+
+    def report(self) -> List[str]:
+        """One line per template plus a total: cache-hit ratio and money saved"""
+        lines = []
+        for name, stats in sorted(self.templates.items(), key=lambda item: -item[1].prompt_tokens):
+            lines.append(f"{name:<28} {stats.requests:>4} calls  {stats.cached_tokens:>7}/{stats.prompt_tokens:<7} "
+                         f"prompt tokens cached ({stats.hit_ratio:>4.0%})  saved ${stats.saved:.6f}")
+        total = self.total()
+        lines.append(f"{'total':<28} {total.requests:>4} calls  {total.cached_tokens:>7}/{total.prompt_tokens:<7} "
+                     f"prompt tokens cached ({total.hit_ratio:>4.0%})  saved ${total.saved:.6f}")
+        if total.requests and not total.cached_tokens:
+            lines.append(f"(nothing cached: prefixes shorter than {PROMPT_CACHE_MIN_TOKENS} tokens, "
+                         f"or not repeated within a few minutes, are never cached)")
+        return lines
+
+
+# Shared by every lab in the process
+prefix_cache_tracker = PrefixCacheTracker()
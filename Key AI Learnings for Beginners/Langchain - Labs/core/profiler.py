@@ -0,0 +1,253 @@
+"""
+Chain Profiler
+Where the time of a prompt | llm | parser chain goes, step by step.
+
+Inside `with profiler:` every Runnable step that runs - the prompt, the chat
+model, the parser and anything nested in them, such as the hidden LLM call
+an OutputFixingParser makes - is reported to the ChainProfiler. Chat model
+steps are split further with the HTTP attempts TracingTransport sees
+(only with settings.TRACING_ENABLED on; otherwise a chat model step is one
+block):
+
+    serialize   messages -> request payload, until the first request goes out
+    network     waiting on the provider (client-side rate-limit waits included)
+    retry_wait  SDK backoff between attempts
+    decode      response JSON -> ChatResult, after the last attempt
+
+Wall time, thread CPU time and - with memory=True - peak traced allocation
+are aggregated per call path over any number of invocations. report() gives
+the table, write_folded() collapsed stacks for flamegraph.pl / speedscope,
+so CPU hot spots stop hiding inside network latency:
+
+    profiler = ChainProfiler()
+    with profiler:
+        for item in inputs:
+            chains["pydantic"].invoke(item)
+    for line in profiler.report():
+        print(line)
+    profiler.write_folded(".cache/profiles/pydantic.folded")
+
+CPU time is per thread, so it is exact for invoke()/batch() and only a rough
+guide under asyncio, where other tasks run on the same thread.
+"""
+
+import os
+import threading
+import time
+import tracemalloc
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.tracers.context import register_configure_hook
+
+from core.tracing import watch_http
+
+# Segments of a chat model step that are spent waiting, not computing
+WAIT_SEGMENTS = ("network", "retry_wait")
+
+# The profiler of the `with profiler:` block this context runs in
+_active: ContextVar[Optional["ChainProfiler"]] = ContextVar("chain_profiler", default=None)
+register_configure_hook(_active, inheritable=True)
+
+
+@dataclass
+class StepStats:
+    """One call path, summed over every time it ran."""
+    calls: int = 0
+    wall: float = 0.0  # children included
+    self_wall: float = 0.0
+    self_cpu: float = 0.0
+    peak_bytes: int = 0  # largest traced allocation peak during one call
+
+
+class _Frame:
+    """A step in progress."""
+    __slots__ = ("path", "parent", "start", "cpu_start", "child_wall", "child_cpu",
+                 "mem_start", "peak", "attempts")
+
+    def __init__(self, path: Tuple[str, ...], parent: Optional["_Frame"]):
+        self.path = path
+        self.parent = parent
+        self.child_wall = 0.0
+        self.child_cpu = 0.0
+        self.mem_start = self.peak = 0
+        self.attempts: Optional[list] = None
+        self.start = time.perf_counter()
+        self.cpu_start = time.thread_time()
+
+
+class ChainProfiler(BaseCallbackHandler):
+    """Callback handler that builds a per-step timing (and allocation) profile."""
+
+    # Runs in the step's own context, which is how nested calls find their parent
+    run_inline = True
+
+    def __init__(self, memory: bool = False):
+        self.memory = memory
+        self.steps: Dict[Tuple[str, ...], StepStats] = {}
+        self.invocations = 0
+        # Call path -> position it was first seen at, so report() keeps execution order
+        self._seen: Dict[Tuple[str, ...], int] = {}
+        self._frames: Dict[UUID, _Frame] = {}
+        self._current: ContextVar[Optional[_Frame]] = ContextVar("profiler_frame", default=None)
+        self._lock = threading.Lock()
+        self._tokens: List[Any] = []
+        self._started_tracemalloc = False
+
+    # Profiling mode
+
+    def __enter__(self) -> "ChainProfiler":
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        self._tokens.append(_active.set(self))
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        _active.reset(self._tokens.pop())
+        if self._started_tracemalloc and not self._tokens:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+    # Recording
+
+    def _touch(self, frame: Optional[_Frame]) -> int:
+        """Fold the allocation peak so far into `frame` and its parents; returns current bytes"""
+        current, peak = tracemalloc.get_traced_memory()
+        while frame is not None:
+            frame.peak = max(frame.peak, peak)
+            frame = frame.parent
+        tracemalloc.reset_peak()
+        return current
+
+    def _start(self, run_id: UUID, parent_run_id: Optional[UUID], name: str) -> _Frame:
+        # A run without a parent inside another step (e.g. the chain an
+        # OutputFixingParser invokes on its own) belongs to that step
+        parent = self._frames.get(parent_run_id) if parent_run_id else self._current.get()
+        if parent is None:
+            with self._lock:
+                self.invocations += 1
+        frame = _Frame((parent.path if parent else ()) + (name.replace(";", ":"),), parent)
+        self._seen.setdefault(frame.path, len(self._seen))
+        if self.memory and tracemalloc.is_tracing():
+            frame.mem_start = frame.peak = self._touch(parent)
+        self._frames[run_id] = frame
+        self._current.set(frame)
+        return frame
+
+    def _record(self, path: Tuple[str, ...], wall: float, self_wall: float, self_cpu: float,
+                peak_bytes: int = 0) -> None:
+        with self._lock:
+            stats = self.steps.setdefault(path, StepStats())
+            stats.calls += 1
+            stats.wall += wall
+            stats.self_wall += self_wall
+            stats.self_cpu += self_cpu
+            stats.peak_bytes = max(stats.peak_bytes, peak_bytes)
+
+    def _segments(self, frame: _Frame, end: float) -> Tuple[float, float]:
+        """Record serialize / network / retry_wait / decode under a chat model step; (wall, cpu)"""
+        attempts = frame.attempts
+        segments = {
+            "serialize": attempts[0].start - frame.start,
+            "network": sum(a.end - a.start for a in attempts),
+            "retry_wait": sum(b.start - a.end for a, b in zip(attempts, attempts[1:])),
+            "decode": end - attempts[-1].end,
+        }
+        cpu = 0.0
+        for name, seconds in segments.items():
+            if name == "retry_wait" and len(attempts) == 1:
+                continue
+            self._seen.setdefault(frame.path + (name,), len(self._seen))
+            # Serializing and decoding are pure client-side work: count their wall time as CPU
+            busy = 0.0 if name in WAIT_SEGMENTS else seconds
+            self._record(frame.path + (name,), seconds, seconds, busy)
+            cpu += busy
+        return sum(segments.values()), cpu
+
+    def _end(self, run_id: UUID) -> None:
+        frame = self._frames.pop(run_id, None)
+        if frame is None:
+            return
+        end = time.perf_counter()
+        wall = end - frame.start
+        cpu = time.thread_time() - frame.cpu_start
+        peak = 0
+        if self.memory and tracemalloc.is_tracing():
+            self._touch(frame)
+            peak = frame.peak - frame.mem_start
+        if frame.attempts:
+            wall_segments, cpu_segments = self._segments(frame, end)
+            frame.child_wall += wall_segments
+            frame.child_cpu += cpu_segments
+        self._record(frame.path, wall, max(wall - frame.child_wall, 0.0),
+                     max(cpu - frame.child_cpu, 0.0), peak)
+        if frame.parent is not None:
+            frame.parent.child_wall += wall
+            frame.parent.child_cpu += cpu
+        if self._current.get() is frame:
+            self._current.set(frame.parent)
+
+    def on_chain_start(self, serialized: dict, inputs: Any, *, run_id: UUID,
+                       parent_run_id: Optional[UUID] = None, **kwargs: Any) -> None:
+        self._start(run_id, parent_run_id, kwargs.get("name") or (serialized or {}).get("name") or "chain")
+
+    def on_chain_end(self, outputs: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id)
+
+    def on_chain_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id)
+
+    def on_chat_model_start(self, serialized: dict, messages: List[list], *, run_id: UUID,
+                            parent_run_id: Optional[UUID] = None, **kwargs: Any) -> None:
+        name = kwargs.get("name") or (serialized or {}).get("name") or "chat_model"
+        self._start(run_id, parent_run_id, name).attempts = watch_http(run_id)
+
+    def on_llm_start(self, serialized: dict, prompts: List[str], *, run_id: UUID,
+                     parent_run_id: Optional[UUID] = None, **kwargs: Any) -> None:
+        self._start(run_id, parent_run_id, kwargs.get("name") or (serialized or {}).get("name") or "llm")
+
+    def on_llm_end(self, response, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id)
+
+    # Output
+
+    def report(self) -> List[str]:
+        """Call tree with mean wall / self / CPU time per invocation of the profiled chains"""
+        runs = max(self.invocations, 1)
+        total = sum(stats.wall for path, stats in self.steps.items() if len(path) == 1) or 1.0
+        lines = [f"{'step':<44}{'calls':>7}{'wall ms':>10}{'self ms':>10}{'cpu ms':>9}{'self %':>8}"
+                 + (f"{'peak KB':>9}" if self.memory else "")]
+        def order(path):
+            return tuple(self._seen.get(path[:i + 1], 0) for i in range(len(path)))
+
+        for path in sorted(self.steps, key=order):
+            stats = self.steps[path]
+            name = "  " * (len(path) - 1) + path[-1]
+            line = (f"{name[:43]:<44}{stats.calls:>7}{stats.wall / runs * 1000:>10.3f}"
+                    f"{stats.self_wall / runs * 1000:>10.3f}{stats.self_cpu / runs * 1000:>9.3f}"
+                    f"{stats.self_wall / total:>8.1%}")
+            if self.memory:
+                line += f"{stats.peak_bytes / 1024:>9.1f}"
+            lines.append(line)
+        waiting = sum(stats.self_wall for path, stats in self.steps.items() if path[-1] in WAIT_SEGMENTS)
+        lines.append(f"{self.invocations} invocations: {waiting / total:.0%} of wall time waiting on the "
+                     f"network, {1 - waiting / total:.0%} spent client-side")
+        return lines
+
+    def folded(self) -> List[str]:
+        """Collapsed stacks ("a;b;c <self microseconds>"), the flamegraph.pl input format"""
+        return [f"{';'.join(path)} {round(stats.self_wall * 1e6)}"
+                for path, stats in sorted(self.steps.items()) if stats.self_wall >= 1e-6]
+
+    def write_folded(self, path: str) -> str:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("\n".join(self.folded()) + "\n")
+        return path
@@ -0,0 +1,282 @@
+"""
+Prompt Registry
+Compile each prompt template once per process instead of on every chain build.
+
+Building a parser chain normally regenerates the parser's format instructions
+(a JSON schema dump for PydanticOutputParser / StructuredOutputParser) and
+validates a brand-new PromptTemplate every time. The registry does that work
+once per name, then hands out the same frozen template and parser:
+
+    prompt, parser = prompt_registry.compile(
+        "tech_info",
+        "Provide details about {technology}.\\n{format_instructions}",
+        parser=PydanticOutputParser(pydantic_object=TechInfo),
+    )
+
+Compiled templates pre-render their partial variables (format instructions
+included) into the template text, so formatting in hot loops is one join -
+in both layouts below, and render() always returns the single prompt string.
+
+With settings.PROMPT_LAYOUT = "prefix" the static lines of a template (its
+instructions and format instructions) are moved into a leading system message
+and only the lines with per-call variables stay in the user message. Every
+call then starts with the same bytes, which is what provider prompt caching
+matches on (see core/prefix_cache.py).
+"""
+
+import re
+import string
+import threading
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple, Union
+
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+from langchain_core.output_parsers import BaseOutputParser
+from langchain_core.prompts import ChatPromptTemplate, HumanMessagePromptTemplate, PromptTemplate
+from pydantic import ConfigDict, PrivateAttr
+
+from core import settings
+
+_formatter = string.Formatter()
+
+# A segment is either literal text or a (name, conversion, format_spec) field
+Segment = Any
+
+
+def _compile_segments(template: str, partials: Dict[str, Any]) -> Optional[Tuple[Segment, ...]]:
+    """Split an f-string template into literal text and fields, baking in static partials.
+
+    Returns None when the template uses attribute/index lookups ({a.b}, {a[0]}),
+    which the fast path does not handle.
+    """
+    segments = []
+    literal = []
+    for text, name, spec, conversion in _formatter.parse(template):
+        literal.append(text)
+        if name is None:
+            continue
+        if not name.isidentifier():
+            return None
+        if name in partials and not callable(partials[name]):
+            value = _formatter.convert_field(partials[name], conversion)
+            literal.append(_formatter.format_field(value, spec or ""))
+            continue
+        segments.append("".join(literal))
+        literal = []
+        segments.append((name, conversion, spec or ""))
+    segments.append("".join(literal))
+    return tuple(segment for segment in segments if segment != "")
+
+
+class CompiledPromptTemplate(PromptTemplate):
+    """A frozen PromptTemplate whose static partials are already rendered into the text."""
+
+    model_config = ConfigDict(frozen=True)
+
+    _segments: Optional[Tuple[Segment, ...]] = PrivateAttr(default=None)
+
+    def model_post_init(self, context: Any) -> None:
+        super().model_post_init(context)
+        if self.template_format == "f-string":
+            self._segments = _compile_segments(self.template, self.partial_variables)
+
+    def format(self, **kwargs: Any) -> str:
+        segments = self._segments
+        if segments is None:
+            return super().format(**kwargs)
+        for name, value in self.partial_variables.items():
+            # Only callable partials are left unrendered
+            if callable(value) and name not in kwargs:
+                kwargs[name] = value()
+        parts = []
+        for segment in segments:
+            if isinstance(segment, str):
+                parts.append(segment)
+                continue
+            name, conversion, spec = segment
+            value = kwargs[name]
+            if conversion is None and not spec:
+                parts.append(value if isinstance(value, str) else format(value))
+            else:
+                parts.append(_formatter.format_field(_formatter.convert_field(value, conversion), spec))
+        return "".join(parts)
+
+
+def _split_prefix(template: str, partials: Dict[str, Any]) -> Optional[Tuple[str, str]]:
+    """(static prefix text, per-call template) by line, or None when nothing is static.
+
+    A line is static when every field in it is a non-callable partial; static
+    lines are rendered now and keep their relative order in the prefix.
+    """
+    lines = template.split("\n")
+    # A closing answer cue ("Difficulty:") belongs right before the answer
+    cue = lines.pop() if len(lines) > 1 and lines[-1].rstrip().endswith(":") and "{" not in lines[-1] else None
+    static, dynamic = [], []
+    for line in lines:
+        fields = [name for _, name, _, _ in _formatter.parse(line) if name is not None]
+        if all(name in partials and not callable(partials[name]) for name in fields):
+            static.append(line.format(**{name: partials[name] for name in fields}))
+        else:
+            dynamic.append(line)
+    prefix = "\n".join(static).strip()
+    if not prefix or not dynamic:
+        return None
+    if cue is not None:
+        dynamic.append(cue)
+    return prefix, "\n".join(dynamic)
+
+
+class CompiledChatPromptTemplate(ChatPromptTemplate):
+    """Static system message + compiled user template, formatted without per-message templates."""
+
+    _system: Optional[SystemMessage] = PrivateAttr(default=None)
+    _human: Optional[CompiledPromptTemplate] = PrivateAttr(default=None)
+    # The original template as one string, for CompiledPrompt.render()
+    _text: Optional[CompiledPromptTemplate] = PrivateAttr(default=None)
+
+    def model_post_init(self, context: Any) -> None:
+        super().model_post_init(context)
+        system, human = self.messages
+        self._system, self._human = system, human.prompt
+
+    def format_messages(self, **kwargs: Any) -> List[BaseMessage]:
+        # The system message is shared between calls, as ChatPromptTemplate does
+        return [self._system, HumanMessage(content=self._human.format(**kwargs))]
+
+
+def _prefix_prompt(prefix: str, template: str, partials: Dict[str, Any],
+                   text: CompiledPromptTemplate) -> CompiledChatPromptTemplate:
+    """System message with the static prefix, then the per-call part as the user message"""
+    used = {field for _, field, _, _ in _formatter.parse(template) if field is not None}
+    human = CompiledPromptTemplate.from_template(
+        template, partial_variables={k: v for k, v in partials.items() if k in used},
+    )
+    prompt = CompiledChatPromptTemplate(
+        messages=[SystemMessage(content=prefix), HumanMessagePromptTemplate(prompt=human)], name=text.name,
+    )
+    prompt._text = text
+    return prompt
+
+
+def _literals(prompt: Union[CompiledPromptTemplate, CompiledChatPromptTemplate]) -> List[str]:
+    """The static text pieces of a rendered `prompt`, in order"""
+    if isinstance(prompt, ChatPromptTemplate):
+        pieces = []
+        for message in prompt.messages:
+            pieces.extend(_literals(message.prompt) if hasattr(message, "prompt") else [message.content])
+        return pieces
+    return [segment for segment in prompt._segments or () if isinstance(segment, str)]
+
+
+def _variables_pattern(prompt: Union[CompiledPromptTemplate, CompiledChatPromptTemplate]) -> Tuple["re.Pattern", int]:
+    """Regex capturing the per-call text around a prompt's static pieces, and their total size"""
+    pieces = [piece.strip() for piece in _literals(prompt) if piece.strip()]
+    pattern = "(.*)".join(["", *map(re.escape, pieces), ""])
+    return re.compile(pattern, re.DOTALL), sum(map(len, pieces))
+
+
+class CompiledPrompt(NamedTuple):
+    """A compiled template and the parser it was compiled for."""
+    prompt: Union[CompiledPromptTemplate, CompiledChatPromptTemplate]
+    parser: Optional[BaseOutputParser]
+
+    def render(self, **variables: Any) -> str:
+        """Fast path: the prompt text as one string (either layout), without building a PromptValue"""
+        prompt = self.prompt
+        if isinstance(prompt, CompiledChatPromptTemplate):
+            prompt = prompt._text
+        return prompt.format(**variables)
+
+
+class PromptRegistry:
+    """Name -> CompiledPrompt, compiled on first use and shared afterwards."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._prompts: Dict[str, CompiledPrompt] = {}
+        self._templates: Dict[str, str] = {}
+        # Prompt name -> (pattern over its rendered text, size of its static text)
+        self._patterns: Dict[str, Tuple["re.Pattern", int]] = {}
+        # Static prefix text -> prompt name, for per-template prompt-cache reports
+        self.prefixes: Dict[str, str] = {}
+        self.compiled = 0
+        self.reused = 0
+
+    def compile(
+        self,
+        name: str,
+        template: str,
+        parser: Optional[BaseOutputParser] = None,
+        partial_variables: Optional[Dict[str, Any]] = None,
+        layout: Optional[str] = None,
+    ) -> CompiledPrompt:
+        """Compile `template` under `name`, or return the copy compiled earlier.
+
+        When the template has a {format_instructions} slot, it is filled from
+        `parser.get_format_instructions()` - once. On later calls the cached
+        parser is returned and the `parser` argument is ignored.
+
+        `layout` ("inline" or "prefix", default settings.PROMPT_LAYOUT) picks a
+        single prompt string or a cacheable system prefix + user message.
+        """
+        with self._lock:
+            compiled = self._prompts.get(name)
+            if compiled is not None:
+                if self._templates[name] != template:
+                    raise ValueError(f"Prompt '{name}' is already registered with a different template")
+                self.reused += 1
+                return compiled
+
+            partials = dict(partial_variables or {})
+            if parser is not None and "{format_instructions}" in template:
+                partials.setdefault("format_instructions", parser.get_format_instructions())
+            split = _split_prefix(template, partials) if (layout or settings.PROMPT_LAYOUT) == "prefix" else None
+            # Runs of the prompt carry its name, so tracing can tell templates apart
+            text = CompiledPromptTemplate.from_template(template, partial_variables=partials, name=name)
+            if split is None:
+                prompt = text
+            else:
+                prompt = _prefix_prompt(*split, partials, text)
+                self.prefixes[split[0]] = name
+            compiled = CompiledPrompt(prompt, parser)
+            self._prompts[name] = compiled
+            self._templates[name] = template
+            self._patterns[name] = _variables_pattern(prompt)
+            self.compiled += 1
+            return compiled
+
+    def get(self, name: str) -> CompiledPrompt:
+        try:
+            return self._prompts[name]
+        except KeyError:
+            raise KeyError(f"No prompt compiled under '{name}'") from None
+
+    def split_variables(self, text: str) -> Tuple[Optional[str], str]:
+        """(prompt name, its per-call text) for a rendered prompt.
+
+        The name is None, and the text unchanged, when no compiled template
+        matches. When several match, the one with the most static text wins.
+        """
+        best, best_size, best_match = None, 0, None
+        for name, (pattern, size) in list(self._patterns.items()):
+            if size > best_size:
+                match = pattern.fullmatch(text)
+                if match:
+                    best, best_size, best_match = name, size, match
+        if best_match is None:
+            return None, text
+        return best, "\n".join(part.strip() for part in best_match.groups() if part.strip())
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._prompts
+
+    def clear(self) -> None:
+        with self._lock:
+            self._prompts.clear()
+            self._templates.clear()
+            self._patterns.clear()
+            self.prefixes.clear()
+            self.compiled = self.reused = 0
+
+
+# Shared by every lab in the process
+prompt_registry = PromptRegistry()
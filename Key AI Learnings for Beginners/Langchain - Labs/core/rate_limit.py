@@ -0,0 +1,400 @@
+"""
+Rate Limiting
+Client-side token buckets for requests per minute (RPM) and tokens per minute (TPM).
+
+Instead of firing requests until the provider answers 429 and then backing
+off, every call first reserves one request and its estimated tokens from the
+buckets of its model, waits exactly as long as needed, and is corrected with
+the real `usage` once the response arrives. Load stays just under the limit,
+so throughput is steady instead of bursts of 429s and retry stalls.
+
+- OpenAI calls (raw SDK and ChatOpenAI) are gated in RateLimitedTransport,
+  which settings wraps around the shared HTTP clients - cache hits never
+  reach it and are never delayed
+- Other LangChain chat models (ChatGoogleGenerativeAI, ...) use
+  chat_model_limiter(), LangChain's own `rate_limiter=` hook, together
+  with UsageSettler to correct the estimate
+
+Limits come from settings.RATE_LIMITS; buckets are shared by every thread
+and event loop in the process.
+"""
+
+import asyncio
+import json
+import threading
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+
+import httpx
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.rate_limiters import BaseRateLimiter
+
+from core import settings
+from core.tokens import count_prompt_tokens
+
+# Only the end of a streamed response is kept to find its usage chunk
+_SSE_TAIL_BYTES = 8192
+
+# Tokens reserved for the chat model run in this context: UsageSettler opens
+# the list when the run starts, _ChatModelLimiter.acquire() appends to it
+_reservations: ContextVar[Optional[List[int]]] = ContextVar("rate_limit_reservations", default=None)
+
+
+class TokenBucket:
+    """A refilling bucket where reservations may run into debt.
+
+    reserve() always takes the amount right away and returns how long the
+    caller has to wait until the bucket is back above zero. Callers are
+    therefore served in order and nobody spins or retries.
+    """
+
+    def __init__(self, per_minute: float, burst: Optional[float] = None):
+        self.rate = per_minute / 60.0
+        self.capacity = float(burst or per_minute)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount: float) -> float:
+        """Take `amount` now; return the seconds to wait before using it"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.level -= amount
+            return -self.level / self.rate if self.level < 0 else 0.0
+
+    def adjust(self, delta: float) -> None:
+        """Charge `delta` more (or refund when negative) after the fact"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.level = min(self.capacity, self.level - delta)
+
+    def drain(self, seconds: float) -> None:
+        """Empty the bucket for `seconds` (the provider said Retry-After)"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.level = min(self.level, -seconds * self.rate)
+
+
+@dataclass
+class LimiterStats:
+    requests: int = 0
+    waited: float = 0.0
+    reserved_tokens: int = 0
+    actual_tokens: int = 0
+    throttled: int = 0
+
+
+class RateLimiter:
+    """RPM + TPM buckets for one provider/model."""
+
+    def __init__(self, name: str, rpm: Optional[float] = None, tpm: Optional[float] = None):
+        self.name = name
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self.stats = LimiterStats()
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens: int) -> float:
+        """Reserve one request and `tokens` tokens; return the seconds to wait"""
+        waits = [0.0]
+        if self.requests:
+            waits.append(self.requests.reserve(1))
+        if self.tokens:
+            # A single request larger than the whole bucket would wait forever
+            waits.append(self.tokens.reserve(min(tokens, self.tokens.capacity)))
+        wait = max(waits)
+        with self._lock:
+            self.stats.requests += 1
+            self.stats.waited += wait
+            self.stats.reserved_tokens += tokens
+            if wait:
+                self.stats.throttled += 1
+        return wait
+
+    def acquire(self, tokens: int) -> None:
+        wait = self.reserve(tokens)
+        if wait:
+            time.sleep(wait)
+
+    async def aacquire(self, tokens: int) -> None:
+        wait = self.reserve(tokens)
+        if wait:
+            await asyncio.sleep(wait)
+
+    def settle(self, reserved: int, actual: Optional[int]) -> None:
+        """Correct a reservation with the real token count (None: unknown, the reservation stands)"""
+        if actual is None:
+            return
+        if self.tokens:
+            self.tokens.adjust(actual - reserved)
+        with self._lock:
+            self.stats.actual_tokens += actual
+
+    def backoff(self, seconds: float) -> None:
+        """Hold every caller back after the provider returned 429"""
+        if self.requests:
+            self.requests.drain(seconds)
+        if self.tokens:
+            self.tokens.drain(seconds)
+
+    def summary(self) -> str:
+        s = self.stats
+        return (f"{self.name}: {s.requests} requests, {s.throttled} throttled, "
+                f"{s.waited:.1f}s waited, {s.actual_tokens} tokens used "
+                f"({s.reserved_tokens} estimated)")
+
+
+@lru_cache(maxsize=None)
+def get_rate_limiter(model: Optional[str]) -> Optional[RateLimiter]:
+    """Process-wide limiter for `model` (prefix match on settings.RATE_LIMITS), or None"""
+    if not settings.RATE_LIMIT_ENABLED or not model:
+        return None
+    for name in sorted(settings.RATE_LIMITS, key=len, reverse=True):
+        if model.startswith(name):
+            limits = settings.RATE_LIMITS[name]
+            return RateLimiter(name, rpm=limits.get("rpm"), tpm=limits.get("tpm"))
+    return None
+
+
+def estimate_request_tokens(body: dict) -> int:
+    """Pre-flight estimate of a chat completion request: prompt + max output"""
+    prompt = count_prompt_tokens(body.get("messages") or [], body.get("model"))
+    output = body.get("max_completion_tokens") or body.get("max_tokens") or settings.RATE_LIMIT_OUTPUT_ESTIMATE
+    return prompt + output
+
+
+def _retry_after(response: httpx.Response) -> float:
+    try:
+        return float(response.headers.get("retry-after", "1"))
+    except ValueError:
+        return 1.0
+
+
+def _usage_from_sse(tail: bytes) -> Optional[int]:
+    """total_tokens from the last usage chunk of a streamed response"""
+    for line in reversed(tail.decode("utf-8", "ignore").splitlines()):
+        if line.startswith("data: {") and '"usage"' in line:
+            try:
+                usage = json.loads(line[6:]).get("usage")
+            except ValueError:
+                continue
+            if usage:
+                return usage.get("total_tokens")
+    return None
+
+
+class _SettlingStream(httpx.SyncByteStream, httpx.AsyncByteStream):
+    """Passes a streamed body through and settles the reservation when it closes."""
+
+    def __init__(self, stream, settle):
+        self._stream = stream
+        self._settle = settle
+        self._tail = b""
+        self._settled = False
+
+    def _keep(self, chunk: bytes) -> None:
+        self._tail = (self._tail + chunk)[-_SSE_TAIL_BYTES:]
+
+    def __iter__(self):
+        for chunk in self._stream:
+            self._keep(chunk)
+            yield chunk
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            self._keep(chunk)
+            yield chunk
+
+    def _settle_once(self) -> None:
+        if not self._settled:
+            self._settled = True
+            self._settle(_usage_from_sse(self._tail))
+
+    def close(self) -> None:
+        self._settle_once()
+        self._stream.close()
+
+    async def aclose(self) -> None:
+        self._settle_once()
+        await self._stream.aclose()
+
+
+class RateLimitedTransport(httpx.BaseTransport, httpx.AsyncBaseTransport):
+    """httpx transport that gates chat completion requests on their model's limiter."""
+
+    def __init__(self, transport):
+        self.transport = transport
+
+    def _limit(self, request: httpx.Request):
+        """(limiter, reserved tokens) for a chat completion request, else (None, 0)"""
+        if request.method != "POST" or not request.url.path.endswith("/chat/completions"):
+            return None, 0
+        try:
+            body = json.loads(request.content)
+        except ValueError:
+            return None, 0
+        limiter = get_rate_limiter(body.get("model"))
+        return limiter, estimate_request_tokens(body) if limiter else 0
+
+    def _finish(self, limiter: RateLimiter, reserved: int, response: httpx.Response) -> None:
+        """Settle non-streamed responses now, streamed ones when their body closes"""
+        if response.status_code == 429:
+            # Over the limit already: keep the reservation so the bucket stays drained
+            limiter.settle(reserved, None)
+            limiter.backoff(_retry_after(response))
+            return
+        if response.headers.get("content-type", "").startswith("text/event-stream"):
+            response.stream = _SettlingStream(response.stream, lambda actual: limiter.settle(reserved, actual))
+            return
+        try:
+            usage = json.loads(response.content).get("usage") or {}
+        except (ValueError, AttributeError):
+            usage = {}
+        actual = usage.get("total_tokens")
+        if actual is None and not response.is_success:
+            # Rejected requests (400, 401, 5xx) use no tokens
+            actual = 0
+        limiter.settle(reserved, actual)
+
+    @staticmethod
+    def _failed(limiter: RateLimiter, reserved: int, error: Exception) -> None:
+        """Settle a request that never got a response"""
+        # Never connected: nothing reached the provider. Anything later (a read
+        # timeout) may still have been processed, so the reservation stands
+        never_sent = isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout))
+        limiter.settle(reserved, 0 if never_sent else None)
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        limiter, reserved = self._limit(request)
+        if limiter is None:
+            return self.transport.handle_request(request)
+        limiter.acquire(reserved)
+        try:
+            response = self.transport.handle_request(request)
+        except Exception as e:
+            self._failed(limiter, reserved, e)
+            raise
+        if not response.headers.get("content-type", "").startswith("text/event-stream"):
+            response.read()
+        self._finish(limiter, reserved, response)
+        return response
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        limiter, reserved = self._limit(request)
+        if limiter is None:
+            return await self.transport.handle_async_request(request)
+        await limiter.aacquire(reserved)
+        try:
+            response = await self.transport.handle_async_request(request)
+        except Exception as e:
+            self._failed(limiter, reserved, e)
+            raise
+        if not response.headers.get("content-type", "").startswith("text/event-stream"):
+            await response.aread()
+        self._finish(limiter, reserved, response)
+        return response
+
+    def close(self) -> None:
+        self.transport.close()
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
+
+
+class _ChatModelLimiter(BaseRateLimiter):
+    """LangChain rate_limiter= hook backed by a shared RateLimiter.
+
+    LangChain does not pass the prompt to acquire(), so each request reserves
+    the running average of what recent requests really used; UsageSettler
+    corrects the difference once usage is known, against what that very run
+    reserved.
+    """
+
+    def __init__(self, limiter: RateLimiter):
+        self.limiter = limiter
+        self.estimate = settings.RATE_LIMIT_OUTPUT_ESTIMATE * 2
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> int:
+        with self._lock:
+            amount = int(self.estimate)
+        reservations = _reservations.get()
+        if reservations is not None:
+            reservations.append(amount)
+        return amount
+
+    def acquire(self, *, blocking: bool = True) -> bool:
+        self.limiter.acquire(self._reserve())
+        return True
+
+    async def aacquire(self, *, blocking: bool = True) -> bool:
+        await self.limiter.aacquire(self._reserve())
+        return True
+
+    def settle(self, reserved: int, actual: Optional[int]) -> None:
+        self.limiter.settle(reserved, actual)
+        if actual:
+            with self._lock:
+                self.estimate = 0.8 * self.estimate + 0.2 * actual
+
+
+class UsageSettler(BaseCallbackHandler):
+    """Feeds each response's usage_metadata back into a chat model limiter.
+
+    A run settles exactly what it reserved; a run that reserved nothing (an
+    answer from the response cache) settles nothing, and a failed run keeps
+    its reservation.
+    """
+
+    # Called in the run's own context, so acquire() finds the run's list
+    run_inline = True
+
+    def __init__(self, limiter: _ChatModelLimiter):
+        self.limiter = limiter
+        self._runs: Dict[UUID, List[int]] = {}
+
+    def on_chat_model_start(self, serialized: dict, messages: List[list], *, run_id: UUID,
+                            **kwargs: Any) -> None:
+        reservations: List[int] = []
+        _reservations.set(reservations)
+        self._runs[run_id] = reservations
+
+    def on_llm_end(self, response, *, run_id: UUID, **kwargs: Any) -> None:
+        reserved = sum(self._runs.pop(run_id, ()))
+        if not reserved:
+            return
+        actual = None
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if usage:
+                    actual = (actual or 0) + usage.get("total_tokens", 0)
+        self.limiter.settle(reserved, actual)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        reserved = sum(self._runs.pop(run_id, ()))
+        if reserved:
+            self.limiter.settle(reserved, None)
+
+
+@lru_cache(maxsize=None)
+def chat_model_limiter(model: Optional[str]) -> Optional[_ChatModelLimiter]:
+    """rate_limiter= for a LangChain chat model of `model` (None when unlimited)"""
+    limiter = get_rate_limiter(model)
+    return _ChatModelLimiter(limiter) if limiter else None
+
+
+def rate_limit_options(model: Optional[str]) -> dict:
+    """Keyword arguments that put a non-OpenAI LangChain chat model behind its limiter"""
+    limiter = chat_model_limiter(model)
+    if limiter is None:
+        return {}
+    return {"rate_limiter": limiter, "callbacks": [UsageSettler(limiter)]}
@@ -0,0 +1,254 @@
+"""
+Response Cache
+Disk-backed exact-match cache for LLM responses (SQLite).
+
+The same cache sits under both call paths:
+- ChatOpenAI / any LangChain chat model: pass `cache=get_response_cache()`
+- Raw SDK: `cached_create(client, cache, model=..., messages=...)`, or with
+  `create=` to keep another wrapper (e.g. hedged_create) on the miss path
+
+Entries are keyed by a canonical hash of the model, messages, temperature
+and every other sampling parameter, evicted least-recently-used once the
+cache is full, and dropped after their TTL. Answers served from the cache
+carry response_metadata["cache_hit"], so usage callbacks (tracing, token
+reports) can leave them out of what was spent.
+"""
+
+import enum
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, Callable, Optional
+
+from langchain_core.caches import BaseCache
+from langchain_core.messages import message_to_dict, messages_from_dict
+from langchain_core.outputs import ChatGeneration, Generation
+from pydantic import BaseModel
+
+from core import settings
+
+logger = logging.getLogger(__name__)
+
+# Per-call options that don't change the answer, left out of the key
+_CALL_OPTIONS = ("timeout", "extra_headers")
+# response_metadata / generation_info flag on answers served from a cache
+CACHE_HIT = "cache_hit"
+
+if TYPE_CHECKING:
+    from openai.types.chat import ChatCompletion
+
+
+def request_key(**params: Any) -> str:
+    """Canonical hash of a request - key order and whitespace never matter"""
+    payload = json.dumps(params, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _json_default(value: Any) -> Any:
+    """Structured-output payloads (parsed Pydantic models, enums) as plain JSON"""
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    if isinstance(value, enum.Enum):
+        return value.value
+    return str(value)
+
+
+def _dump_generations(generations) -> str:
+    rows = []
+    for gen in generations:
+        if isinstance(gen, ChatGeneration):
+            rows.append({"message": message_to_dict(gen.message), "info": gen.generation_info})
+        else:
+            rows.append({"text": gen.text, "info": gen.generation_info})
+    return json.dumps(rows, default=_json_default)
+
+
+def _load_generations(value: str):
+    generations = []
+    for row in json.loads(value):
+        if "message" in row:
+            message = messages_from_dict([row["message"]])[0]
+            generations.append(ChatGeneration(message=message, generation_info=row["info"]))
+        else:
+            generations.append(Generation(text=row["text"], generation_info=row["info"]))
+    return generations
+
+
+def mark_cache_hit(generations):
+    """Copies of cached generations flagged as cache hits (see is_cache_hit)"""
+    marked = []
+    for gen in generations:
+        if isinstance(gen, ChatGeneration):
+            message = gen.message.model_copy(
+                update={"response_metadata": {**gen.message.response_metadata, CACHE_HIT: True}})
+            marked.append(gen.model_copy(update={"message": message}))
+        elif isinstance(gen, Generation):
+            marked.append(gen.model_copy(update={"generation_info": {**(gen.generation_info or {}), CACHE_HIT: True}}))
+        else:
+            marked.append(gen)
+    return marked
+
+
+def is_cache_hit(generation) -> bool:
+    """True when a generation was served by a local cache, not paid for with an API call"""
+    message = getattr(generation, "message", None)
+    if message is not None and message.response_metadata.get(CACHE_HIT):
+        return True
+    return bool((getattr(generation, "generation_info", None) or {}).get(CACHE_HIT))
+
+
+class ResponseCache(BaseCache):
+    """SQLite response cache with LRU eviction, per-entry TTL and hit/miss counters."""
+
+    def __init__(self, path: str = ":memory:", max_entries: int = 10_000, ttl: Optional[float] = None):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL,"
+            " expires_at REAL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_lru ON responses(last_access)")
+        # Kept up to date by every write, so eviction never has to COUNT(*) the table
+        self._rows = self._count()
+
+    # ----- Raw key/value API -----
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached value for `key` or None (counts a hit or a miss)"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or (row[1] is not None and row[1] <= now):
+                if row is not None:
+                    self._rows -= self._conn.execute("DELETE FROM responses WHERE key = ?", (key,)).rowcount
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return row[0]
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        """Store `value` under `key`, evicting expired and least-recently-used entries"""
+        now = time.time()
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = now + ttl if ttl else None
+        with self._lock:
+            inserted = self._conn.execute(
+                "INSERT OR IGNORE INTO responses (key, value, expires_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, value, expires_at, now),
+            ).rowcount
+            if inserted:
+                self._rows += 1
+                self._evict(now)
+            else:
+                self._conn.execute(
+                    "UPDATE responses SET value = ?, expires_at = ?, last_access = ? WHERE key = ?",
+                    (value, expires_at, now, key),
+                )
+
+    def _evict(self, now: float) -> None:
+        if self._rows <= self.max_entries:
+            return
+        self._rows -= self._conn.execute(
+            "DELETE FROM responses WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,)
+        ).rowcount
+        overflow = self._rows - self.max_entries
+        if overflow > 0:
+            self._rows -= self._conn.execute(
+                "DELETE FROM responses WHERE key IN"
+                " (SELECT key FROM responses ORDER BY last_access LIMIT ?)",
+                (overflow,),
+            ).rowcount
+
+    def _count(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._rows
+
+    def stats(self) -> dict:
+        """Hit/miss counters and current size"""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self),
+        }
+
+    # ----- LangChain BaseCache API -----
+
+    def lookup(self, prompt: str, llm_string: str):
+        value = self.get(request_key(prompt=prompt, llm=llm_string))
+        return mark_cache_hit(_load_generations(value)) if value is not None else None
+
+    def update(self, prompt: str, llm_string: str, return_val) -> None:
+        # The answer is already paid for - a failed write must not lose it
+        try:
+            self.set(request_key(prompt=prompt, llm=llm_string), _dump_generations(return_val))
+        except (TypeError, ValueError, sqlite3.Error) as e:
+            logger.warning("response cache: could not store an answer: %r", e)
+
+    def clear(self, **kwargs: Any) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._rows = 0
+            self.hits = self.misses = 0
+
+
+def cached_create(client, cache: Optional[ResponseCache],
+                  create: Optional[Callable[..., "ChatCompletion"]] = None, **kwargs) -> "ChatCompletion":
+    """client.chat.completions.create() with the response cache in front of it.
+
+    `create` replaces the call made on a miss. Streaming requests, and every
+    request when `cache` is None, are passed straight through.
+    """
+    create = create or client.chat.completions.create
+    if cache is None or kwargs.get("stream"):
+        return create(**kwargs)
+
+    from openai.types.chat import ChatCompletion
+
+    # The endpoint is part of the request: a proxy or another provider answers differently
+    key = request_key(url=str(getattr(client, "base_url", "")),
+                      **{name: value for name, value in kwargs.items() if name not in _CALL_OPTIONS})
+    value = cache.get(key)
+    if value is not None:
+        return ChatCompletion.model_validate_json(value)
+
+    response = create(**kwargs)
+    try:
+        cache.set(key, response.model_dump_json())
+    except sqlite3.Error as e:
+        logger.warning("response cache: could not store an answer: %r", e)
+    return response
+
+
+@lru_cache(maxsize=None)
+def get_response_cache() -> Optional[ResponseCache]:
+    """Process-wide response cache from settings, or None when caching is disabled"""
+    # With a cassette in use every call must reach it, to be recorded or replayed in order
+    if not settings.LLM_CACHE_ENABLED or settings.CASSETTE_MODE in ("record", "replay"):
+        return None
+    return ResponseCache(
+        path=settings.LLM_CACHE_PATH,
+        max_entries=settings.LLM_CACHE_MAX_ENTRIES,
+        ttl=settings.LLM_CACHE_TTL,
+    )
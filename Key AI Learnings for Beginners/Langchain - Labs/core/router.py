@@ -0,0 +1,346 @@
+"""
+Model Router
+Pick the provider/model for each request instead of hard-coding one.
+
+A ModelRouter holds the chat models it may use (OpenAI, Gemini, ...), each
+with a quality tier (settings.ROUTER_MODEL_TIERS). A chain asks for a minimum
+tier, and every request goes to the eligible model with the lowest expected
+price of an answer:
+
+    (estimated cost + expected latency x settings.ROUTER_SECOND_PRICE)
+    / (1 - recent error rate)
+
+The cost comes from the request's estimated prompt size and
+settings.MODEL_PRICES; latency and error rate are moving averages
+(settings.ROUTER_SMOOTHING) that follow a model within a few calls. So easy
+chains land on the cheapest fast model, and a model that slows down or starts
+failing loses traffic to the next one. A
+small share of calls (settings.ROUTER_EXPLORE_RATE) goes to another eligible
+model so its statistics never go stale.
+
+Each attempt runs under the model's adaptive timeout (the rolling window
+shared with core/hedging.py) and its circuit breaker (core/circuit_breaker.py);
+a timeout, error or open circuit falls back to the next model in line. Every
+decision is recorded for report().
+
+    router = ModelRouter([Route("OpenAI", settings.OPENAI_MODEL, openai_llm),
+                          Route("Google", settings.GOOGLE_MODEL, google_llm)])
+    quick = prompt | router.runnable(tier=1, name="quick") | StrOutputParser()
+    for line in router.report():
+        print(line)
+"""
+
+import logging
+import random
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
+
+from langchain_core.runnables import Runnable
+
+from core import settings
+from core.circuit_breaker import CircuitOpenError, get_breaker
+from core.hedging import LatencyTracker, latency_tracker
+from core.tokens import count_prompt_tokens, get_model_price
+
+logger = logging.getLogger(__name__)
+
+# A model is never treated as more than this unreliable (keeps scores finite)
+MAX_ERROR_RATE = 0.9
+
+
+def route_price(model: str) -> Dict[str, float]:
+    """settings.MODEL_PRICES entry for `model`; an unpriced model costs as much as the dearest one"""
+    try:
+        return get_model_price(model)
+    except KeyError:
+        price = max(settings.MODEL_PRICES.values(), key=lambda p: p["input"] + p["output"])
+        logger.warning("router: no price for %s in settings.MODEL_PRICES, assuming %s", model, price)
+        return price
+
+
+def model_tier(model: str) -> int:
+    """Quality tier of `model` (prefix match, longest first); unknown models are tier 1"""
+    for name in sorted(settings.ROUTER_MODEL_TIERS, key=len, reverse=True):
+        if model.startswith(name):
+            return settings.ROUTER_MODEL_TIERS[name]
+    return 1
+
+
+@dataclass
+class Route:
+    """One chat model the router may send requests to."""
+    provider: str
+    model: str
+    llm: Any
+    tier: Optional[int] = None
+
+    def __post_init__(self):
+        if self.tier is None:
+            self.tier = model_tier(self.model)
+        self.price = route_price(self.model)
+        self.breaker = get_breaker(self.name)
+
+    @property
+    def name(self) -> str:
+        return f"{self.provider}/{self.model}"
+
+
+@dataclass
+class Decision:
+    """Where one request went."""
+    chain: str
+    tier: int
+    prompt_tokens: int
+    ranking: List[str]
+    # (route, "ok" | "timeout" | "error" | "skipped": circuit open)
+    attempts: List[Tuple[str, str]] = field(default_factory=list)
+    latency: float = 0.0
+    cost: float = 0.0
+    explored: bool = False
+
+    @property
+    def route(self) -> Optional[str]:
+        """The route that answered (None when every one failed)"""
+        return self.attempts[-1][0] if self.attempts and self.attempts[-1][1] == "ok" else None
+
+
+@dataclass
+class RouteStats:
+    """Totals for one route."""
+    calls: int = 0
+    answered: int = 0
+    timeouts: int = 0
+    errors: int = 0
+    skipped: int = 0  # circuit open, never sent
+    latency: float = 0.0  # answered calls only
+    cost: float = 0.0
+
+
+class ModelRouter:
+    """Chooses a route per request from price, latency, error rate and quality tier."""
+
+    def __init__(
+        self,
+        routes: List[Route],
+        tracker: LatencyTracker = latency_tracker,
+        second_price: float = settings.ROUTER_SECOND_PRICE,
+        output_estimate: int = settings.ROUTER_OUTPUT_ESTIMATE,
+        explore_rate: float = settings.ROUTER_EXPLORE_RATE,
+    ):
+        self.routes = list(routes)
+        self.tracker = tracker
+        self.second_price = second_price
+        self.output_estimate = output_estimate
+        self.explore_rate = explore_rate
+        self.smoothing = settings.ROUTER_SMOOTHING
+        # Moving averages per route: seconds per answer and share of failed attempts
+        self._latency: Dict[str, float] = {}
+        self._errors: Dict[str, float] = {}
+        self.stats: Dict[str, RouteStats] = {route.name: RouteStats() for route in self.routes}
+        self.decisions: Deque[Decision] = deque(maxlen=settings.LATENCY_WINDOW)
+        # Tiers already warned about having no qualifying route
+        self._underqualified: Set[int] = set()
+        self._lock = threading.Lock()
+
+    # Scoring
+
+    def error_rate(self, route: Route) -> float:
+        return min(MAX_ERROR_RATE, self._errors.get(route.name, 0.0))
+
+    def expected_latency(self, route: Route) -> float:
+        latency = self._latency.get(route.name)
+        if latency is None:
+            # No history yet: assume it is as fast as the fastest model, so it gets tried
+            return min(self._latency.values(), default=settings.ROUTER_DEFAULT_LATENCY)
+        return latency
+
+    def _smooth(self, averages: Dict[str, float], name: str, value: float) -> None:
+        previous = averages.get(name)
+        averages[name] = value if previous is None else previous + self.smoothing * (value - previous)
+
+    def estimated_cost(self, route: Route, prompt_tokens: int) -> float:
+        return (prompt_tokens / 1000 * route.price["input"]
+                + self.output_estimate / 1000 * route.price["output"])
+
+    def score(self, route: Route, prompt_tokens: int) -> float:
+        """Expected USD per successful answer, latency priced in"""
+        value = self.estimated_cost(route, prompt_tokens) + self.expected_latency(route) * self.second_price
+        return value / (1 - self.error_rate(route))
+
+    def rank(self, prompt_tokens: int, tier: int) -> List[Route]:
+        """Routes at or above `tier`, best first (every route, with a warning, if none qualifies)"""
+        eligible = [route for route in self.routes if route.tier >= tier]
+        if not eligible:
+            if tier not in self._underqualified:
+                self._underqualified.add(tier)
+                logger.warning("router: no route reaches tier %d, using lower-tier models: %s",
+                               tier, ", ".join(route.name for route in self.routes))
+            eligible = self.routes
+        return sorted(eligible, key=lambda route: self.score(route, prompt_tokens))
+
+    def _plan(self, input: Any, tier: int, chain: str) -> Tuple[Decision, List[Route]]:
+        if not self.routes:
+            raise RuntimeError("no routes configured")
+        prompt_tokens = count_prompt_tokens(input)
+        ranking = self.rank(prompt_tokens, tier)
+        decision = Decision(chain, tier, prompt_tokens, [route.name for route in ranking])
+        if len(ranking) > 1 and random.random() < self.explore_rate:
+            ranking.insert(0, ranking.pop(random.randrange(1, len(ranking))))
+            decision.explored = True
+        return decision, ranking
+
+    # Recording
+
+    def _cost(self, route: Route, message: Any) -> float:
+        usage = getattr(message, "usage_metadata", None)
+        if not usage:
+            return 0.0
+        cached = (usage.get("input_token_details") or {}).get("cache_read", 0) or 0
+        return ((usage.get("input_tokens", 0) - cached) / 1000 * route.price["input"]
+                + cached / 1000 * route.price.get("cached_input", route.price["input"])
+                + usage.get("output_tokens", 0) / 1000 * route.price["output"])
+
+    def _attempted(self, decision: Decision, route: Route, elapsed: float,
+                   result: Any = None, error: Optional[BaseException] = None) -> None:
+        # Deadlines raise TimeoutError; the SDKs raise their own APITimeoutError
+        timed_out = isinstance(error, TimeoutError) or "Timeout" in type(error).__name__
+        outcome = "ok" if error is None else "timeout" if timed_out else "error"
+        decision.attempts.append((route.name, outcome))
+        # Only answers go into the shared window: failures and timeouts would skew
+        # the percentiles that hedging and every adaptive timeout are built on
+        if error is None:
+            self.tracker.observe(route.model, elapsed)
+        with self._lock:
+            self._smooth(self._errors, route.name, 0.0 if error is None else 1.0)
+            # A failure counts as at least as slow as the model usually is
+            self._smooth(self._latency, route.name, max(elapsed, self.expected_latency(route))
+                         if error is not None else elapsed)
+            stats = self.stats[route.name]
+            stats.calls += 1
+            if error is None:
+                stats.answered += 1
+                stats.latency += elapsed
+                decision.cost = self._cost(route, result)
+                stats.cost += decision.cost
+            elif timed_out:
+                stats.timeouts += 1
+            else:
+                stats.errors += 1
+
+    def _skipped(self, decision: Decision, route: Route) -> None:
+        decision.attempts.append((route.name, "skipped"))
+        with self._lock:
+            self.stats[route.name].skipped += 1
+
+    def _finish(self, decision: Decision, start: float) -> None:
+        decision.latency = time.perf_counter() - start
+        with self._lock:
+            self.decisions.append(decision)
+
+    # Calling
+
+    def invoke(self, input: Any, config: Optional[dict] = None, tier: int = 1, chain: str = "",
+               **kwargs: Any) -> Any:
+        decision, ranking = self._plan(input, tier, chain)
+        start = time.perf_counter()
+        error: Optional[BaseException] = None
+        try:
+            for route in ranking:
+                attempt = time.perf_counter()
+                try:
+                    result = route.breaker.call(lambda: route.llm.invoke(input, config, **kwargs),
+                                                self.tracker.timeout_for(route.model))
+                except CircuitOpenError as e:
+                    error = error or e
+                    self._skipped(decision, route)
+                    continue
+                except Exception as e:
+                    error = e
+                    self._attempted(decision, route, time.perf_counter() - attempt, error=e)
+                    continue
+                self._attempted(decision, route, time.perf_counter() - attempt, result)
+                return result
+            raise error
+        finally:
+            self._finish(decision, start)
+
+    async def ainvoke(self, input: Any, config: Optional[dict] = None, tier: int = 1, chain: str = "",
+                      **kwargs: Any) -> Any:
+        decision, ranking = self._plan(input, tier, chain)
+        start = time.perf_counter()
+        error: Optional[BaseException] = None
+        try:
+            for route in ranking:
+                attempt = time.perf_counter()
+                try:
+                    result = await route.breaker.acall(lambda: route.llm.ainvoke(input, config, **kwargs),
+                                                       self.tracker.timeout_for(route.model))
+                except CircuitOpenError as e:
+                    error = error or e
+                    self._skipped(decision, route)
+                    continue
+                except Exception as e:
+                    error = e
+                    self._attempted(decision, route, time.perf_counter() - attempt, error=e)
+                    continue
+                self._attempted(decision, route, time.perf_counter() - attempt, result)
+                return result
+            raise error
+        finally:
+            self._finish(decision, start)
+
+    def runnable(self, tier: int = 1, name: str = "") -> "RoutedModel":
+        """A chat-model stand-in for chains that need at least `tier`"""
+        return RoutedModel(self, tier, name)
+
+    # Reporting
+
+    def report(self) -> List[str]:
+        """Per-route traffic, latency and cost, then where each chain's requests went"""
+        with self._lock:
+            decisions = list(self.decisions)
+            stats = {name: RouteStats(**vars(s)) for name, s in self.stats.items()}
+        lines = [f"{'route':<36}{'tier':>5}{'calls':>7}{'ok':>6}{'timeout':>9}{'error':>7}{'skipped':>9}"
+                 f"{'avg ms':>9}{'avg $':>11}"]
+        for route in self.routes:
+            s = stats[route.name]
+            avg_ms = f"{s.latency / s.answered * 1000:.0f}" if s.answered else "-"
+            avg_cost = f"{s.cost / s.answered:.6f}" if s.answered else "-"
+            lines.append(f"{route.name[:35]:<36}{route.tier:>5}{s.calls:>7}{s.answered:>6}{s.timeouts:>9}"
+                         f"{s.errors:>7}{s.skipped:>9}{avg_ms:>9}{avg_cost:>11}")
+        chains: Dict[str, Dict[str, int]] = {}
+        for decision in decisions:
+            counts = chains.setdefault(decision.chain or "(unnamed)", {})
+            counts[decision.route or "failed"] = counts.get(decision.route or "failed", 0) + 1
+        for chain, counts in chains.items():
+            spread = ", ".join(f"{route} x{count}" for route, count in counts.items())
+            lines.append(f"  {chain}: {spread}")
+        answered = [d for d in decisions if d.route]
+        if decisions:
+            fallbacks = sum(1 for d in decisions if len(d.attempts) > 1)
+            lines.append(
+                f"{len(decisions)} requests: {len(answered) / len(decisions):.0%} answered, "
+                f"{fallbacks} fell back, {sum(d.explored for d in decisions)} explored | "
+                f"avg {sum(d.latency for d in decisions) / len(decisions) * 1000:.0f} ms, "
+                f"${sum(d.cost for d in answered) / max(len(answered), 1):.6f} per answer"
+            )
+        return lines
+
+
+class RoutedModel(Runnable):
+    """Runnable face of a ModelRouter for one chain and quality tier."""
+
+    def __init__(self, router: ModelRouter, tier: int = 1, name: str = ""):
+        self.router = router
+        self.tier = tier
+        self.chain = name
+        self.name = f"Router[tier {tier}]"
+
+    def invoke(self, input: Any, config: Optional[dict] = None, **kwargs: Any) -> Any:
+        return self.router.invoke(input, config, tier=self.tier, chain=self.chain, **kwargs)
+
+    async def ainvoke(self, input: Any, config: Optional[dict] = None, **kwargs: Any) -> Any:
+        return await self.router.ainvoke(input, config, tier=self.tier, chain=self.chain, **kwargs)
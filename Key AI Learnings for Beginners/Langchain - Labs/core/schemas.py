@@ -0,0 +1,31 @@
+"""
+Schemas
+Output models shared by the parser labs (task_4 and task_5).
+
+Both labs compile their prompts through core.prompt_registry, so they must
+parse into the very same classes.
+"""
+
+from enum import Enum
+from typing import List
+
+from pydantic import BaseModel, Field
+
+
+class TechInfo(BaseModel):
+    """Information about a technology."""
+    name: str = Field(description="Name of the technology")
+    year_released: int = Field(description="Year it was first released")
+    creator: str = Field(description="Person or organization that created it")
+    tags: List[str] = Field(description="List of keywords describing it")
+
+
+class Difficulty(Enum):
+    BEGINNER = "beginner"
+    INTERMEDIATE = "intermediate"
+    ADVANCED = "advanced"
+
+
+class DifficultyRating(BaseModel):
+    """Wrapper for the native structured-output path (JSON schemas need an object)."""
+    difficulty: Difficulty = Field(description="How hard the subject is to learn")
@@ -0,0 +1,298 @@
+"""
+Semantic Cache
+Reuse answers for prompts that mean the same thing but are worded differently.
+
+"Explain cloud computing in one sentence" and "Explain cloud computing in a
+sentence" miss an exact-match cache. Here prompts are embedded offline with a
+hashed character n-gram vectorizer (NumPy only, no model download), kept in a
+bounded in-memory matrix and matched with one batched cosine product.
+
+Prompts rendered from a core/prompt_registry.py template are indexed per
+template, and only their variable text is embedded: with the instructions and
+format instructions left in, "React" and "Kubernetes" prompts score 0.99 and
+would share an answer.
+
+A sample of would-be hits (settings.SEMANTIC_CACHE_VERIFY_RATE) is sent to
+the model anyway; when the fresh answer differs from the one the cache would
+have served, it counts as a false hit. `false_hit_rate` is measured on those
+checks.
+"""
+
+import json
+import random
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict, deque
+from functools import lru_cache
+from typing import Any, Deque, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.caches import BaseCache
+
+from core import settings
+from core.prompt_registry import prompt_registry
+from core.response_cache import mark_cache_hit
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+class HashedNgramVectorizer:
+    """Offline text embedding: hashed char n-grams + words, L2-normalised."""
+
+    def __init__(self, n_features: int = 4096, ngram_range: Tuple[int, int] = (3, 5)):
+        self.n_features = n_features
+        self.ngram_range = ngram_range
+
+    def _features(self, text: str) -> List[str]:
+        words = _WORD_RE.findall(text.lower())
+        features = [f"w:{word}" for word in words]
+        padded = f" {' '.join(words)} "
+        low, high = self.ngram_range
+        for n in range(low, high + 1):
+            features.extend(padded[i:i + n] for i in range(len(padded) - n + 1))
+        return features
+
+    def transform(self, texts: Sequence[str]) -> np.ndarray:
+        """Embed texts into an (n, n_features) float32 matrix of unit rows"""
+        matrix = np.zeros((len(texts), self.n_features), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                h = zlib.crc32(feature.encode("utf-8"))
+                # The top hash bit picks the sign so collisions cancel out on average
+                matrix[row, h % self.n_features] += 1.0 if h & 0x80000000 else -1.0
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+
+class _Partition:
+    """Vector index for one model configuration and prompt template, grown on demand."""
+
+    def __init__(self, capacity: int, n_features: int, initial: int = 64):
+        self.capacity = capacity
+        self.vectors = np.zeros((min(initial, capacity), n_features), dtype=np.float32)
+        self.last_used = np.zeros(len(self.vectors), dtype=np.float64)
+        self.texts: List[Optional[str]] = [None] * len(self.vectors)
+        self.values: List[Any] = [None] * len(self.vectors)
+        self.size = 0
+
+    def search(self, queries: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Best match index and cosine score for every query row"""
+        if self.size == 0:
+            empty = np.full(len(queries), -1)
+            return empty, np.zeros(len(queries), dtype=np.float32)
+        scores = queries @ self.vectors[:self.size].T
+        best = scores.argmax(axis=1)
+        return best, scores[np.arange(len(queries)), best]
+
+    def slot(self) -> int:
+        """Next free slot (doubling the index up to capacity), or the least-recently-used one"""
+        if self.size == len(self.texts) < self.capacity:
+            grow = min(len(self.texts), self.capacity - len(self.texts))
+            self.vectors = np.vstack([self.vectors, np.zeros((grow, self.vectors.shape[1]), dtype=np.float32)])
+            self.last_used = np.concatenate([self.last_used, np.zeros(grow)])
+            self.texts.extend([None] * grow)
+            self.values.extend([None] * grow)
+        if self.size < len(self.texts):
+            self.size += 1
+            return self.size - 1
+        return int(self.last_used.argmin())
+
+
+def prompt_text(prompt: str) -> str:
+    """Plain text of a LangChain cache prompt (serialized chat messages or a string)"""
+    try:
+        messages = json.loads(prompt)
+    except (TypeError, ValueError):
+        return prompt
+    if not isinstance(messages, list):
+        return prompt
+    parts = []
+    for message in messages:
+        content = message.get("kwargs", {}).get("content", "") if isinstance(message, dict) else message
+        parts.append(content if isinstance(content, str) else json.dumps(content))
+    return "\n".join(parts)
+
+
+def _answer_text(value: Any) -> str:
+    """Text of a cached value (a list of LangChain generations, or anything else)"""
+    if isinstance(value, list):
+        return "\n".join(getattr(generation, "text", str(generation)) for generation in value)
+    return str(value)
+
+
+class SemanticCache(BaseCache):
+    """Near-duplicate prompt cache with a bounded in-memory vector index.
+
+    Each (model configuration, prompt template) pair gets its own index,
+    grown as entries arrive up to max_entries x n_features float32; beyond
+    max_partitions the least-recently-used index is dropped. When `backing`
+    (e.g. the exact ResponseCache) is given it is tried first and kept up to
+    date on every write.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.85,
+        max_entries: int = 2_000,
+        max_partitions: int = 16,
+        vectorizer: Optional[HashedNgramVectorizer] = None,
+        backing: Optional[BaseCache] = None,
+        latency_window: int = 1_000,
+        verify_rate: float = 0.0,
+        answer_threshold: float = 0.5,
+    ):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.max_partitions = max_partitions
+        self.vectorizer = vectorizer or HashedNgramVectorizer()
+        self.backing = backing
+        self.verify_rate = verify_rate
+        self.answer_threshold = answer_threshold
+        self._partitions: "OrderedDict[str, _Partition]" = OrderedDict()
+        # (partition, text) -> the answer a sampled hit would have served
+        self._pending: "OrderedDict[Tuple[str, str], Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.verified = 0
+        self.false_hits = 0
+        self.recent_hits: Deque[Tuple[str, str, float]] = deque(maxlen=100)
+        self._latencies = deque(maxlen=latency_window)
+
+    def _partition(self, key: str) -> _Partition:
+        partition = self._partitions.get(key)
+        if partition is None:
+            if len(self._partitions) >= self.max_partitions:
+                self._partitions.popitem(last=False)
+            partition = self._partitions[key] = _Partition(self.max_entries, self.vectorizer.n_features)
+        else:
+            self._partitions.move_to_end(key)
+        return partition
+
+    def lookup_many(self, texts: Sequence[str], llm_string: str = "") -> List[Any]:
+        """Batched lookup - one matrix product for all texts"""
+        start = time.perf_counter()
+        queries = self.vectorizer.transform(texts)
+        results = []
+        with self._lock:
+            partition = self._partition(llm_string)
+            best, scores = partition.search(queries)
+            now = time.time()
+            for text, index, score in zip(texts, best, scores):
+                if index < 0 or score < self.threshold:
+                    self.misses += 1
+                    results.append(None)
+                elif random.random() < self.verify_rate:
+                    # Ask the model anyway and compare in update()
+                    self.misses += 1
+                    self._pending[(llm_string, text)] = partition.values[index]
+                    if len(self._pending) > 1_000:
+                        self._pending.popitem(last=False)
+                    results.append(None)
+                else:
+                    partition.last_used[index] = now
+                    self.hits += 1
+                    self.recent_hits.append((text, partition.texts[index], float(score)))
+                    results.append(partition.values[index])
+        elapsed = (time.perf_counter() - start) / max(len(texts), 1)
+        self._latencies.extend([elapsed] * len(texts))
+        return results
+
+    def add(self, text: str, value: Any, llm_string: str = "") -> None:
+        """Index `text` -> `value`, evicting the least-recently-used entry when full"""
+        vector = self.vectorizer.transform([text])[0]
+        with self._lock:
+            served = self._pending.pop((llm_string, text), None)
+            if served is not None:
+                self._verify(served, value)
+            partition = self._partition(llm_string)
+            index = partition.slot()
+            partition.vectors[index] = vector
+            partition.texts[index] = text
+            partition.values[index] = value
+            partition.last_used[index] = time.time()
+
+    def _verify(self, served: Any, fresh: Any) -> None:
+        """Compare a sampled hit's answer with the model's own answer to the prompt"""
+        served, fresh = _answer_text(served), _answer_text(fresh)
+        if served != fresh:
+            similarity = float(np.dot(*self.vectorizer.transform([served, fresh])))
+            if similarity < self.answer_threshold:
+                self.false_hits += 1
+        self.verified += 1
+
+    def report_false_hit(self) -> None:
+        """Count a served answer the caller found did not fit the prompt"""
+        with self._lock:
+            self.false_hits += 1
+            self.verified += 1
+
+    def stats(self) -> dict:
+        """Hit rate, lookup latency and false-hit rate for threshold tuning"""
+        lookups = self.hits + self.misses
+        latencies = np.array(self._latencies) if self._latencies else np.zeros(1)
+        return {
+            "threshold": self.threshold,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "verified": self.verified,
+            "false_hit_rate": self.false_hits / self.verified if self.verified else 0.0,
+            "lookup_p50_ms": float(np.percentile(latencies, 50) * 1000),
+            "lookup_p95_ms": float(np.percentile(latencies, 95) * 1000),
+            "partitions": len(self._partitions),
+            "entries": sum(p.size for p in self._partitions.values()),
+            "index_bytes": sum(p.vectors.nbytes for p in self._partitions.values()),
+        }
+
+    # ----- LangChain BaseCache API -----
+
+    @staticmethod
+    def _index_key(prompt: str, llm_string: str) -> Tuple[str, str]:
+        """(partition, text to embed): registry prompts are split per template, variables only"""
+        name, text = prompt_registry.split_variables(prompt_text(prompt))
+        return (f"{llm_string}\x00{name}" if name else llm_string), text
+
+    def lookup(self, prompt: str, llm_string: str):
+        if self.backing is not None:
+            exact = self.backing.lookup(prompt, llm_string)
+            if exact is not None:
+                return exact
+        partition, text = self._index_key(prompt, llm_string)
+        value = self.lookup_many([text], partition)[0]
+        return mark_cache_hit(value) if isinstance(value, list) else value
+
+    def update(self, prompt: str, llm_string: str, return_val) -> None:
+        if self.backing is not None:
+            self.backing.update(prompt, llm_string, return_val)
+        partition, text = self._index_key(prompt, llm_string)
+        self.add(text, return_val, partition)
+
+    def clear(self, **kwargs: Any) -> None:
+        with self._lock:
+            self._partitions.clear()
+            self._pending.clear()
+        self.hits = self.misses = self.verified = self.false_hits = 0
+        self.recent_hits.clear()
+        self._latencies.clear()
+        if self.backing is not None:
+            self.backing.clear(**kwargs)
+
+
+@lru_cache(maxsize=None)
+def get_semantic_cache() -> Optional[SemanticCache]:
+    """Process-wide semantic cache layered over the exact cache, or None when disabled"""
+    if not settings.SEMANTIC_CACHE_ENABLED:
+        return None
+    from core.response_cache import get_response_cache
+
+    return SemanticCache(
+        threshold=settings.SEMANTIC_CACHE_THRESHOLD,
+        max_entries=settings.SEMANTIC_CACHE_MAX_ENTRIES,
+        max_partitions=settings.SEMANTIC_CACHE_MAX_PARTITIONS,
+        backing=get_response_cache(),
+        verify_rate=settings.SEMANTIC_CACHE_VERIFY_RATE,
+    )
@@ -1,5 +1,11 @@
 
+import asyncio
+import importlib.util
 import os
+import weakref
+from functools import lru_cache
+
+import httpx
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -12,3 +18,352 @@ OPENAI_MODEL = os.getenv("OPENAI_MODEL")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 GOOGLE_MODEL = os.getenv("GOOGLE_MODEL")
 # GROK_MODEL = os.getenv("GROK_MODEL")
+
+# Shared HTTP connection pool
+# One keep-alive pool per process, so repeated calls skip the TCP + TLS handshake
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "50"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "120"))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "30"))
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "2"))
+# HTTP/2 multiplexes many requests over one connection (needs: pip install "httpx[http2]")
+HTTP2 = os.getenv("HTTP2", "false").lower() in ("1", "true", "yes")
+# Open the connection while the lab starts instead of on the first real call
+HTTP_WARMUP = os.getenv("HTTP_WARMUP", "false").lower() in ("1", "true", "yes")
+
+# Response cache (see core/response_cache.py)
+# Repeated prompts are answered from disk instead of paying for a new call
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+LLM_CACHE_PATH = os.getenv(
+    "LLM_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), ".cache", "llm_responses.sqlite"),
+)
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "10000"))
+# Seconds before a cached answer expires (empty = never)
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL")) if os.getenv("LLM_CACHE_TTL") else None
+
+# Semantic cache (see core/semantic_cache.py) - opt-in, layered over the response cache
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "false").lower() in ("1", "true", "yes")
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.85"))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "2000"))
+# One index per model + prompt template; the least-recently-used one is dropped past this
+SEMANTIC_CACHE_MAX_PARTITIONS = int(os.getenv("SEMANTIC_CACHE_MAX_PARTITIONS", "16"))
+# Share of would-be hits answered by the model anyway, to measure the false-hit rate
+SEMANTIC_CACHE_VERIFY_RATE = float(os.getenv("SEMANTIC_CACHE_VERIFY_RATE", "0.1"))
+
+# Token estimator (see core/tokens.py) - BPE vocabulary is downloaded once and reused offline
+TIKTOKEN_CACHE_DIR = os.getenv(
+    "TIKTOKEN_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), ".cache", "tiktoken"),
+)
+
+# Client-side rate limits (see core/rate_limit.py) - requests and tokens per minute
+# per model prefix; set them to your account's tier so load stays under the 429 line
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() in ("1", "true", "yes")
+RATE_LIMITS = {
+    "gpt-4.1-mini": {"rpm": int(os.getenv("OPENAI_RPM", "500")), "tpm": int(os.getenv("OPENAI_TPM", "200000"))},
+    "gpt-4.1-nano": {"rpm": 500, "tpm": 200000},
+    "gpt-4.1": {"rpm": 500, "tpm": 30000},
+    "gpt-4o-mini": {"rpm": 500, "tpm": 200000},
+    "gemini-2.5-flash": {"rpm": int(os.getenv("GOOGLE_RPM", "10")), "tpm": int(os.getenv("GOOGLE_TPM", "250000"))},
+    "gemini-2.5-pro": {"rpm": 5, "tpm": 250000},
+}
+# Output tokens reserved for a request that does not set max_tokens
+RATE_LIMIT_OUTPUT_ESTIMATE = int(os.getenv("RATE_LIMIT_OUTPUT_ESTIMATE", "256"))
+
+# Request coalescing (see core/coalesce.py) - identical requests in flight at
+# the same time share one upstream call
+COALESCE_ENABLED = os.getenv("COALESCE_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# Hedged requests (see core/hedging.py) - a call slower than the model's p95
+# gets a duplicate; whichever answers first wins
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "95"))
+# At most this share of calls may be hedged (0.05 = at most 5% extra requests)
+HEDGE_MAX_EXTRA_LOAD = float(os.getenv("HEDGE_MAX_EXTRA_LOAD", "0.05"))
+# Calls observed before hedging and adaptive timeouts kick in
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+LATENCY_WINDOW = int(os.getenv("LATENCY_WINDOW", "500"))
+# Adaptive timeout = observed p99 x factor, kept between the minimum and HTTP_TIMEOUT
+ADAPTIVE_TIMEOUT_FACTOR = float(os.getenv("ADAPTIVE_TIMEOUT_FACTOR", "3"))
+ADAPTIVE_TIMEOUT_MIN = float(os.getenv("ADAPTIVE_TIMEOUT_MIN", "5"))
+
+# Model router (see core/router.py) - quality tier per model prefix (higher =
+# more capable); a chain asks for a minimum tier and each request goes to the
+# cheapest, fastest model that meets it
+ROUTER_MODEL_TIERS = {
+    "gpt-4.1-nano": 1,
+    "gpt-4o-mini": 1,
+    "gpt-4.1-mini": 2,
+    "gemini-2.5-flash": 2,
+    "gpt-4.1": 3,
+    "gemini-2.5-pro": 3,
+}
+# Cheap, fast OpenAI model for easy chains (empty = route between OPENAI_MODEL and GOOGLE_MODEL only)
+OPENAI_FAST_MODEL = os.getenv("OPENAI_FAST_MODEL", "gpt-4.1-nano")
+# USD a second of waiting is worth, to weigh latency against price
+ROUTER_SECOND_PRICE = float(os.getenv("ROUTER_SECOND_PRICE", "0.0005"))
+# Output tokens assumed when estimating what a request will cost
+ROUTER_OUTPUT_ESTIMATE = int(os.getenv("ROUTER_OUTPUT_ESTIMATE", "200"))
+# Latency assumed before any model has answered
+ROUTER_DEFAULT_LATENCY = float(os.getenv("ROUTER_DEFAULT_LATENCY", "2"))
+# Weight of the newest call in each model's moving average latency and error rate
+ROUTER_SMOOTHING = float(os.getenv("ROUTER_SMOOTHING", "0.2"))
+# Share of requests sent to another eligible model to keep its statistics fresh
+ROUTER_EXPLORE_RATE = float(os.getenv("ROUTER_EXPLORE_RATE", "0.05"))
+
+# Circuit breakers (see core/circuit_breaker.py) - one per provider/model; an
+# open circuit rejects calls at once instead of waiting out another timeout
+BREAKER_FAILURE_STREAK = int(os.getenv("BREAKER_FAILURE_STREAK", "3"))
+# ...or this share of failed calls among the last BREAKER_WINDOW (once there are BREAKER_MIN_CALLS)
+BREAKER_FAILURE_RATE = float(os.getenv("BREAKER_FAILURE_RATE", "0.5"))
+BREAKER_WINDOW = int(os.getenv("BREAKER_WINDOW", "20"))
+BREAKER_MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", "10"))
+# Successful calls slower than this (seconds) count as failures too
+BREAKER_SLOW_CALL = float(os.getenv("BREAKER_SLOW_CALL", "15"))
+# Seconds before an open circuit lets a probe through; doubles after each failed probe
+BREAKER_OPEN_SECONDS = float(os.getenv("BREAKER_OPEN_SECONDS", "30"))
+BREAKER_MAX_OPEN_SECONDS = float(os.getenv("BREAKER_MAX_OPEN_SECONDS", "300"))
+BREAKER_HALF_OPEN_PROBES = int(os.getenv("BREAKER_HALF_OPEN_PROBES", "1"))
+
+# Prompt packing (see core/packing.py) - tiny classification/extraction inputs
+# share one request; single calls wait up to the window for company
+PACK_MAX_ITEMS = int(os.getenv("PACK_MAX_ITEMS", "16"))
+PACK_WINDOW_MS = float(os.getenv("PACK_WINDOW_MS", "20"))
+
+# Prompt layout (see core/prompt_registry.py) - "prefix" moves the static
+# instructions into a leading system message so provider prompt caching can
+# reuse them across calls; "inline" keeps each template as one string
+PROMPT_LAYOUT = os.getenv("PROMPT_LAYOUT", "prefix").lower()
+
+# Native structured output (see core/structured.py) - the schema is sent as a
+# JSON-schema response format instead of format instructions in the prompt
+STRUCTURED_OUTPUT_ENABLED = os.getenv("STRUCTURED_OUTPUT_ENABLED", "true").lower() in ("1", "true", "yes")
+# Model prefixes that support it; everything else uses the text parsers
+STRUCTURED_OUTPUT_MODELS = ("gpt-4o", "gpt-4.1", "gpt-5", "o1", "o3", "o4", "gemini-2", "gemini-1.5")
+
+# Batch jobs (see core/batch_jobs.py) - request/result files and job manifests
+BATCH_DIR = os.getenv(
+    "BATCH_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), ".cache", "batch_jobs"),
+)
+BATCH_POLL_INTERVAL = float(os.getenv("BATCH_POLL_INTERVAL", "30"))
+BATCH_COMPLETION_WINDOW = os.getenv("BATCH_COMPLETION_WINDOW", "24h")
+# Batch endpoints bill this share of the normal price (0.5 = half price)
+BATCH_DISCOUNT = float(os.getenv("BATCH_DISCOUNT", "0.5"))
+
+# Bulk runs (see core/bulk.py) - results are checkpointed every N records; the
+# reader never gets more than BULK_MAX_AHEAD records past the oldest unfinished one
+BULK_CHECKPOINT_EVERY = int(os.getenv("BULK_CHECKPOINT_EVERY", "100"))
+BULK_MAX_AHEAD = int(os.getenv("BULK_MAX_AHEAD", "1000"))
+
+# Call tracing (see core/tracing.py) - one record per LLM call, kept in a
+# rotating JSONL file; Prometheus metrics are written at exit and, with a
+# port set, served on /metrics. Off by default: it adds a callback handler
+# and a transport layer to every call (a few hundred µs each)
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "false").lower() in ("1", "true", "yes")
+TRACE_PATH = os.getenv(
+    "TRACE_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), ".cache", "traces", "calls.jsonl"),
+)
+TRACE_MAX_BYTES = int(os.getenv("TRACE_MAX_BYTES", str(10 * 1024 * 1024)))
+TRACE_BACKUPS = int(os.getenv("TRACE_BACKUPS", "5"))
+TRACE_METRICS_PATH = os.getenv(
+    "TRACE_METRICS_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), ".cache", "traces", "metrics.prom"),
+)
+TRACE_METRICS_PORT = int(os.getenv("TRACE_METRICS_PORT")) if os.getenv("TRACE_METRICS_PORT") else None
+# Local only unless a scraper elsewhere needs it (e.g. "0.0.0.0" inside a container)
+TRACE_METRICS_HOST = os.getenv("TRACE_METRICS_HOST", "127.0.0.1")
+# Records kept between background flushes; older ones are dropped when it overflows
+TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", "4096"))
+TRACE_FLUSH_INTERVAL = float(os.getenv("TRACE_FLUSH_INTERVAL", "1"))
+
+# Cassettes (see core/cassette.py) - "record" stores every API response,
+# "replay" serves them back offline with no API key or network needed
+CASSETTE_MODE = os.getenv("CASSETTE_MODE", "off").lower()
+CASSETTE_PATH = os.getenv(
+    "CASSETTE_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), ".cache", "cassettes", "default.sqlite"),
+)
+# Seconds each replayed response waits, or "recorded" for the original latency
+CASSETTE_LATENCY = os.getenv("CASSETTE_LATENCY", "0")
+if CASSETTE_MODE == "replay":
+    # The SDKs refuse to start without a key; replayed calls never send it
+    OPENAI_API_KEY = OPENAI_API_KEY or "replay"
+    GEMINI_API_KEY = GEMINI_API_KEY or "replay"
+
+# Chain profiler (see core/profiler.py) - collapsed-stack files for flame graphs
+PROFILE_DIR = os.getenv(
+    "PROFILE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), ".cache", "profiles"),
+)
+
+# Model prices in USD per 1K tokens (used for pre-flight cost projections);
+# cached_input is what prompt tokens served from the provider's prompt cache cost
+MODEL_PRICES = {
+    "gpt-4.1-mini": {"input": 0.0008, "cached_input": 0.0002, "output": 0.0032},
+    "gpt-4.1-nano": {"input": 0.0001, "cached_input": 0.000025, "output": 0.0004},
+    "gpt-4.1": {"input": 0.002, "cached_input": 0.0005, "output": 0.008},
+    "gpt-4o-mini": {"input": 0.00015, "cached_input": 0.000075, "output": 0.0006},
+    "gemini-2.5-flash": {"input": 0.0003, "cached_input": 0.000075, "output": 0.0025},
+    "gemini-2.5-pro": {"input": 0.00125, "cached_input": 0.00031, "output": 0.01},
+}
+
+
+def _transport_options():
+    """Pool and protocol options shared by the sync and async transports"""
+    return {
+        "limits": httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+        ),
+        # Fall back to HTTP/1.1 keep-alive when the h2 package is missing
+        "http2": HTTP2 and importlib.util.find_spec("h2") is not None,
+    }
+
+
+def _wrap_transport(transport):
+    """Layer request coalescing, the client-side rate limiter and tracing over a transport.
+
+    Coalescing sits inside tracing, so deduplicated requests never use up rate
+    limit, and tracing outermost sees every attempt the SDK makes. A cassette
+    goes innermost, in place of the network; replayed calls skip rate limiting.
+    """
+    if CASSETTE_MODE in ("record", "replay"):
+        from core.cassette import CassetteTransport, get_cassette
+
+        transport = CassetteTransport(transport, get_cassette(), CASSETTE_MODE, CASSETTE_LATENCY)
+    if RATE_LIMIT_ENABLED and CASSETTE_MODE != "replay":
+        from core.rate_limit import RateLimitedTransport
+
+        transport = RateLimitedTransport(transport)
+    if COALESCE_ENABLED:
+        from core.coalesce import CoalescingTransport
+
+        transport = CoalescingTransport(transport)
+    if TRACING_ENABLED:
+        from core.tracing import TracingTransport, install
+
+        install()
+        transport = TracingTransport(transport)
+    return transport
+
+
+@lru_cache(maxsize=None)
+def get_http_client():
+    """Process-wide sync HTTP client (one connection pool for every lab)"""
+    client = httpx.Client(
+        transport=_wrap_transport(httpx.HTTPTransport(**_transport_options())),
+        timeout=httpx.Timeout(HTTP_TIMEOUT, connect=10.0),
+    )
+    # Nothing to warm up when responses come from a cassette
+    if HTTP_WARMUP and CASSETTE_MODE != "replay":
+        warm_up(client)
+    return client
+
+
+class LoopLocalTransport(httpx.AsyncBaseTransport):
+    """AsyncHTTPTransport with one connection pool per event loop.
+
+    Pooled connections belong to the loop that opened them, so a second
+    asyncio.run() - or a loop in another thread - gets a pool of its own
+    instead of reusing sockets from a closed loop.
+    """
+
+    def __init__(self):
+        self._transports = weakref.WeakKeyDictionary()
+
+    def _transport(self) -> httpx.AsyncHTTPTransport:
+        loop = asyncio.get_running_loop()
+        transport = self._transports.get(loop)
+        if transport is None:
+            transport = self._transports[loop] = httpx.AsyncHTTPTransport(**_transport_options())
+        return transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        return await self._transport().handle_async_request(request)
+
+    async def aclose(self) -> None:
+        transport = self._transports.pop(asyncio.get_running_loop(), None)
+        if transport is not None:
+            await transport.aclose()
+
+
+@lru_cache(maxsize=None)
+def get_async_http_client():
+    """Process-wide async HTTP client, safe to use from any number of event loops"""
+    return httpx.AsyncClient(
+        transport=_wrap_transport(LoopLocalTransport()),
+        timeout=httpx.Timeout(HTTP_TIMEOUT, connect=10.0),
+    )
+
+
+def warm_up(client=None):
+    """Open a pooled connection to the API so the first real call skips the handshake"""
+    client = client or get_http_client()
+    try:
+        client.get(OPENAI_API_BASE or "https://api.openai.com/v1")
+    except httpx.HTTPError:
+        pass
+
+
+async def async_warm_up(client=None):
+    """Async version of warm_up()"""
+    client = client or get_async_http_client()
+    try:
+        await client.get(OPENAI_API_BASE or "https://api.openai.com/v1")
+    except httpx.HTTPError:
+        pass
+
+
+@lru_cache(maxsize=None)
+def get_openai_client():
+    """Shared openai.OpenAI client on top of the pooled HTTP client"""
+    # Imported on first use - the SDK alone costs ~0.5 s of startup
+    import openai
+
+    return openai.OpenAI(
+        api_key=OPENAI_API_KEY,
+        base_url=OPENAI_API_BASE,
+        timeout=HTTP_TIMEOUT,
+        max_retries=HTTP_MAX_RETRIES,
+        http_client=get_http_client(),
+    )
+
+
+@lru_cache(maxsize=None)
+def get_async_openai_client():
+    """Shared openai.AsyncOpenAI client on top of the pooled async HTTP client"""
+    import openai
+
+    return openai.AsyncOpenAI(
+        api_key=OPENAI_API_KEY,
+        base_url=OPENAI_API_BASE,
+        timeout=HTTP_TIMEOUT,
+        max_retries=HTTP_MAX_RETRIES,
+        http_client=get_async_http_client(),
+    )
+
+
+def get_chat_openai(**kwargs):
+    """ChatOpenAI that reuses the shared connection pools.
+
+    Any keyword (temperature, timeout, ...) is passed straight to ChatOpenAI.
+    """
+    from langchain_openai import ChatOpenAI
+
+    if TRACING_ENABLED:
+        from core.tracing import install
+
+        # Every chat model run in the process is traced from here on
+        install()
+    options = {
+        "model": OPENAI_MODEL,
+        "api_key": OPENAI_API_KEY,
+        "base_url": OPENAI_API_BASE,
+        "http_client": get_http_client(),
+        "http_async_client": get_async_http_client(),
+    }
+    options.update(kwargs)
+    return ChatOpenAI(**options)
@@ -0,0 +1,171 @@
+"""
+Streaming
+Show chain output while the model is still generating it.
+
+- String chains print tokens as they arrive
+- JsonOutputParser chains yield growing partial dicts
+- PydanticOutputParser chains yield partial model instances as fields complete,
+  then the fully validated object
+
+Every call records time-to-first-token (TTFT) and time-to-last-token (TTLT),
+so perceived latency can be compared with total generation time.
+"""
+
+import json
+import time
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Iterator, List, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.exceptions import OutputParserException
+from langchain_core.output_parsers import JsonOutputParser, PydanticOutputParser
+from langchain_core.runnables import RunnableSequence
+from pydantic import ValidationError
+
+
+@dataclass
+class StreamMetrics:
+    """Timings for one streamed call (seconds from the call start)."""
+    start: float = field(default_factory=time.perf_counter)
+    first_token: Optional[float] = None
+    last_token: Optional[float] = None
+    first_output: Optional[float] = None
+    tokens: int = 0
+    outputs: int = 0
+
+    @property
+    def ttft(self) -> Optional[float]:
+        return self.first_token - self.start if self.first_token else None
+
+    @property
+    def ttlt(self) -> Optional[float]:
+        return self.last_token - self.start if self.last_token else None
+
+    @property
+    def time_to_first_output(self) -> Optional[float]:
+        return self.first_output - self.start if self.first_output else None
+
+    def summary(self) -> str:
+        def ms(value):
+            return f"{value * 1000:.0f} ms" if value is not None else "n/a"
+        return (f"TTFT {ms(self.ttft)} | first output {ms(self.time_to_first_output)} | "
+                f"TTLT {ms(self.ttlt)} | {self.tokens} tokens")
+
+
+class _TokenTimer(BaseCallbackHandler):
+    """Stamps the first and last token the chat model emits."""
+
+    def __init__(self, metrics: StreamMetrics):
+        self.metrics = metrics
+
+    def on_llm_new_token(self, token: str, **kwargs: Any) -> None:
+        now = time.perf_counter()
+        if self.metrics.first_token is None:
+            self.metrics.first_token = now
+        self.metrics.last_token = now
+        self.metrics.tokens += 1
+
+    def on_llm_end(self, response, **kwargs: Any) -> None:
+        # Cache hits and non-streaming models emit no tokens - use the end time
+        now = time.perf_counter()
+        if self.metrics.first_token is None:
+            self.metrics.first_token = now
+        self.metrics.last_token = self.metrics.last_token or now
+
+
+def _config(metrics: StreamMetrics, config: Optional[dict]) -> dict:
+    config = dict(config or {})
+    config["callbacks"] = list(config.get("callbacks") or []) + [_TokenTimer(metrics)]
+    return config
+
+
+def stream_chain(chain, inputs: dict, metrics: Optional[StreamMetrics] = None,
+                 config: Optional[dict] = None) -> Iterator[Any]:
+    """chain.stream() that fills `metrics` with TTFT / TTLT while yielding output chunks"""
+    metrics = metrics or StreamMetrics()
+    metrics.start = time.perf_counter()
+    for chunk in chain.stream(inputs, config=_config(metrics, config)):
+        if metrics.first_output is None:
+            metrics.first_output = time.perf_counter()
+        metrics.outputs += 1
+        yield chunk
+
+
+async def astream_chain(chain, inputs: dict, metrics: Optional[StreamMetrics] = None,
+                        config: Optional[dict] = None) -> AsyncIterator[Any]:
+    """Async version of stream_chain()"""
+    metrics = metrics or StreamMetrics()
+    metrics.start = time.perf_counter()
+    async for chunk in chain.astream(inputs, config=_config(metrics, config)):
+        if metrics.first_output is None:
+            metrics.first_output = time.perf_counter()
+        metrics.outputs += 1
+        yield chunk
+
+
+def _as_partial_json(chain) -> RunnableSequence:
+    """Same chain with its PydanticOutputParser swapped for a partial JSON parser"""
+    return RunnableSequence(*chain.steps[:-1], JsonOutputParser())
+
+
+def _completed_fields(partial: dict, model) -> dict:
+    # While streaming, only the key currently being written can still change
+    return {key: partial[key] for key in list(partial)[:-1] if key in model.model_fields}
+
+
+def _validate(parser: PydanticOutputParser, data: dict):
+    """Validate the fully streamed object the same way the parser would"""
+    try:
+        return parser.pydantic_object.model_validate(data)
+    except ValidationError as e:
+        name = parser.pydantic_object.__name__
+        raise OutputParserException(
+            f"Failed to parse {name} from streamed output: {e}", llm_output=json.dumps(data)
+        ) from e
+
+
+def stream_model(chain, inputs: dict, metrics: Optional[StreamMetrics] = None,
+                 config: Optional[dict] = None) -> Iterator[Any]:
+    """Stream a `prompt | llm | PydanticOutputParser` chain as partial model objects.
+
+    A partial instance (built with model_construct, unvalidated) is yielded
+    each time another field completes; the last item is the validated model.
+    """
+    parser = chain.last
+    if not isinstance(parser, PydanticOutputParser):
+        yield from stream_chain(chain, inputs, metrics, config)
+        return
+
+    model = parser.pydantic_object
+    seen: List[str] = []
+    partial: dict = {}
+    for partial in stream_chain(_as_partial_json(chain), inputs, metrics, config):
+        if not isinstance(partial, dict):
+            continue
+        completed = _completed_fields(partial, model)
+        if list(completed) != seen:
+            seen = list(completed)
+            yield model.model_construct(**completed)
+    yield _validate(parser, partial)
+
+
+async def astream_model(chain, inputs: dict, metrics: Optional[StreamMetrics] = None,
+                        config: Optional[dict] = None) -> AsyncIterator[Any]:
+    """Async version of stream_model()"""
+    parser = chain.last
+    if not isinstance(parser, PydanticOutputParser):
+        async for chunk in astream_chain(chain, inputs, metrics, config):
+            yield chunk
+        return
+
+    model = parser.pydantic_object
+    seen: List[str] = []
+    partial: dict = {}
+    async for partial in astream_chain(_as_partial_json(chain), inputs, metrics, config):
+        if not isinstance(partial, dict):
+            continue
+        completed = _completed_fields(partial, model)
+        if list(completed) != seen:
+            seen = list(completed)
+            yield model.model_construct(**completed)
+    yield _validate(parser, partial)
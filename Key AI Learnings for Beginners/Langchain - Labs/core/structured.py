@@ -0,0 +1,152 @@
+"""
+Structured Output
+Let the provider enforce the schema instead of describing it in the prompt.
+
+PydanticOutputParser and StructuredOutputParser paste a long block of format
+instructions into every prompt and then hope the free-text answer parses.
+With the provider's JSON-schema response format the schema travels as a
+request parameter, decoding is constrained to it, and the answer arrives as
+valid JSON - shorter prompts and no parse failures to retry.
+
+StructuredOutputChain uses that native path and falls back to the classic
+text chain (format instructions + parser) when the model can't do it: models
+missing from settings.STRUCTURED_OUTPUT_MODELS go straight to the text chain,
+a model that rejects response_format at runtime is remembered and not asked
+again, and an answer that fails to parse is retried through the text chain.
+Any other error (timeouts, rate limits, 5xx) is raised as usual - the text
+chain would only pay for the same failure a second time.
+
+    chain = structured_output_chain(
+        "tech_info_native", "Provide details about {technology}.",
+        llm, TechInfo, text_chain=chains["pydantic"],
+    )
+"""
+
+import json
+import threading
+from typing import Any, Callable, Optional, Set
+
+from langchain_core.exceptions import OutputParserException
+from langchain_core.runnables import Runnable, RunnableLambda
+from pydantic import ValidationError
+
+from core import settings
+from core.prompt_registry import prompt_registry
+
+# ResponseSchema.type -> JSON schema type (anything else is sent as a string)
+_JSON_TYPES = {"string": "string", "str": "string", "integer": "integer", "int": "integer",
+               "number": "number", "float": "number", "boolean": "boolean", "bool": "boolean"}
+
+
+class StructuredStats:
+    """How often the native path was used versus the text fallback."""
+
+    def __init__(self):
+        self.native = 0
+        self.fallbacks = 0
+        self.unsupported: Set[str] = set()
+        self._lock = threading.Lock()
+
+    def record(self, native: bool) -> None:
+        with self._lock:
+            if native:
+                self.native += 1
+            else:
+                self.fallbacks += 1
+
+    def summary(self) -> str:
+        unsupported = f", unsupported: {', '.join(sorted(self.unsupported))}" if self.unsupported else ""
+        return f"{self.native} native JSON-schema answers, {self.fallbacks} text-parser fallbacks{unsupported}"
+
+
+# Shared by every StructuredOutputChain in the process
+structured_stats = StructuredStats()
+
+
+def supports_structured_output(model: Optional[str]) -> bool:
+    """True when `model` (prefix match) accepts a JSON-schema response format"""
+    if not settings.STRUCTURED_OUTPUT_ENABLED or not model or model in structured_stats.unsupported:
+        return False
+    return any(model.startswith(prefix) for prefix in settings.STRUCTURED_OUTPUT_MODELS)
+
+
+def _rejects_response_format(error: Exception) -> bool:
+    """A 400 about response_format / json_schema means the model can't do it at all"""
+    message = str(error).lower()
+    return getattr(error, "status_code", None) == 400 and ("response_format" in message or "json_schema" in message)
+
+
+def _should_fall_back(error: Exception) -> bool:
+    """Only a schema the model can't take, or an answer that doesn't parse"""
+    return _rejects_response_format(error) or isinstance(
+        error, (OutputParserException, ValidationError, json.JSONDecodeError))
+
+
+def json_schema_from_response_schemas(title: str, response_schemas) -> dict:
+    """Strict JSON schema equivalent of a StructuredOutputParser's ResponseSchema list"""
+    properties = {
+        schema.name: {"type": _JSON_TYPES.get(schema.type.lower(), "string"), "description": schema.description}
+        for schema in response_schemas
+    }
+    return {
+        "title": title,
+        "type": "object",
+        "properties": properties,
+        "required": list(properties),
+        "additionalProperties": False,
+    }
+
+
+class StructuredOutputChain(Runnable):
+    """prompt | llm.with_structured_output(schema), with a text chain to fall back on."""
+
+    def __init__(self, prompt, llm, schema: Any, text_chain: Runnable,
+                 convert: Optional[Callable[[Any], Any]] = None):
+        self.first = prompt  # like a RunnableSequence, so batch runners find the prompt
+        self.model = getattr(llm, "model_name", None) or getattr(llm, "model", None)
+        self.text = text_chain
+        options = {"strict": True} if getattr(llm, "_llm_type", "") == "openai-chat" else {}
+        self.native = prompt | llm.with_structured_output(schema, method="json_schema", **options)
+        if convert:
+            self.native = self.native | RunnableLambda(convert)
+
+    def _config(self, config: Optional[dict]) -> Optional[dict]:
+        """Inner runs take this chain's name, whichever path answers"""
+        return {**(config or {}), "run_name": self.name} if self.name else config
+
+    def _fall_back(self, error: Exception) -> bool:
+        """Whether the text chain should answer instead; remembers models without schema support"""
+        if _rejects_response_format(error):
+            structured_stats.unsupported.add(self.model)
+        return _should_fall_back(error)
+
+    def invoke(self, input: Any, config: Optional[dict] = None, **kwargs: Any) -> Any:
+        if supports_structured_output(self.model):
+            try:
+                result = self.native.invoke(input, self._config(config), **kwargs)
+                structured_stats.record(native=True)
+                return result
+            except Exception as e:
+                if not self._fall_back(e):
+                    raise
+        structured_stats.record(native=False)
+        return self.text.invoke(input, self._config(config), **kwargs)
+
+    async def ainvoke(self, input: Any, config: Optional[dict] = None, **kwargs: Any) -> Any:
+        if supports_structured_output(self.model):
+            try:
+                result = await self.native.ainvoke(input, self._config(config), **kwargs)
+                structured_stats.record(native=True)
+                return result
+            except Exception as e:
+                if not self._fall_back(e):
+                    raise
+        structured_stats.record(native=False)
+        return await self.text.ainvoke(input, self._config(config), **kwargs)
+
+
+def structured_output_chain(name: str, template: str, llm, schema: Any, text_chain: Runnable,
+                            convert: Optional[Callable[[Any], Any]] = None) -> StructuredOutputChain:
+    """Native structured-output chain for a prompt without format instructions"""
+    prompt, _ = prompt_registry.compile(name, template)
+    return StructuredOutputChain(prompt, llm, schema, text_chain, convert)
@@ -0,0 +1,154 @@
+"""
+Token Estimator
+Count prompt tokens and project costs BEFORE paying for a call.
+
+Token counts come from tiktoken's BPE vocabulary. The vocabulary file is
+cached on disk (settings.TIKTOKEN_CACHE_DIR), so after the first download it
+loads offline, and encoded strings are memoized. When the vocabulary cannot be
+loaded at all, a ~4 characters per token estimate is used instead.
+
+Prices come from settings.MODEL_PRICES, so whole batch jobs can be budgeted,
+and oversized requests rejected or trimmed, without spending anything.
+"""
+
+import os
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Iterable, Optional
+
+from core import settings
+
+# Every chat message costs a few tokens of framing on top of its content,
+# and every reply is primed with a few more (OpenAI chat format)
+TOKENS_PER_MESSAGE = 3
+TOKENS_PER_REPLY = 3
+CHARS_PER_TOKEN = 4
+DEFAULT_ENCODING = "o200k_base"
+
+
+class PromptTooLargeError(ValueError):
+    """Raised when a prompt exceeds the allowed number of input tokens."""
+
+
+@lru_cache(maxsize=None)
+def get_encoding(model: Optional[str] = None):
+    """tiktoken encoding for `model`, loaded once per process (None when unavailable)"""
+    os.environ.setdefault("TIKTOKEN_CACHE_DIR", settings.TIKTOKEN_CACHE_DIR)
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model or settings.OPENAI_MODEL or "")
+        except KeyError:
+            return tiktoken.get_encoding(DEFAULT_ENCODING)
+    except Exception:
+        # Vocabulary not cached and no network - fall back to the estimate
+        return None
+
+
+@lru_cache(maxsize=8192)
+def count_text(text: str, model: Optional[str] = None) -> int:
+    """Tokens in a plain string (memoized - repeated prompt parts cost nothing)"""
+    encoding = get_encoding(model)
+    if encoding is None:
+        return max(1, -(-len(text) // CHARS_PER_TOKEN)) if text else 0
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def _messages(prompt: Any, variables: dict) -> list:
+    """Normalise a template, prompt value, string or message list into (role, content) pairs"""
+    if hasattr(prompt, "format_prompt"):
+        prompt = prompt.format_prompt(**variables)
+    if hasattr(prompt, "to_messages"):
+        prompt = prompt.to_messages()
+    if isinstance(prompt, str):
+        return [("user", prompt)]
+    pairs = []
+    for message in prompt:
+        if isinstance(message, dict):
+            pairs.append((message.get("role", "user"), message.get("content") or ""))
+        else:
+            pairs.append((message.type, message.content))
+    return pairs
+
+
+def count_prompt_tokens(prompt: Any, model: Optional[str] = None, **variables) -> int:
+    """Input tokens for a PromptTemplate (rendered with `variables`), messages list or string"""
+    total = TOKENS_PER_REPLY
+    for role, content in _messages(prompt, variables):
+        if not isinstance(content, str):
+            content = str(content)
+        total += TOKENS_PER_MESSAGE + count_text(role, model) + count_text(content, model)
+    return total
+
+
+def get_model_price(model: Optional[str] = None) -> dict:
+    """Per-1K-token prices for `model` (dated names like gpt-4.1-mini-2025-04-14 match their base)"""
+    model = model or settings.OPENAI_MODEL or ""
+    for name in sorted(settings.MODEL_PRICES, key=len, reverse=True):
+        if model.startswith(name):
+            return settings.MODEL_PRICES[name]
+    raise KeyError(f"No price configured for model '{model}' - add it to settings.MODEL_PRICES")
+
+
+@dataclass
+class CostProjection:
+    """Projected size and cost of a job, before anything is sent (costs None for unpriced models)."""
+    model: str
+    requests: int
+    input_tokens: int
+    output_tokens: int
+    input_cost: Optional[float]
+    output_cost: Optional[float]
+
+    @property
+    def total_cost(self) -> Optional[float]:
+        if self.input_cost is None or self.output_cost is None:
+            return None
+        return self.input_cost + self.output_cost
+
+
+def project_cost(
+    prompts: Iterable[Any],
+    model: Optional[str] = None,
+    expected_output_tokens: int = 200,
+) -> CostProjection:
+    """Project the cost of sending every prompt (strings, message lists or prompt values)"""
+    model = model or settings.OPENAI_MODEL or ""
+    try:
+        price = get_model_price(model)
+    except KeyError:
+        # Token counts are still worth having; the cost is unknown
+        price = None
+    requests = input_tokens = 0
+    for prompt in prompts:
+        requests += 1
+        input_tokens += count_prompt_tokens(prompt, model)
+    output_tokens = requests * expected_output_tokens
+    return CostProjection(
+        model=model,
+        requests=requests,
+        input_tokens=input_tokens,
+        output_tokens=output_tokens,
+        input_cost=input_tokens / 1000 * price["input"] if price else None,
+        output_cost=output_tokens / 1000 * price["output"] if price else None,
+    )
+
+
+def check_prompt_size(prompt: Any, max_tokens: int, model: Optional[str] = None, **variables) -> int:
+    """Return the prompt's token count, or raise PromptTooLargeError above `max_tokens`"""
+    tokens = count_prompt_tokens(prompt, model, **variables)
+    if tokens > max_tokens:
+        raise PromptTooLargeError(f"Prompt is {tokens} tokens, limit is {max_tokens}")
+    return tokens
+
+
+def trim_to_tokens(text: str, max_tokens: int, model: Optional[str] = None) -> str:
+    """Cut `text` down to at most `max_tokens` tokens"""
+    encoding = get_encoding(model)
+    if encoding is None:
+        return text[:max_tokens * CHARS_PER_TOKEN]
+    tokens = encoding.encode(text, disallowed_special=())
+    return text if len(tokens) <= max_tokens else encoding.decode(tokens[:max_tokens])
@@ -0,0 +1,547 @@
+"""
+Call Tracing
+One trace record per LLM call, exported as Prometheus metrics and a rotating JSONL file.
+
+install() registers a Tracer for every LangChain run in the process (called
+by settings.get_chat_openai), so each ChatOpenAI / ChatGoogleGenerativeAI
+call in any chain is traced without passing callbacks around. Per call:
+- wall latency, and time to first token for streamed calls
+- input / output / cached prompt tokens
+- HTTP status and retry count, seen by TracingTransport - settings wraps it
+  around the shared HTTP clients, so it sees every attempt the SDK makes
+- the outcome of the parser step that follows the model
+- the chain (root run name) and the prompt_registry template
+
+Answers served by the local response cache cost nothing, so they are only
+counted (llm_cache_hits_total), never added to the calls, tokens or latency.
+
+Raw SDK calls through the shared clients (no LangChain run around them) are
+traced by TracingTransport itself, one record per HTTP attempt.
+
+Recording stays cheap: a finished call is one slot write into a ring buffer,
+no lock taken. A background thread drains it every TRACE_FLUSH_INTERVAL
+seconds, appends the records to TRACE_PATH (rotated at TRACE_MAX_BYTES) and
+folds them into the Prometheus counters, written to TRACE_METRICS_PATH at
+exit and served on TRACE_METRICS_PORT (bound to TRACE_METRICS_HOST, local
+only by default) when set. Tracing is off unless TRACING_ENABLED is set:
+
+    TRACING_ENABLED=true TRACE_METRICS_PORT=9464 python main.py 5
+    curl localhost:9464/metrics
+"""
+
+import atexit
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from logging.handlers import RotatingFileHandler
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+from uuid import UUID
+
+import httpx
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.tracers.context import register_configure_hook
+
+from core import settings
+from core.prompt_registry import prompt_registry
+from core.response_cache import is_cache_hit
+
+RAW_SDK = "(raw sdk)"
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# (run id, HTTP attempts) of the chat model call running in this context
+_attempts: ContextVar[Optional[Tuple[UUID, list]]] = ContextVar("trace_attempts", default=None)
+
+
+class HttpAttempt(NamedTuple):
+    """One HTTP request the SDK made for a call (perf_counter start/end)."""
+    status: Optional[int]
+    retries: int
+    start: float
+    end: float
+
+
+def watch_http(run_id: UUID) -> List[HttpAttempt]:
+    """List that TracingTransport fills with the HTTP attempts of chat model run `run_id`.
+
+    Call it from a run_inline callback's on_chat_model_start; handlers
+    watching the same run share one list.
+    """
+    current = _attempts.get()
+    if current is not None and current[0] == run_id:
+        return current[1]
+    attempts: List[HttpAttempt] = []
+    _attempts.set((run_id, attempts))
+    return attempts
+
+
+def unwatch_http(run_id: UUID) -> None:
+    """Stop collecting attempts for `run_id` (from on_llm_end / on_llm_error)"""
+    current = _attempts.get()
+    if current is not None and current[0] == run_id:
+        _attempts.set(None)
+
+
+@dataclass
+class CallTrace:
+    """Everything recorded about one LLM call (or one raw SDK HTTP attempt)."""
+    ts: float
+    chain: str
+    template: str
+    model: str
+    latency: float
+    ttft: Optional[float] = None
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cached_tokens: int = 0
+    retries: int = 0
+    http_status: Optional[int] = None
+    parser: Optional[str] = None  # "ok", "error", or None when no parser ran
+    error: Optional[str] = None
+    cached: bool = False  # served by the local response cache, no API call made
+
+
+class RingBuffer:
+    """Fixed-size buffer for one background reader and any number of writers.
+
+    Writers claim a sequence number from an itertools.count (atomic under the
+    GIL) and store into its slot, without a lock. When writers lap the reader
+    the oldest records are overwritten and counted as dropped.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self._slots: List[Optional[Tuple[int, Any]]] = [None] * size
+        self._sequence = itertools.count()
+        self._read = 0
+        self.dropped = 0
+
+    def push(self, item: Any) -> None:
+        sequence = next(self._sequence)
+        self._slots[sequence % self.size] = (sequence, item)
+
+    def drain(self) -> List[Any]:
+        """Everything written since the last drain, oldest first"""
+        items = []
+        while True:
+            slot = self._slots[self._read % self.size]
+            if slot is None or slot[0] < self._read:
+                return items
+            sequence, item = slot
+            if sequence > self._read:
+                self.dropped += sequence - self._read
+                self._read = sequence
+            items.append(item)
+            self._read += 1
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels: Any) -> str:
+    return "{" + ",".join(f'{key}="{_escape(str(value))}"' for key, value in labels.items()) + "}"
+
+
+class _Histogram:
+    def __init__(self):
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if value <= bound:
+                self.buckets[i] += 1
+
+
+class TraceMetrics:
+    """Prometheus counters and histograms, updated only by the flush thread."""
+
+    def __init__(self):
+        self.calls: Dict[tuple, int] = {}
+        self.tokens: Dict[tuple, int] = {}
+        self.retries: Dict[tuple, int] = {}
+        self.parser: Dict[tuple, int] = {}
+        self.latency: Dict[tuple, _Histogram] = {}
+        self.ttft: Dict[tuple, _Histogram] = {}
+        self.cache_hits: Dict[tuple, int] = {}
+        self._lock = threading.Lock()
+
+    def add(self, trace: CallTrace) -> None:
+        key = (trace.chain, trace.template, trace.model)
+        status = "error" if trace.error else str(trace.http_status or "ok")
+        with self._lock:
+            if trace.parser:
+                self.parser[key + (trace.parser,)] = self.parser.get(key + (trace.parser,), 0) + 1
+            if trace.cached:
+                # Nothing was spent: keep it out of calls, tokens and latency
+                self.cache_hits[key] = self.cache_hits.get(key, 0) + 1
+                return
+            self.calls[key + (status,)] = self.calls.get(key + (status,), 0) + 1
+            for kind in ("input", "output", "cached"):
+                count = getattr(trace, f"{kind}_tokens")
+                if count:
+                    self.tokens[key + (kind,)] = self.tokens.get(key + (kind,), 0) + count
+            if trace.retries:
+                self.retries[key] = self.retries.get(key, 0) + trace.retries
+            self.latency.setdefault(key, _Histogram()).observe(trace.latency)
+            if trace.ttft is not None:
+                self.ttft.setdefault(key, _Histogram()).observe(trace.ttft)
+
+    def render(self, dropped: int = 0) -> str:
+        """Prometheus text exposition format"""
+        lines = []
+
+        def counter(name, help_text, values, extra):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            for key, value in sorted(values.items()):
+                labels = dict(zip(("chain", "template", "model") + extra, key))
+                lines.append(f"{name}{_labels(**labels)} {value}")
+
+        def histogram(name, help_text, values):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for (chain, template, model), hist in sorted(values.items()):
+                base = {"chain": chain, "template": template, "model": model}
+                for bound, count in zip(LATENCY_BUCKETS, hist.buckets):
+                    lines.append(f"{name}_bucket{_labels(**base, le=bound)} {count}")
+                lines.append(f"{name}_bucket{_labels(**base, le='+Inf')} {hist.count}")
+                lines.append(f"{name}_sum{_labels(**base)} {hist.sum:.6f}")
+                lines.append(f"{name}_count{_labels(**base)} {hist.count}")
+
+        with self._lock:
+            counter("llm_calls_total", "LLM calls by HTTP status (or error)", self.calls, ("status",))
+            counter("llm_tokens_total", "Input, output and cached prompt tokens", self.tokens, ("kind",))
+            counter("llm_retries_total", "HTTP retries made by the SDK", self.retries, ())
+            counter("llm_parser_outcomes_total", "Parser step results after the model", self.parser, ("outcome",))
+            counter("llm_cache_hits_total", "Answers served by the local response cache", self.cache_hits, ())
+            histogram("llm_call_duration_seconds", "Wall latency per call", self.latency)
+            histogram("llm_time_to_first_token_seconds", "Time to first token of streamed calls", self.ttft)
+        lines.append("# HELP llm_traces_dropped_total Trace records overwritten before they were flushed")
+        lines.append("# TYPE llm_traces_dropped_total counter")
+        lines.append(f"llm_traces_dropped_total {dropped}")
+        return "\n".join(lines) + "\n"
+
+
+class _Call:
+    """An LLM call in progress."""
+    __slots__ = ("start", "ts", "chain", "template", "model", "first_token", "attempts")
+
+    def __init__(self, chain: str, template: str, model: str):
+        self.start = time.perf_counter()
+        self.ts = time.time()
+        self.chain, self.template, self.model = chain, template, model
+        self.first_token: Optional[float] = None
+        self.attempts: List[HttpAttempt] = []
+
+
+def _model_name(serialized: dict, kwargs: dict) -> str:
+    params = kwargs.get("invocation_params") or {}
+    metadata = kwargs.get("metadata") or {}
+    return (params.get("model") or params.get("model_name") or metadata.get("ls_model_name")
+            or (serialized or {}).get("name") or "unknown")
+
+
+class Tracer(BaseCallbackHandler):
+    """Callback handler that turns every chat model run into a CallTrace."""
+
+    # Called in the run's own context, so TracingTransport's attempts list is shared
+    run_inline = True
+
+    def __init__(self, registry=prompt_registry, buffer_size: int = settings.TRACE_BUFFER_SIZE):
+        self.registry = registry
+        self.buffer = RingBuffer(buffer_size)
+        self.metrics = TraceMetrics()
+        self.traced = 0
+        self._calls: Dict[UUID, _Call] = {}
+        # Chain runs: run id -> (parent run id, name); template seen under a run
+        self._runs: Dict[UUID, Tuple[Optional[UUID], str]] = {}
+        self._templates: Dict[UUID, str] = {}
+        # Finished calls waiting for the parser that follows them: parent run -> trace
+        self._pending: Dict[Optional[UUID], CallTrace] = {}
+        self._parsers: Dict[UUID, Optional[UUID]] = {}
+        self._log: Optional[logging.Logger] = None
+        self._flusher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    # Recording (hot path)
+
+    def _context(self, parent_run_id: Optional[UUID]) -> Tuple[str, str]:
+        """(chain, template) of a run: the root run's name and the nearest registered prompt"""
+        chain, template = "", ""
+        while parent_run_id is not None:
+            template = template or self._templates.get(parent_run_id, "")
+            parent_run_id, chain = self._runs.get(parent_run_id, (None, chain))
+        return chain or "(no chain)", template
+
+    def on_chain_start(self, serialized: dict, inputs: Any, *, run_id: UUID,
+                       parent_run_id: Optional[UUID] = None, **kwargs: Any) -> None:
+        name = kwargs.get("name") or (serialized or {}).get("name") or ""
+        chain = (kwargs.get("metadata") or {}).get("chain") if parent_run_id is None else None
+        self._runs[run_id] = (parent_run_id, chain or name)
+        if name in self.registry:
+            self._templates[parent_run_id] = name
+        elif "parser" in name.lower() or parent_run_id in self._pending:
+            # A parser, or whatever step consumes the model's finished output
+            self._parsers[run_id] = parent_run_id
+
+    def _chain_done(self, run_id: UUID, outcome: str) -> None:
+        self._runs.pop(run_id, None)
+        self._templates.pop(run_id, None)
+        parent = self._parsers.pop(run_id, False)
+        if parent is not False:
+            trace = self._pending.pop(parent, None)
+            if trace is not None:
+                trace.parser = outcome
+                self.record(trace)
+        trace = self._pending.pop(run_id, None)
+        if trace is not None:
+            self.record(trace)
+
+    def on_chain_end(self, outputs: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._chain_done(run_id, "ok")
+
+    def on_chain_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._chain_done(run_id, "error")
+
+    def on_chat_model_start(self, serialized: dict, messages: List[list], *, run_id: UUID,
+                            parent_run_id: Optional[UUID] = None, **kwargs: Any) -> None:
+        call = _Call(*self._context(parent_run_id), _model_name(serialized, kwargs))
+        call.attempts = watch_http(run_id)
+        self._calls[run_id] = call
+
+    def on_llm_new_token(self, token: str, *, run_id: UUID, **kwargs: Any) -> None:
+        call = self._calls.get(run_id)
+        if call is not None and call.first_token is None:
+            call.first_token = time.perf_counter()
+
+    def _trace(self, call: _Call, error: Optional[BaseException] = None) -> CallTrace:
+        status, retries = call.attempts[-1][:2] if call.attempts else (None, 0)
+        return CallTrace(
+            ts=call.ts, chain=call.chain, template=call.template, model=call.model,
+            latency=time.perf_counter() - call.start,
+            ttft=call.first_token - call.start if call.first_token else None,
+            retries=retries, http_status=getattr(error, "status_code", None) or status,
+            error=f"{type(error).__name__}: {error}" if error else None,
+        )
+
+    def on_llm_end(self, response, *, run_id: UUID, parent_run_id: Optional[UUID] = None, **kwargs: Any) -> None:
+        unwatch_http(run_id)
+        call = self._calls.pop(run_id, None)
+        if call is None:
+            return
+        trace = self._trace(call)
+        for generations in response.generations:
+            for generation in generations:
+                trace.cached = trace.cached or is_cache_hit(generation)
+                message = getattr(generation, "message", None)
+                usage = getattr(message, "usage_metadata", None) or {}
+                trace.input_tokens += usage.get("input_tokens", 0)
+                trace.output_tokens += usage.get("output_tokens", 0)
+                trace.cached_tokens += (usage.get("input_token_details") or {}).get("cache_read", 0) or 0
+                if message is not None and trace.model == "unknown":
+                    trace.model = message.response_metadata.get("model_name", trace.model)
+        if parent_run_id in self._runs:
+            # Recorded once the parser after the model is done (or the chain ends)
+            self._pending[parent_run_id] = trace
+        else:
+            self.record(trace)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        unwatch_http(run_id)
+        call = self._calls.pop(run_id, None)
+        if call is not None:
+            self.record(self._trace(call, error))
+
+    def record(self, trace: CallTrace) -> None:
+        self.buffer.push(trace)
+        self.traced += 1
+
+    # Export (background)
+
+    def flush(self) -> int:
+        """Drain the ring buffer into the JSONL file and the metrics"""
+        traces = self.buffer.drain()
+        for trace in traces:
+            self.metrics.add(trace)
+            if self._log is not None:
+                self._log.info(json.dumps(asdict(trace)))
+        return len(traces)
+
+    def prometheus(self) -> str:
+        return self.metrics.render(self.buffer.dropped)
+
+    def write_prometheus(self, path: str = settings.TRACE_METRICS_PATH) -> str:
+        """Write the metrics for a textfile collector (atomically)"""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            f.write(self.prometheus())
+        os.replace(path + ".tmp", path)
+        return path
+
+    def start(self, path: Optional[str] = settings.TRACE_PATH,
+              interval: float = settings.TRACE_FLUSH_INTERVAL) -> None:
+        """Start the background flush thread (and the rotating JSONL file)"""
+        if self._flusher is not None:
+            return
+        if path:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            handler = RotatingFileHandler(path, maxBytes=settings.TRACE_MAX_BYTES,
+                                          backupCount=settings.TRACE_BACKUPS, encoding="utf-8")
+            self._log = logging.getLogger(f"core.tracing.{id(self)}")
+            self._log.propagate = False
+            self._log.setLevel(logging.INFO)
+            self._log.addHandler(handler)
+
+        def loop():
+            while not self._stop.wait(interval):
+                self.flush()
+
+        self._flusher = threading.Thread(target=loop, name="trace-flush", daemon=True)
+        self._flusher.start()
+
+    def stop(self) -> None:
+        """Stop the flush thread and flush what is left"""
+        self._stop.set()
+        if self._flusher is not None:
+            self._flusher.join()
+        self.flush()
+        if self._log is not None:
+            for handler in self._log.handlers:
+                handler.close()
+
+    def summary(self) -> str:
+        return (f"{self.traced} calls traced, {self.buffer.dropped} dropped "
+                f"-> {settings.TRACE_PATH}, {settings.TRACE_METRICS_PATH}")
+
+
+class TracingTransport(httpx.BaseTransport, httpx.AsyncBaseTransport):
+    """httpx transport that reports HTTP status and retry count of every attempt.
+
+    Inside a traced LLM call the attempt goes to that call's trace; anything
+    else (a raw SDK call) becomes a trace of its own.
+    """
+
+    def __init__(self, transport, tracer: Optional[Tracer] = None):
+        self.transport = transport
+        self.tracer = tracer
+
+    def _record(self, request: httpx.Request, response: Optional[httpx.Response],
+                start: float, error: Optional[BaseException] = None) -> None:
+        status = response.status_code if response is not None else None
+        retries = int(request.headers.get("x-stainless-retry-count", 0) or 0)
+        current = _attempts.get()
+        if current is not None:
+            current[1].append(HttpAttempt(status, retries, start, time.perf_counter()))
+            return
+        tracer = self.tracer or get_tracer()
+        if tracer is None:
+            return
+        trace = CallTrace(ts=time.time() - (time.perf_counter() - start), chain=RAW_SDK,
+                          template=request.url.path, model="unknown", latency=time.perf_counter() - start,
+                          retries=retries, http_status=status,
+                          error=f"{type(error).__name__}: {error}" if error else None)
+        if response is not None and response.headers.get("content-type", "").startswith("application/json"):
+            try:
+                body = json.loads(response.content)
+            except ValueError:
+                body = {}
+            usage = body.get("usage") or {}
+            trace.model = body.get("model") or trace.model
+            trace.input_tokens = usage.get("prompt_tokens", 0)
+            trace.output_tokens = usage.get("completion_tokens", 0)
+            trace.cached_tokens = (usage.get("prompt_tokens_details") or {}).get("cached_tokens", 0) or 0
+        tracer.record(trace)
+
+    def _is_json(self, response: httpx.Response) -> bool:
+        return response.headers.get("content-type", "").startswith("application/json")
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        start = time.perf_counter()
+        try:
+            response = self.transport.handle_request(request)
+        except Exception as e:
+            self._record(request, None, start, e)
+            raise
+        if _attempts.get() is None and self._is_json(response):
+            response.read()
+        self._record(request, response, start)
+        return response
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        start = time.perf_counter()
+        try:
+            response = await self.transport.handle_async_request(request)
+        except Exception as e:
+            self._record(request, None, start, e)
+            raise
+        if _attempts.get() is None and self._is_json(response):
+            await response.aread()
+        self._record(request, response, start)
+        return response
+
+    def close(self) -> None:
+        self.transport.close()
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    tracer: Tracer
+
+    def do_GET(self):
+        body = self.tracer.prometheus().encode("utf-8")
+        self.send_response(200 if self.path.startswith("/metrics") else 404)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve_metrics(tracer: Tracer, port: int, host: str = settings.TRACE_METRICS_HOST) -> ThreadingHTTPServer:
+    """Serve /metrics for Prometheus to scrape, from a daemon thread"""
+    handler = type("MetricsHandler", (_MetricsHandler,), {"tracer": tracer})
+    server = ThreadingHTTPServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, name="trace-metrics", daemon=True).start()
+    return server
+
+
+_tracer: Optional[Tracer] = None
+_install_lock = threading.Lock()
+
+
+def get_tracer() -> Optional[Tracer]:
+    """The installed process-wide tracer, or None"""
+    return _tracer
+
+
+def install() -> Optional[Tracer]:
+    """Trace every LangChain run in the process (once); None when TRACING_ENABLED is off"""
+    global _tracer
+    if not settings.TRACING_ENABLED:
+        return None
+    with _install_lock:
+        if _tracer is None:
+            tracer = Tracer()
+            # A context variable whose default is the tracer: LangChain adds it
+            # to the callbacks of every run, in every thread
+            register_configure_hook(ContextVar("core_tracer", default=tracer), inheritable=True)
+            tracer.start()
+            if settings.TRACE_METRICS_PORT:
+                serve_metrics(tracer, settings.TRACE_METRICS_PORT, settings.TRACE_METRICS_HOST)
+            atexit.register(lambda: (tracer.stop(), tracer.write_prometheus()))
+            _tracer = tracer
+    return _tracer
@@ -7,7 +7,6 @@ Learning Goal: Understand why LangChain simplifies AI development.
 
 import sys
 import os
-import openai
 from openai import APITimeoutError
 from langchain_openai import ChatOpenAI
 
@@ -15,20 +14,30 @@ from langchain_openai import ChatOpenAI
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from core import settings
+from core.hedging import get_hedger, hedge_runnable, hedged_create, latency_tracker
+from core.response_cache import cached_create, get_response_cache
+from core.tracing import get_tracer
 
 def raw_openai_approach():
     """Raw OpenAI SDK - complex and verbose"""
     print("\nRAW OPENAI SDK APPROACH")
 
-    client = openai.OpenAI(
-        api_key=settings.OPENAI_API_KEY,
-        base_url=settings.OPENAI_API_BASE,
-        timeout=30.0,   # 👈 important
+    # Shared client from settings - reuses one pooled, kept-alive connection.
+    # Its requests pass the client-side rate limiter (core/rate_limit.py), so
+    # the retries below are left for real failures instead of 429s
+    client = settings.get_openai_client().with_options(
         max_retries=2   # 👈 important
     )
 
     try:
-        response = client.chat.completions.create(
+        # 👈 Hedged (core/hedging.py): a duplicate is sent if this call is slower
+        # than the model's usual p95, and the timeout follows the observed p99
+        # instead of a fixed 30s (HTTP_TIMEOUT until enough calls were seen).
+        # A repeated run is answered from the response cache without a call
+        response = cached_create(
+            client,
+            get_response_cache(),
+            create=lambda **kwargs: hedged_create(client, **kwargs),
             model=settings.OPENAI_MODEL,
             messages=[
                 {"role": "user", "content": "Explain machine learning in one sentence"}
@@ -39,7 +48,7 @@ def raw_openai_approach():
         print(f"Response: {text}")
         return text
 
-    except APITimeoutError:
+    except (APITimeoutError, TimeoutError):
         print("❌ OpenAI request timed out")
         return None
 
@@ -53,18 +62,22 @@ def langchain_approach():
             model=settings.OPENAI_MODEL,
             api_key=settings.OPENAI_API_KEY,
             base_url=settings.OPENAI_API_BASE,
-            timeout=30,
+            timeout=latency_tracker.timeout_for(settings.OPENAI_MODEL),
             max_retries=2,
+            # Same connection pool as the raw SDK client above
+            http_client=settings.get_http_client(),
+            http_async_client=settings.get_async_http_client(),
         )
 
-        response = llm.invoke("Explain machine learning in one sentence")
+        # Same hedger as the raw call - both share one latency history
+        response = hedge_runnable(llm, settings.OPENAI_MODEL).invoke("Explain machine learning in one sentence")
         """ 
             Raw Response: content='Machine learning is a field of artificial intelligence that enables computers to learn patterns from data and make predictions or decisions without being explicitly programmed.' additional_kwargs={'refusal': None} response_metadata={'token_usage': {'completion_tokens': 26, 'prompt_tokens': 13, 'total_tokens': 39, 'completion_tokens_details': {'accepted_prediction_tokens': 0, 'audio_tokens': 0, 'reasoning_tokens': 0, 'rejected_prediction_tokens': 0}, 'prompt_tokens_details': {'audio_tokens': 0, 'cached_tokens': 0}}, 'model_provider': 'openai', 'model_name': 'gpt-4.1-mini-2025-04-14', 'system_fingerprint': 'fp_376a7ccef1', 'id': 'chatcmpl-CzalB2cvgAB90haRhMBm7iMmhJTE2', 'service_tier': 'default', 'finish_reason': 'stop', 'logprobs': None} id='lc_run--019bd46b-2205-71b3-aa7a-a7e8ff75be12-0' tool_calls=[] invalid_tool_calls=[] usage_metadata={'input_tokens': 13, 'output_tokens': 26, 'total_tokens': 39, 'input_token_details': {'audio': 0, 'cache_read': 0}, 'output_token_details': {'audio': 0, 'reasoning': 0}}
         """
         print(f"Response: {response.content}")
         return response.content
 
-    except APITimeoutError:
+    except (APITimeoutError, TimeoutError):
         print("❌ OpenAI request timed out")
         return None
 
@@ -84,6 +97,11 @@ def main():
         print("  - Cleaner response handling")
         print("  - Provider agnostic")
 
+        print(f"\n⏱️ Hedging: {get_hedger(settings.OPENAI_MODEL).summary()}")
+        tracer = get_tracer()
+        if tracer:
+            print(f"🛰️ Tracing: {tracer.summary()}")
+
         print("\n✅ Task 1 completed!")
 
 
@@ -5,16 +5,137 @@ Test OpenAI, Google, and X.AI models using the same LangChain interface.
 Learning Goal: Experience provider flexibility without code changes.
 """
 
+import asyncio
 import os
-from langchain_openai import ChatOpenAI
+import time
+from langchain_core.output_parsers import StrOutputParser
 from langchain_google_genai import ChatGoogleGenerativeAI
-from openai import APITimeoutError
 
 import sys
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from core import settings
+from core.cassette import get_cassette_cache
+from core.circuit_breaker import breakers, fallback_chain
+from core.multi_provider import run_all, run_first
+from core.rate_limit import rate_limit_options
+from core.router import ModelRouter, Route
+
+# Per-provider deadlines (seconds) - a slow provider never holds up the others
+PROVIDER_TIMEOUTS = {
+    "OpenAI": 30.0,
+    "Google": 30.0,
+}
+
+
+async def compare_providers(providers, prompt):
+    """Run the all-results and first-wins modes on one event loop"""
+    results = await run_all(providers, prompt, timeouts=PROVIDER_TIMEOUTS)
+    winner = await run_first(providers, prompt, timeouts=PROVIDER_TIMEOUTS)
+    return results, winner
+
+
+# Prompts for the router demo: (chain, prompt) - quick facts need tier 1, explanations tier 2
+ROUTED_PROMPTS = [
+    ("quick_facts", "What year was Python first released? Answer with the year only."),
+    ("explain", "Explain how a transformer model uses attention, in three sentences."),
+    ("quick_facts", "Name the creator of Linux in two words."),
+    ("explain", "Compare SQL and NoSQL databases for an e-commerce backend in one paragraph."),
+    ("quick_facts", "What does HTTP stand for?"),
+    ("explain", "Why do neural networks need non-linear activation functions? Two sentences."),
+]
+
+
+def build_router(openai_llm, google_llm):
+    """Router over the configured models, plus the cheap fast model for easy chains"""
+    routes = [Route("OpenAI", settings.OPENAI_MODEL, openai_llm),
+              Route("Google", settings.GOOGLE_MODEL, google_llm)]
+    if settings.OPENAI_FAST_MODEL and settings.OPENAI_FAST_MODEL != settings.OPENAI_MODEL:
+        routes.append(Route("OpenAI", settings.OPENAI_FAST_MODEL,
+                            settings.get_chat_openai(model=settings.OPENAI_FAST_MODEL)))
+    return ModelRouter(routes)
+
+
+async def run_fallback_chain(chain, prompts):
+    """Each prompt through the fallback chain: (prompt, answer or error, seconds)"""
+    outcomes = []
+    for prompt in prompts:
+        start = time.perf_counter()
+        try:
+            outcome = (await chain.ainvoke(prompt)).content
+        except Exception as e:
+            outcome = e
+        outcomes.append((prompt, outcome, time.perf_counter() - start))
+    return outcomes
+
+
+async def compare_route_and_fall_back(openai_llm, google_llm):
+    """Comparison, race, routing and fallback demos, all on the caller's event loop"""
+    # Compare all models with the same prompt
+    print("\n✅ All models initialized! Now let's compare them...")
+    print("\nModel Comparison - Same Prompt, Different Models")
+    print("=" * 50)
+
+    test_prompt = "Explain cloud computing in one sentence"
+    print(f"📝 Prompt: '{test_prompt}'\n")
+
+    providers = {"OpenAI": openai_llm, "Google": google_llm}
+
+    # All providers are called at the same time, so the total wait is the
+    # slowest provider instead of the sum of all of them
+    results, winner = await compare_providers(providers, test_prompt)
+
+    for name, result in results.items():
+        if result.ok:
+            print(f"\n{name} Response ({result.latency:.2f}s): {result.content}")
+        else:
+            print(f"❌ {name} request failed after {result.latency:.2f}s: {result.error!r}")
+
+    # First valid answer wins - the slower provider is cancelled
+    print("\n🏁 Race Mode - First Valid Answer Wins")
+    print("=" * 50)
+    if winner:
+        print(f"Winner: {winner.provider} in {winner.latency:.2f}s")
+        print(f"Response: {winner.content}")
+    else:
+        print("❌ No provider returned a valid answer")
+
+    # Nobody picks a provider by hand: each chain states the quality it needs
+    print("\n🧭 Smart Routing - Cheapest Fast Model That Is Good Enough")
+    print("=" * 50)
+    router = build_router(openai_llm, google_llm)
+    chains = {
+        "quick_facts": router.runnable(tier=1, name="quick_facts") | StrOutputParser(),
+        "explain": router.runnable(tier=2, name="explain") | StrOutputParser(),
+    }
+    for chain_name, prompt in ROUTED_PROMPTS:
+        try:
+            answer = await chains[chain_name].ainvoke(prompt)
+        except Exception as e:
+            print(f"❌ [{chain_name}] every provider failed: {e!r}")
+            continue
+        decision = router.decisions[-1]
+        tried = " -> ".join(f"{route} ({outcome})" for route, outcome in decision.attempts)
+        print(f"[{chain_name}] {tried} in {decision.latency:.2f}s: {answer[:70]}")
+    print("\n📊 Routing report")
+    for line in router.report():
+        print(line)
+
+    # Every call above went through a circuit breaker per provider/model: a
+    # provider that keeps failing is skipped in a millisecond, not waited on
+    print("\n🔌 Fallback Chain with Circuit Breakers")
+    print("=" * 50)
+    chain = fallback_chain({"Google": google_llm, "OpenAI": openai_llm}, timeouts=PROVIDER_TIMEOUTS)
+    prompts = [prompt for _, prompt in ROUTED_PROMPTS[:4]]
+    for prompt, outcome, seconds in await run_fallback_chain(chain, prompts):
+        if isinstance(outcome, Exception):
+            print(f"❌ ({seconds:.3f}s) {prompt[:40]}... every provider failed: {outcome!r}")
+        else:
+            print(f"✅ ({seconds:.3f}s) {prompt[:40]}... {outcome[:60]}")
+    for breaker in breakers().values():
+        print(f"  {breaker.summary()}")
+
 
 def main():
 
@@ -27,42 +148,22 @@ def main():
     # TODO 1: Initialize OpenAI model
     print("Setting up OpenAI GPT-4.1-mini...")
 
-    openai_llm = ChatOpenAI(
-        model = settings.OPENAI_MODEL,
-        api_key = settings.OPENAI_API_KEY,
-        base_url = settings.OPENAI_API_BASE
-    )
+    openai_llm = settings.get_chat_openai()
 
     print("Setting up Google GEMINI-2.5-flash")
     google_llm = ChatGoogleGenerativeAI(
         model = settings.GOOGLE_MODEL,
         api_key = settings.GEMINI_API_KEY,
+        # Gemini does not use our HTTP clients - gate it with LangChain's rate_limiter hook
+        **rate_limit_options(settings.GOOGLE_MODEL),
+        # ...and to record / replay it with CASSETTE_MODE (see core/cassette.py)
+        cache=get_cassette_cache(),
     )
 
-    # Compare all models with the same prompt
-    print("\n✅ All models initialized! Now let's compare them...")
-    print("\nModel Comparison - Same Prompt, Different Models")
-    print("=" * 50)
-
-    test_prompt = "Explain cloud computing in one sentence"
-    print(f"📝 Prompt: '{test_prompt}'\n")
+    # The comparison, routing and fallback demos share one event loop rather
+    # than starting a fresh asyncio.run() per section
+    asyncio.run(compare_route_and_fall_back(openai_llm, google_llm))
 
-    if openai_llm:
-        try:
-            response = openai_llm.invoke(test_prompt)
-            print(f"\nOpen AI Response: {response.content}")
-        except APITimeoutError:
-            print("❌ OpenAI request timed out")
-            return None
-
-    if google_llm:
-        try:
-            response = google_llm.invoke(test_prompt)
-            print(f"\nGoogle LLM Response: {response.content}")
-        except APITimeoutError:
-            print("❌ Google LLM request timed out")
-            return None
-    
     print("\n💡 Same code, different providers - perfect for A/B testing!")
     print("\n✅ Task 2 completed! You can now switch models at will!")
     print("🎉 You tested 2 different AI providers with identical code!")
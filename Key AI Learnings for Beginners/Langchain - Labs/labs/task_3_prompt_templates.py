@@ -6,7 +6,6 @@ Learning Goal: Master prompt templates for consistent, reusable prompts.
 """
 
 from langchain_core.prompts import PromptTemplate
-from langchain_openai import ChatOpenAI
 
 import sys
 import os
@@ -33,12 +32,7 @@ def main():
     print("\n🤖 Testing Template with AI")
     print("=" * 50)
 
-    openai_llm = ChatOpenAI(
-        model = settings.OPENAI_MODEL,
-        api_key = settings.OPENAI_API_KEY,
-        base_url = settings.OPENAI_API_BASE,
-        temperature = 0.8
-    )
+    openai_llm = settings.get_chat_openai(temperature = 0.8)
 
     # TODO 2: Use the template with LLM
     if template and openai_llm:
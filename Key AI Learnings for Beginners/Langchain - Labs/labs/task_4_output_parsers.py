@@ -5,15 +5,11 @@ Transform AI responses into structured formats your application can use.
 Learning Goal: Extract structured data from unstructured AI responses.
 """
 
+import argparse
 import os
 import sys
 import json
-from enum import Enum
-from typing import List
 
-from pydantic import BaseModel, Field
-from langchain_openai import ChatOpenAI
-from langchain_core.prompts import PromptTemplate
 from langchain_core.output_parsers import (
     StrOutputParser,
     CommaSeparatedListOutputParser,
@@ -32,32 +28,178 @@ from langchain_classic.output_parsers.retry import RetryOutputParser
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from core import settings
+from core.output_repair import LocalRepairParser, repair_stats
+from core.packing import PackedTask, PromptPacker
+from core.prefix_cache import prefix_cache_tracker
+from core.prompt_registry import prompt_registry
+from core.response_cache import get_response_cache
+from core.schemas import Difficulty, DifficultyRating, TechInfo
+from core.semantic_cache import get_semantic_cache
+from core.streaming import StreamMetrics, stream_chain, stream_model
+from core.structured import json_schema_from_response_schemas, structured_output_chain, structured_stats
+from core.tokens import count_prompt_tokens
+from core.tracing import get_tracer
+
+
+def make_llm():
+    """Shared ChatOpenAI for every parser demo in this task"""
+    return settings.get_chat_openai(
+        temperature=0.3,
+        # Repeated prompts are served from the local response cache (zero tokens);
+        # SEMANTIC_CACHE_ENABLED=true also matches reworded prompts
+        cache=get_semantic_cache() or get_response_cache(),
+        # Reads cached_tokens from every response (provider-side prompt caching)
+        callbacks=[prefix_cache_tracker],
+    )
+
+
+def build_chains(llm):
+    """Build one prompt | llm | parser chain per parser, keyed by name"""
 
-# ----- Example Models & Enums -----
-class TechInfo(BaseModel):
-    """Information about a technology."""
-    name: str = Field(description="Name of the technology")
-    year_released: int = Field(description="Year it was first released")
-    creator: str = Field(description="Person or organization that created it")
-    tags: List[str] = Field(description="List of keywords describing it")
+    # Templates, format instructions and parsers are compiled once per process
+    # by the registry; building the chains again just reuses them
 
+    # Parser 1: String Output
+    str_prompt, str_parser = prompt_registry.compile(
+        "pros_cons",
+        "Analyze {technology} and provide pros and cons in 2-3 sentences",
+        parser=StrOutputParser(),
+    )
+    str_chain = str_prompt | llm | str_parser
 
-class Difficulty(Enum):
-    BEGINNER = "beginner"
-    INTERMEDIATE = "intermediate"
-    ADVANCED = "advanced"
+    # Parser 2: List Output
+    list_prompt, list_parser = prompt_registry.compile(
+        "use_cases",
+        "List 3 use cases for {technology} (comma-separated):",
+        parser=CommaSeparatedListOutputParser(),
+    )
+    list_chain = list_prompt | llm | list_parser
+
+    # Parser 3: JSON Output
+    json_prompt, json_parser = prompt_registry.compile(
+        "ranked_json",
+        "Return a JSON object with 'name', 'rank', and 'attribute' for {topic}.\n{format_instructions}",
+        parser=JsonOutputParser(),
+    )
+    json_chain = json_prompt | llm | json_parser
+
+    # Parser 4: Pydantic Output
+    pydantic_prompt, pydantic_parser = prompt_registry.compile(
+        "tech_info",
+        "Provide details about {technology}.\n{format_instructions}",
+        parser=PydanticOutputParser(pydantic_object=TechInfo),
+    )
+    pydantic_chain = pydantic_prompt | llm | pydantic_parser
+
+    # Parser 5: Structured Schema
+    response_schemas = [
+        ResponseSchema(name="answer", description="answer to the user's question"),
+        ResponseSchema(name="source", description="source used to answer the user's question, should be a website"),
+    ]
+    structured_prompt, structured_parser = prompt_registry.compile(
+        "answer_with_source",
+        "Answer the user question as best as possible.\n{format_instructions}\n{question}",
+        parser=StructuredOutputParser.from_response_schemas(response_schemas),
+    )
+    structured_chain = structured_prompt | llm | structured_parser
+
+    # Parser 6: Regex Extraction
+    regex_prompt, regex_parser = prompt_registry.compile(
+        "confidence",
+        "Rate your confidence in {topic} from 1-100 and give reasoning.\nFormat: 'Confidence: <number>\nReasoning: <text>'",
+        parser=RegexParser(
+            regex=r"Confidence:\s*(\d+)\s*\nReasoning:\s*(.*)",
+            output_keys=["confidence", "reasoning"]
+        ),
+    )
+    regex_chain = regex_prompt | llm | regex_parser
+
+    # Parser 7: Enum Output
+    enum_prompt, enum_parser = prompt_registry.compile(
+        "difficulty",
+        "Rate the difficulty of learning {subject}.\nONLY return one of these choices: {choices}\nDifficulty:",
+        parser=EnumOutputParser(enum=Difficulty),
+        partial_variables={"choices": [e.value for e in Difficulty]},
+    )
+    enum_chain = enum_prompt | llm | enum_parser
+
+    # Parser 8: Output Fixing
+    # Cosmetic failures (fences, trailing commas, "2013" for 2013) are repaired
+    # locally; only what is left goes to the LLM-backed OutputFixingParser
+    fixing_parser = LocalRepairParser(
+        parser=pydantic_parser,
+        fallback=OutputFixingParser.from_llm(parser=pydantic_parser, llm=llm),
+    )
+    fixing_chain = pydantic_prompt | llm | fixing_parser
+
+    # Native Structured Output (TechInfo, Difficulty, answer + source)
+    # The schema goes to the provider as a JSON-schema response format instead
+    # of format instructions in the prompt; models without support fall back
+    # to the text chains above
+    pydantic_native_chain = structured_output_chain(
+        "tech_info_native",
+        "Provide details about {technology}.",
+        llm, TechInfo, text_chain=pydantic_chain,
+    )
+    enum_native_chain = structured_output_chain(
+        "difficulty_native",
+        "Rate the difficulty of learning {subject}.",
+        llm, DifficultyRating, text_chain=enum_chain,
+        convert=lambda rating: rating.difficulty,
+    )
+    structured_native_chain = structured_output_chain(
+        "answer_with_source_native",
+        "Answer the user question as best as possible.\n{question}",
+        llm, json_schema_from_response_schemas("AnswerWithSource", response_schemas),
+        text_chain=structured_chain,
+    )
+
+    chains = {
+        "str": str_chain,
+        "list": list_chain,
+        "json": json_chain,
+        "pydantic": pydantic_chain,
+        "structured": structured_chain,
+        "regex": regex_chain,
+        "enum": enum_chain,
+        "fixing": fixing_chain,
+        "pydantic_native": pydantic_native_chain,
+        "enum_native": enum_native_chain,
+        "structured_native": structured_native_chain,
+    }
+    # Each chain runs (and is traced, see core/tracing.py) under its own name
+    for name, chain in chains.items():
+        chain.name = name
+    return chains
+
+
+def build_packers(llm, chains):
+    """Packed versions of the tiny regex and enum chains (many inputs per request)"""
+    confidence = PackedTask(
+        name="confidence",
+        instructions="Rate your confidence in each topic from 1-100 and give reasoning.\n"
+                     "Format each answer as: 'Confidence: <number>\nReasoning: <text>'",
+        item_template="{topic}",
+        parser=chains["regex"].last,
+        single=chains["regex"],
+    )
+    difficulty = PackedTask(
+        name="difficulty",
+        instructions="Rate the difficulty of learning each subject.\n"
+                     f"Each answer must be ONLY one of these choices: {[e.value for e in Difficulty]}",
+        item_template="{subject}",
+        parser=chains["enum"].last,
+        single=chains["enum"],
+    )
+    return {"regex": PromptPacker(llm, confidence), "enum": PromptPacker(llm, difficulty)}
 
 
 def main():
     print("🎯 Task 4: Output Parsers Showcase")
     print("=" * 50)
 
-    llm = ChatOpenAI(
-        model=settings.OPENAI_MODEL,
-        api_key=settings.OPENAI_API_KEY,
-        base_url=settings.OPENAI_API_BASE,
-        temperature=0.3,
-    )
+    llm = make_llm()
+    chains = build_chains(llm)
 
     # --------------------------
     # Parser 1: String Output
@@ -65,14 +207,7 @@ def main():
     print("\n🧵 Parser 1: String Output")
     print("=" * 50)
 
-    str_prompt = PromptTemplate(
-        template="Analyze {technology} and provide pros and cons in 2-3 sentences",
-        input_variables=["technology"]
-    )
-    str_parser = StrOutputParser()
-    str_chain = str_prompt | llm | str_parser
-
-    result = str_chain.invoke({"technology": "Blockchain"})
+    result = chains["str"].invoke({"technology": "Blockchain"})
     print(f"✅ Output: {result}")
 
     # --------------------------
@@ -81,14 +216,7 @@ def main():
     print("\n📋 Parser 2: List Output")
     print("=" * 50)
 
-    list_prompt = PromptTemplate(
-        template="List 3 use cases for {technology} (comma-separated):",
-        input_variables=["technology"]
-    )
-    list_parser = CommaSeparatedListOutputParser()
-    list_chain = list_prompt | llm | list_parser
-
-    result = list_chain.invoke({"technology": "Blockchain"})
+    result = chains["list"].invoke({"technology": "Blockchain"})
     print(f"✅ Output: {result}")
     print(f"✅ Type: {type(result)} - Python list!")
 
@@ -98,15 +226,7 @@ def main():
     print("\n📦 Parser 3: JSON Output")
     print("=" * 50)
 
-    json_parser = JsonOutputParser()
-    json_prompt = PromptTemplate(
-        template="Return a JSON object with 'name', 'rank', and 'attribute' for {topic}.\n{format_instructions}",
-        input_variables=["topic"],
-        partial_variables={"format_instructions": json_parser.get_format_instructions()}
-    )
-    json_chain = json_prompt | llm | json_parser
-
-    result = json_chain.invoke({"topic": "Python Programming"})
+    result = chains["json"].invoke({"topic": "Python Programming"})
     print(f"✅ Output: {json.dumps(result, indent=2)}")
     print(f"✅ Type: {type(result)}")
 
@@ -116,15 +236,7 @@ def main():
     print("\n🏗️ Parser 4: Pydantic Output")
     print("=" * 50)
 
-    pydantic_parser = PydanticOutputParser(pydantic_object=TechInfo)
-    pydantic_prompt = PromptTemplate(
-        template="Provide details about {technology}.\n{format_instructions}",
-        input_variables=["technology"],
-        partial_variables={"format_instructions": pydantic_parser.get_format_instructions()}
-    )
-    pydantic_chain = pydantic_prompt | llm | pydantic_parser
-
-    result = pydantic_chain.invoke({"technology": "React"})
+    result = chains["pydantic"].invoke({"technology": "React"})
     print(f"✅ Output: {result}")
     print(f"✅ Name: {result.name}, Creator: {result.creator}")
 
@@ -134,19 +246,7 @@ def main():
     print("\n🧱 Parser 5: Structured Schema")
     print("=" * 50)
 
-    response_schemas = [
-        ResponseSchema(name="answer", description="answer to the user's question"),
-        ResponseSchema(name="source", description="source used to answer the user's question, should be a website"),
-    ]
-    structured_parser = StructuredOutputParser.from_response_schemas(response_schemas)
-    structured_prompt = PromptTemplate(
-        template="Answer the user question as best as possible.\n{format_instructions}\n{question}",
-        input_variables=["question"],
-        partial_variables={"format_instructions": structured_parser.get_format_instructions()}
-    )
-    structured_chain = structured_prompt | llm | structured_parser
-
-    result = structured_chain.invoke({"question": "What is the capital of France?"})
+    result = chains["structured"].invoke({"question": "What is the capital of France?"})
     print(f"✅ Output: {result}")
 
     # --------------------------
@@ -155,17 +255,7 @@ def main():
     print("\n🔍 Parser 6: Regex Extraction")
     print("=" * 50)
 
-    regex_parser = RegexParser(
-        regex=r"Confidence:\s*(\d+)\s*\nReasoning:\s*(.*)",
-        output_keys=["confidence", "reasoning"]
-    )
-    regex_prompt = PromptTemplate(
-        template="Rate your confidence in {topic} from 1-100 and give reasoning.\nFormat: 'Confidence: <number>\nReasoning: <text>'",
-        input_variables=["topic"]
-    )
-    regex_chain = regex_prompt | llm | regex_parser
-
-    result = regex_chain.invoke({"topic": "AI Safety"})
+    result = chains["regex"].invoke({"topic": "AI Safety"})
     print(f"✅ Output: {result}")
 
     # --------------------------
@@ -174,15 +264,7 @@ def main():
     print("\n🎚️ Parser 7: Enum Output")
     print("=" * 50)
 
-    enum_parser = EnumOutputParser(enum=Difficulty)
-    enum_prompt = PromptTemplate(
-        template="Rate the difficulty of learning {subject}.\nONLY return one of these choices: {choices}\nDifficulty:",
-        input_variables=["subject"],
-        partial_variables={"choices": [e.value for e in Difficulty]}
-    )
-    enum_chain = enum_prompt | llm | enum_parser
-
-    result = enum_chain.invoke({"subject": "Quantum Physics"})
+    result = chains["enum"].invoke({"subject": "Quantum Physics"})
     print(f"✅ Output: {result}")
 
     # --------------------------
@@ -191,10 +273,7 @@ def main():
     print("\n🛠️ Parser 8: Output Fixing")
     print("=" * 50)
 
-    fixing_parser = OutputFixingParser.from_llm(parser=pydantic_parser, llm=llm)
-    fixing_chain = pydantic_prompt | llm | fixing_parser
-
-    result = fixing_chain.invoke({"technology": "TypeScript"})
+    result = chains["fixing"].invoke({"technology": "TypeScript"})
     print(f"✅ Output (Fixed if needed): {result}")
 
     # --------------------------
@@ -203,7 +282,12 @@ def main():
     print("\n🔄 Parser 9: Retry Logic")
     print("=" * 50)
 
-    retry_parser = RetryOutputParser.from_llm(parser=pydantic_parser, llm=llm)
+    pydantic_prompt = chains["pydantic"].first
+    pydantic_parser = chains["pydantic"].last
+    retry_parser = LocalRepairParser(
+        parser=pydantic_parser,
+        fallback=RetryOutputParser.from_llm(parser=pydantic_parser, llm=llm),
+    )
     simulated_bad_output = "React was created by Facebook in 2013 as a UI library. It is widely used."
     prompt_value = pydantic_prompt.format_prompt(technology="React")
 
@@ -214,10 +298,116 @@ def main():
         fixed_result = retry_parser.parse_with_prompt(simulated_bad_output, prompt_value)
         print(f"✅ Successfully Fixed Output: {fixed_result}")
 
+    # Only cosmetically broken - fixed locally, no LLM call
+    cosmetic_bad_output = '```json\n{"name": "React", "year_released": "2013", "creator": "Meta", "tags": ["ui",],}\n```'
+    print(f"📝 Cosmetically Bad Input: {cosmetic_bad_output!r}")
+    print(f"✅ Repaired Locally: {retry_parser.parse_with_prompt(cosmetic_bad_output, prompt_value)}")
+
+    # --------------------------
+    # Parser 10: Packed Calls
+    # --------------------------
+    print("\n📦 Parser 10: Packed Calls")
+    print("=" * 50)
+
+    # Many tiny answers, one request: the instructions are sent once and the
+    # answers come back as a JSON array keyed by item id
+    packers = build_packers(llm, chains)
+    subjects = ["Quantum Physics", "HTML", "Rust", "Statistics", "Cooking"]
+    difficulties = packers["enum"].batch([{"subject": subject} for subject in subjects])
+    for subject, difficulty in zip(subjects, difficulties):
+        print(f"✅ {subject}: {difficulty}")
+
+    topics = ["AI Safety", "Climate Models"]
+    for topic, result in zip(topics, packers["regex"].batch([{"topic": topic} for topic in topics])):
+        print(f"✅ {topic}: {result}")
+    for name, packer in packers.items():
+        print(f"📊 {name}: {packer.stats.summary()}")
+
+    # --------------------------
+    # Parser 11: Native Structured Output
+    # --------------------------
+    print("\n🧩 Parser 11: Native Structured Output")
+    print("=" * 50)
+
+    # The provider enforces the schema, so the prompt needs no format instructions
+    text_tokens = count_prompt_tokens(chains["pydantic"].first, technology="React")
+    native_tokens = count_prompt_tokens(chains["pydantic_native"].first, technology="React")
+    print(f"📏 Prompt tokens: {text_tokens} with format instructions, {native_tokens} native")
+    print(f"✅ TechInfo: {chains['pydantic_native'].invoke({'technology': 'React'})}")
+    print(f"✅ Difficulty: {chains['enum_native'].invoke({'subject': 'Quantum Physics'})}")
+    print(f"✅ Answer: {chains['structured_native'].invoke({'question': 'What is the capital of France?'})}")
+    print(f"📊 {structured_stats.summary()}")
+
     print("\n💡 Parser Highlights:")
     print("  ✓ Different parsers produce different structured outputs")
     print("  ✓ Pipelines: prompt | llm | parser")
     print("  ✓ Outputs ready for direct application use")
 
+    print(f"\n🩹 Output repair: {repair_stats.summary()}")
+
+    print(f"\n🧊 Provider prompt cache (layout: {settings.PROMPT_LAYOUT}):")
+    for line in prefix_cache_tracker.report():
+        print(f"  {line}")
+
+    tracer = get_tracer()
+    if tracer:
+        print(f"🛰️ Tracing: {tracer.summary()}")
+
+    cache = get_response_cache()
+    if cache:
+        stats = cache.stats()
+        print(f"\n🗄️ Response cache: {stats['hits']} hits, {stats['misses']} misses "
+              f"({stats['hit_rate']:.0%} hit rate, {stats['entries']} entries)")
+
+    semantic_cache = get_semantic_cache()
+    if semantic_cache:
+        stats = semantic_cache.stats()
+        print(f"🧭 Semantic cache: {stats['hit_rate']:.0%} hit rate, "
+              f"p95 lookup {stats['lookup_p95_ms']:.2f} ms, "
+              f"false-hit rate {stats['false_hit_rate']:.0%} of {stats['verified']} checked "
+              f"(threshold {stats['threshold']})")
+
+
+def stream_main():
+    """Streaming mode: show output as it is generated and measure TTFT / TTLT"""
+    print("🎯 Task 4: Streaming Output Parsers")
+    print("=" * 50)
+
+    chains = build_chains(make_llm())
+
+    # String output: print every token as soon as it arrives
+    print("\n🧵 Streaming String Output")
+    print("=" * 50)
+    metrics = StreamMetrics()
+    for chunk in stream_chain(chains["str"], {"technology": "Blockchain"}, metrics):
+        print(chunk, end="", flush=True)
+    print(f"\n⏱️ {metrics.summary()}")
+
+    # JSON output: the dict grows as fields are generated
+    print("\n📦 Streaming JSON Output")
+    print("=" * 50)
+    metrics = StreamMetrics()
+    for partial in stream_chain(chains["json"], {"topic": "Python Programming"}, metrics):
+        print(f"  … {partial}")
+    print(f"⏱️ {metrics.summary()}")
+
+    # Pydantic output: a partial TechInfo every time a field completes
+    print("\n🏗️ Streaming Pydantic Output")
+    print("=" * 50)
+    metrics = StreamMetrics()
+    for partial in stream_model(chains["pydantic"], {"technology": "React"}, metrics):
+        print(f"  … {partial!r}")
+    print(f"⏱️ {metrics.summary()}")
+
+    print("\n✅ Streaming completed! Users see output long before the call finishes.")
+
+
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--stream", action="store_true", help="stream the string, JSON and Pydantic chains")
+    args = parser.parse_args()
+
+    if args.stream:
+        stream_main()
+    else:
+        main()
@@ -5,13 +5,10 @@ Build complete AI pipelines using LangChain's chain composition.
 Learning Goal: Master chain composition with the pipe operator (|).
 """
 
+import argparse
+import asyncio
 import os
 import sys
-from enum import Enum
-from typing import List, Optional
-from pydantic import BaseModel, Field
-from langchain_core.prompts import PromptTemplate
-from langchain_openai import ChatOpenAI
 from langchain_core.output_parsers import (
     CommaSeparatedListOutputParser, 
     StrOutputParser, 
@@ -31,45 +28,185 @@ from langchain_classic.output_parsers.retry import RetryOutputParser
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from core import settings
+from core.batch import arun_batch, print_summary, run_batch
+from core.batch_jobs import BatchJob, get_batch_backend
+from core.bulk import BulkRunner, print_bulk_summary, read_records
+from core.coalesce import coalesce_stats
+from core.output_repair import LocalRepairParser, repair_stats
+from core.prefix_cache import prefix_cache_tracker
+from core.profiler import ChainProfiler
+from core.prompt_registry import prompt_registry
+from core.rate_limit import get_rate_limiter
+from core.response_cache import get_response_cache
+from core.schemas import Difficulty, DifficultyRating, TechInfo
+from core.semantic_cache import get_semantic_cache
+from core.structured import json_schema_from_response_schemas, structured_output_chain, structured_stats
+from core.tokens import count_prompt_tokens, project_cost
+from core.tracing import get_tracer
+
+def build_chains(llm):
+    """Build every prompt | llm | parser chain used in this task, keyed by name"""
+
+    # Templates, format instructions and parsers are compiled once per process
+    # by the registry (and shared with task_4 where the prompts are the same)
 
-# --- Data Models for Parsers ---
+    # Chain 1: Simple Analysis Chain
+    analysis_prompt, str_parser = prompt_registry.compile(
+        "pros_cons",
+        "Analyze {technology} and provide pros and cons in 2-3 sentences",
+        parser = StrOutputParser(),
+    )
+
+    analysis_chain = analysis_prompt | llm | str_parser
+
+    # Chain 2: List Generation Chain
+    list_prompt, list_parser = prompt_registry.compile(
+        "use_cases",
+        "List 3 use cases for {technology} (comma-separated):",
+        parser = CommaSeparatedListOutputParser(),
+    )
+
+    list_chain = list_prompt | llm | list_parser
+
+    # Chain 3: JSON Output Parser
+    json_prompt, json_parser = prompt_registry.compile(
+        "ranked_json",
+        "Return a JSON object with 'name', 'rank', and 'attribute' for {topic}.\n{format_instructions}",
+        parser = JsonOutputParser(),
+    )
+
+    json_chain = json_prompt | llm | json_parser
+
+    # Chain 4: Pydantic Output Parser (Strong Typing)
+    pydantic_prompt, pydantic_parser = prompt_registry.compile(
+        "tech_info",
+        "Provide details about {technology}.\n{format_instructions}",
+        parser = PydanticOutputParser(pydantic_object=TechInfo),
+    )
+
+    pydantic_chain = pydantic_prompt | llm | pydantic_parser
+
+    # Chain 5: Structured Output Parser
+    response_schemas = [
+        ResponseSchema(name="answer", description="answer to the user's question"),
+        ResponseSchema(name="source", description="source used to answer the user's question, should be a website")
+    ]
+
+    structured_prompt, structured_parser = prompt_registry.compile(
+        "answer_with_source",
+        "Answer the user question as best as possible.\n{format_instructions}\n{question}",
+        parser = StructuredOutputParser.from_response_schemas(response_schemas),
+    )
 
-class TechInfo(BaseModel):
-    """Information about a technology."""
-    name: str = Field(description="Name of the technology")
-    year_released: int = Field(description="Year it was first released")
-    creator: str = Field(description="Person or organization that created it")
-    tags: List[str] = Field(description="List of keywords describing it")
+    structured_chain = structured_prompt | llm | structured_parser
+
+    # Chain 6: Regex Parser
+    regex_prompt, regex_parser = prompt_registry.compile(
+        "confidence",
+        "Rate your confidence in {topic} from 1-100 and give reasoning.\nFormat: 'Confidence: <number>\nReasoning: <text>'",
+        parser = RegexParser(
+            regex=r"Confidence:\s*(\d+)\s*\nReasoning:\s*(.*)",
+            output_keys=["confidence", "reasoning"]
+        ),
+    )
+
+    regex_chain = regex_prompt | llm | regex_parser
+
+    # Chain 7: Enum Output Parser
+    enum_prompt, enum_parser = prompt_registry.compile(
+        "difficulty",
+        "Rate the difficulty of learning {subject}.\nONLY return one of these choices: {choices}\nDifficulty:",
+        parser = EnumOutputParser(enum=Difficulty),
+        partial_variables = {"choices": [e.value for e in Difficulty]},
+    )
+
+    enum_chain = enum_prompt | llm | enum_parser
+
+    # Chain 8: Output Fixing Parser
+    # Wrap the existing pydantic parser with an OutputFixingParser
+    # Cosmetic failures (fences, trailing commas, "2013" for 2013) are repaired
+    # locally; only what is left goes to the LLM-backed OutputFixingParser
+    fixing_parser = LocalRepairParser(
+        parser=pydantic_parser,
+        fallback=OutputFixingParser.from_llm(parser=pydantic_parser, llm=llm),
+    )
+    
+    fixing_chain = pydantic_prompt | llm | fixing_parser
+
+    # Chain 10: Native Structured Output (TechInfo, Difficulty, answer + source)
+    # The schema goes to the provider as a JSON-schema response format instead
+    # of format instructions in the prompt; models without support fall back
+    # to the text chains above
+    pydantic_native_chain = structured_output_chain(
+        "tech_info_native",
+        "Provide details about {technology}.",
+        llm, TechInfo, text_chain=pydantic_chain,
+    )
+    enum_native_chain = structured_output_chain(
+        "difficulty_native",
+        "Rate the difficulty of learning {subject}.",
+        llm, DifficultyRating, text_chain=enum_chain,
+        convert=lambda rating: rating.difficulty,
+    )
+    structured_native_chain = structured_output_chain(
+        "answer_with_source_native",
+        "Answer the user question as best as possible.\n{question}",
+        llm, json_schema_from_response_schemas("AnswerWithSource", response_schemas),
+        text_chain=structured_chain,
+    )
+
+    chains = {
+        "analysis": analysis_chain,
+        "list": list_chain,
+        "json": json_chain,
+        "pydantic": pydantic_chain,
+        "structured": structured_chain,
+        "regex": regex_chain,
+        "enum": enum_chain,
+        "fixing": fixing_chain,
+        "pydantic_native": pydantic_native_chain,
+        "enum_native": enum_native_chain,
+        "structured_native": structured_native_chain,
+    }
+    # Each chain runs (and is traced, see core/tracing.py) under its own name
+    for name, chain in chains.items():
+        chain.name = name
+    return chains
+
+
+def make_llm():
+    """Shared ChatOpenAI for every chain in this task"""
+    return settings.get_chat_openai(
+        temperature = 0.3,
+        # Repeated prompts are served from the local response cache (zero tokens);
+        # SEMANTIC_CACHE_ENABLED=true also matches reworded prompts
+        cache = get_semantic_cache() or get_response_cache(),
+        # Reads cached_tokens from every response (provider-side prompt caching)
+        callbacks = [prefix_cache_tracker],
+    )
 
-class Difficulty(Enum):
-    BEGINNER = "beginner"
-    INTERMEDIATE = "intermediate"
-    ADVANCED = "advanced"
 
 def main():
     print("🎯 Task 5: Chain Composition with |")
     print("=" * 50)
 
-    llm = ChatOpenAI(
-        api_key = settings.OPENAI_API_KEY,
-        model = settings.OPENAI_MODEL,
-        base_url = settings.OPENAI_API_BASE,
-        temperature = 0.3
-    )
+    llm = make_llm()
+
+    # Every chain is built the same way: prompt | llm | parser
+    chains = build_chains(llm)
+    analysis_chain = chains["analysis"]
+    list_chain = chains["list"]
+    json_chain = chains["json"]
+    pydantic_chain = chains["pydantic"]
+    structured_chain = chains["structured"]
+    regex_chain = chains["regex"]
+    enum_chain = chains["enum"]
+    fixing_chain = chains["fixing"]
 
     # Chain 1: Simple Analysis Chain
     print("\n⛓️ Chain 1: Simple Analysis")
     print("=" * 50)
 
-    analysis_prompt = PromptTemplate(
-        template = "Analyze {technology} and provide pros and cons in 2-3 sentences",
-        input_variable = ["technology"]
-    )
-
-    str_parser = StrOutputParser()
-
-    analysis_chain = analysis_prompt | llm | str_parser
-
     if analysis_chain:
         result = analysis_chain.invoke({
             "technology": "Blockchain"
@@ -81,15 +218,6 @@ def main():
     print("\n⛓️ Chain 2: List Generation with Parser")
     print("=" * 50)
 
-    list_prompt = PromptTemplate(
-        template = "List 3 use cases for {technology} (comma-seperated):",
-        input_variables = ["technology"]
-    )
-
-    list_parser = CommaSeparatedListOutputParser()
-
-    list_chain = list_prompt | llm | list_parser
-
     if list_chain:
         result = list_chain.invoke({
             "technology": "Blockchain"
@@ -102,16 +230,6 @@ def main():
     print("\n⛓️ Chain 3: JSON Dict Output")
     print("=" * 50)
 
-    json_prompt = PromptTemplate(
-        template = "Return a JSON object with 'name', 'rank', and 'attribute' for {topic}.\n{format_instructions}",
-        input_variables = ["topic"],
-        partial_variables = {"format_instructions": JsonOutputParser().get_format_instructions()}
-    )
-
-    json_parser = JsonOutputParser()
-
-    json_chain = json_prompt | llm | json_parser
-
     if json_chain:
         result = json_chain.invoke({"topic": "Python Programming"})
         print(f"✅ Output: {result}")
@@ -121,16 +239,6 @@ def main():
     print("\n⛓️ Chain 4: Pydantic (Strong Typing)")
     print("=" * 50)
 
-    pydantic_parser = PydanticOutputParser(pydantic_object=TechInfo)
-
-    pydantic_prompt = PromptTemplate(
-        template = "Provide details about {technology}.\n{format_instructions}",
-        input_variables = ["technology"],
-        partial_variables = {"format_instructions": pydantic_parser.get_format_instructions()}
-    )
-
-    pydantic_chain = pydantic_prompt | llm | pydantic_parser
-
     if pydantic_chain:
         # We wrap in a try-block because schema enforcement can be strict
         try:
@@ -144,20 +252,6 @@ def main():
     print("\n⛓️ Chain 5: Structured Output (Simple Schema)")
     print("=" * 50)
 
-    response_schemas = [
-        ResponseSchema(name="answer", description="answer to the user's question"),
-        ResponseSchema(name="source", description="source used to answer the user's question, should be a website.")
-    ]
-    structured_parser = StructuredOutputParser.from_response_schemas(response_schemas)
-
-    structured_prompt = PromptTemplate(
-        template = "Answer the user question as best as possible.\n{format_instructions}\n{question}",
-        input_variables = ["question"],
-        partial_variables = {"format_instructions": structured_parser.get_format_instructions()}
-    )
-
-    structured_chain = structured_prompt | llm | structured_parser
-
     if structured_chain:
         result = structured_chain.invoke({"question": "What is the capital of France?"})
         print(f"✅ Output: {result}")
@@ -166,18 +260,6 @@ def main():
     print("\n⛓️ Chain 6: Regex Extraction")
     print("=" * 50)
 
-    regex_parser = RegexParser(
-        regex=r"Confidence:\s*(\d+)\s*\nReasoning:\s*(.*)",
-        output_keys=["confidence", "reasoning"]
-    )
-
-    regex_prompt = PromptTemplate(
-        template = "Rate your confidence in {topic} from 1-100 and give reasoning.\nFormat: 'Confidence: <number>\nReasoning: <text>'",
-        input_variables = ["topic"]
-    )
-
-    regex_chain = regex_prompt | llm | regex_parser
-
     if regex_chain:
         result = regex_chain.invoke({"topic": "AI Safety"})
         print(f"✅ Output: {result}")
@@ -186,16 +268,6 @@ def main():
     print("\n⛓️ Chain 7: Enum Output (Fixed Choices)")
     print("=" * 50)
 
-    enum_parser = EnumOutputParser(enum=Difficulty)
-
-    enum_prompt = PromptTemplate(
-        template = "Rate the difficulty of learning {subject}.\nONLY return one of these choices: {choices}\nDifficulty:",
-        input_variables = ["subject"],
-        partial_variables = {"choices": [e.value for e in Difficulty]}
-    )
-
-    enum_chain = enum_prompt | llm | enum_parser
-
     if enum_chain:
         result = enum_chain.invoke({"subject": "Quantum Physics"})
         print(f"✅ Output: {result}")
@@ -204,11 +276,6 @@ def main():
     print("\n⛓️ Chain 8: Output Fixing (Auto-correction)")
     print("=" * 50)
 
-    # Wrap the existing pydantic parser with an OutputFixingParser
-    fixing_parser = OutputFixingParser.from_llm(parser=pydantic_parser, llm=llm)
-    
-    fixing_chain = pydantic_prompt | llm | fixing_parser
-
     if fixing_chain:
         result = fixing_chain.invoke({"technology": "TypeScript"})
         print(f"✅ Output (Fixed if needed): {result}")
@@ -219,7 +286,12 @@ def main():
 
     # RetryOutputParser is usually used to wrap a failing parse attempt.
     # It requires passing the prompt to the parse_with_prompt method.
-    retry_parser = RetryOutputParser.from_llm(parser=pydantic_parser, llm=llm)
+    pydantic_prompt = pydantic_chain.first
+    pydantic_parser = pydantic_chain.last
+    retry_parser = LocalRepairParser(
+        parser=pydantic_parser,
+        fallback=RetryOutputParser.from_llm(parser=pydantic_parser, llm=llm),
+    )
     
     # Let's simulate a scenario where the LLM returns bad data
     bad_output = "React was created by Facebook in 2013 as a UI library. It is widely used."
@@ -239,6 +311,19 @@ def main():
         fixed_result = retry_parser.parse_with_prompt(bad_output, prompt_value)
         print(f"✅ Successfully Fixed Output: {fixed_result}")
 
+    # Chain 10: Native Structured Output
+    print("\n⛓️ Chain 10: Native Structured Output (JSON schema)")
+    print("=" * 50)
+
+    # Same TechInfo, without the format instructions in the prompt
+    text_tokens = count_prompt_tokens(pydantic_prompt, technology="React")
+    native_tokens = count_prompt_tokens(chains["pydantic_native"].first, technology="React")
+    print(f"📏 Prompt tokens: {text_tokens} with format instructions, {native_tokens} native")
+    print(f"✅ TechInfo: {chains['pydantic_native'].invoke({'technology': 'React'})}")
+    print(f"✅ Difficulty: {chains['enum_native'].invoke({'subject': 'Quantum Physics'})}")
+    print(f"✅ Answer: {chains['structured_native'].invoke({'question': 'What is the capital of France?'})}")
+    print(f"🧩 Structured output: {structured_stats.summary()}")
+
     # Demonstrate the power of chains
     print("\n🎉 Complete Pipeline Example")
     print("=" * 50)
@@ -264,5 +349,176 @@ def main():
     print("\n✅ Task 5 completed! You've mastered LangChain chains!")
     print("🏆 You can now build any AI pipeline with the | operator!")
 
+    print(f"\n🩹 Output repair: {repair_stats.summary()}")
+
+    print(f"\n🧊 Provider prompt cache (layout: {settings.PROMPT_LAYOUT}):")
+    for line in prefix_cache_tracker.report():
+        print(f"  {line}")
+
+    tracer = get_tracer()
+    if tracer:
+        print(f"🛰️ Tracing: {tracer.summary()}")
+
+    cache = get_response_cache()
+    if cache:
+        stats = cache.stats()
+        print(f"\n🗄️ Response cache: {stats['hits']} hits, {stats['misses']} misses "
+              f"({stats['hit_rate']:.0%} hit rate, {stats['entries']} entries)")
+
+    semantic_cache = get_semantic_cache()
+    if semantic_cache:
+        stats = semantic_cache.stats()
+        print(f"🧭 Semantic cache: {stats['hit_rate']:.0%} hit rate, "
+              f"p95 lookup {stats['lookup_p95_ms']:.2f} ms, "
+              f"false-hit rate {stats['false_hit_rate']:.0%} of {stats['verified']} checked "
+              f"(threshold {stats['threshold']})")
+
+
+def batch_main(chain_name, path, max_concurrency=8, use_async=False,
+               dry_run=False, max_prompt_tokens=None, batch_job=None):
+    """Run one chain over every line of `path` (one technology/topic per line)"""
+    chain = build_chains(make_llm())[chain_name]
+    prompt = chain.first
+    # Each chain takes a single variable (technology, topic, question, subject)
+    input_key = prompt.input_variables[0]
+
+    with open(path, encoding="utf-8") as f:
+        inputs = [{input_key: line.strip()} for line in f if line.strip()]
+
+    # Pre-flight: reject oversized prompts and price the job before sending anything
+    if max_prompt_tokens:
+        kept = []
+        for item in inputs:
+            if count_prompt_tokens(prompt, **item) > max_prompt_tokens:
+                print(f"⛔ Skipping '{item[input_key][:40]}': prompt over {max_prompt_tokens} tokens")
+            else:
+                kept.append(item)
+        inputs = kept
+
+    projection = project_cost(prompt.format_prompt(**item) for item in inputs)
+    cost = projection.total_cost
+    print(f"💰 Projected cost ({projection.model}): {projection.requests} requests, "
+          f"{projection.input_tokens} input + ~{projection.output_tokens} output tokens "
+          f"= {f'${cost:.4f}' if cost is not None else 'n/a (add the model to settings.MODEL_PRICES)'}")
+    if batch_job and cost is not None:
+        print(f"💸 At batch-endpoint prices: ${cost * settings.BATCH_DISCOUNT:.4f}")
+    if dry_run:
+        return projection
+
+    if batch_job:
+        return batch_job_main(chain_name, chain, inputs, input_key, batch_job)
+
+    print(f"🚀 Batch: {len(inputs)} inputs through '{chain_name}' (max_concurrency={max_concurrency})")
+    if use_async:
+        report = asyncio.run(arun_batch(chain, inputs, max_concurrency))
+    else:
+        report = run_batch(chain, inputs, max_concurrency)
+
+    for item, result in zip(inputs, report.results):
+        status = "❌" if isinstance(result, Exception) else "✅"
+        print(f"{status} {item[input_key]}: {result}")
+    print_summary(report, chain_name)
+
+    limiter = get_rate_limiter(settings.OPENAI_MODEL)
+    if limiter:
+        print(f"🚦 Rate limiter: {limiter.summary()}")
+    if settings.COALESCE_ENABLED:
+        # Repeated inputs in flight together shared one upstream call
+        print(f"🔗 Coalescing: {coalesce_stats.summary()}")
+    return report
+
+
+def batch_job_main(chain_name, chain, inputs, input_key, backend_name):
+    """Send the inputs as one provider batch job; rerun the same command to resume"""
+    # Batch request files carry plain prompts, so native chains send their text version
+    job = BatchJob(chain_name, getattr(chain, "text", chain), get_batch_backend(backend_name))
+    print(f"📨 Batch job '{chain_name}' via {backend_name} (files in {job.workdir})")
+
+    def progress(status):
+        print(f"  ⏳ {status['status']}: {status['completed']}/{status['total']} done, {status['failed']} failed")
+
+    for record in job.run(inputs, on_progress=progress):
+        status = "❌" if record["error"] else "✅"
+        print(f"{status} {record['input'][input_key]}: {record['error'] or record['output']}")
+
+    results = job.results()
+    failed = sum(1 for record in results if record["error"])
+    print(f"\n📊 Batch job: {len(results)} results ({len(results) - failed} ok, {failed} failed) "
+          f"in {job.results_path}")
+    return results
+
+
+def stream_main(chain_name, path, output=None, max_concurrency=8):
+    """Stream `path` (JSONL/CSV/text, any size) through one chain; rerun the same command to resume"""
+    chain = build_chains(make_llm())[chain_name]
+    input_key = chain.first.input_variables[0]
+    output = output or os.path.join(settings.BATCH_DIR, f"{chain_name}.stream.jsonl")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    runner = BulkRunner(chain, output, name=chain_name, max_concurrency=max_concurrency)
+    print(f"🌊 Streaming '{path}' through '{chain_name}' (max_concurrency={max_concurrency}) -> {output}")
+
+    def progress(stats):
+        print(f"  💾 checkpoint: {stats.processed} done this run ({stats.failed} failed), "
+              f"{stats.skipped} from earlier runs")
+
+    stats = runner.run(read_records(path, input_key), source=os.path.abspath(path), on_checkpoint=progress)
+    print_bulk_summary(stats, runner)
+    return stats
+
+
+def profile_main(chain_name, runs, path=None, memory=False):
+    """Invoke one chain `runs` times and show where the time goes, step by step"""
+    chain = build_chains(make_llm())[chain_name]
+    input_key = chain.first.input_variables[0]
+    # Inputs from --batch FILE, or a few varied samples so the response cache doesn't answer everything
+    samples = list(read_records(path, input_key)) if path else [
+        {input_key: f"{tech} ({i})"} for i, tech in enumerate(["React", "Python", "Docker", "Rust"] * runs)
+    ]
+    print(f"🔬 Profiling '{chain_name}': {runs} invocations{' (with allocations)' if memory else ''}")
+
+    profiler = ChainProfiler(memory=memory)
+    with profiler:
+        for item in samples[:runs]:
+            try:
+                chain.invoke(item)
+            except Exception as e:
+                print(f"  ❌ {item[input_key]}: {type(e).__name__}: {e}")
+
+    print(f"\n📊 Step profile (mean per invocation):")
+    for line in profiler.report():
+        print(f"  {line}")
+    folded = profiler.write_folded(os.path.join(settings.PROFILE_DIR, f"{chain_name}.folded"))
+    print(f"\n🔥 Flame graph input: {folded}  (flamegraph.pl {os.path.basename(folded)} > profile.svg, "
+          f"or open it in speedscope.app)")
+    return profiler
+
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--batch", metavar="FILE", help="run one chain over every line of FILE")
+    parser.add_argument("--chain", default="analysis",
+                        choices=["analysis", "list", "json", "pydantic", "structured", "regex", "enum", "fixing",
+                                 "pydantic_native", "enum_native", "structured_native"])
+    parser.add_argument("--max-concurrency", type=int, default=8)
+    parser.add_argument("--async", dest="use_async", action="store_true", help="use abatch instead of batch")
+    parser.add_argument("--dry-run", action="store_true", help="only project tokens and cost, send nothing")
+    parser.add_argument("--max-prompt-tokens", type=int, help="skip inputs whose prompt is larger than this")
+    parser.add_argument("--batch-job", choices=["openai", "local"],
+                        help="send --batch through a discounted batch endpoint (local = offline stand-in)")
+    parser.add_argument("--stream", metavar="FILE",
+                        help="stream a JSONL/CSV/text file of any size through one chain, with checkpoint/resume")
+    parser.add_argument("--output", metavar="FILE", help="results JSONL for --stream")
+    parser.add_argument("--profile", type=int, metavar="N",
+                        help="invoke --chain N times and print a per-step time breakdown (inputs from --batch FILE)")
+    parser.add_argument("--profile-memory", action="store_true", help="also trace allocations per step (slower)")
+    args = parser.parse_args()
+
+    if args.profile:
+        profile_main(args.chain, args.profile, args.batch, args.profile_memory)
+    elif args.stream:
+        stream_main(args.chain, args.stream, args.output, args.max_concurrency)
+    elif args.batch:
+        batch_main(args.chain, args.batch, args.max_concurrency, args.use_async,
+                   args.dry_run, args.max_prompt_tokens, args.batch_job)
+    else:
+        main()
\ No newline at end of file
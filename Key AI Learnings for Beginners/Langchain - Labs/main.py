@@ -1,5 +1,112 @@
+"""
+Langchain Labs Launcher
+Run any lab from one entry point, importing only what that lab needs.
+
+Nothing heavy is imported here: a lab module (and with it LangChain, the
+provider SDKs, pydantic, ...) is loaded only when that lab is run, so
+listing labs or starting a short-lived job pays for one task, not all five.
+
+    python main.py                      # list the labs
+    python main.py 4 --stream           # run a lab; everything after the number goes to the lab
+    python main.py 5 --batch topics.txt --chain json
+    python main.py --import-profile 4   # slowest imports of a lab, like -X importtime
+"""
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+LABS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "labs")
+
+# Lab number -> (module in labs/, what it shows)
+LABS = {
+    "1": ("task_1_openai_vs_langchain", "OpenAI SDK vs LangChain"),
+    "2": ("task_2_multi_model", "Multi-model support"),
+    "3": ("task_3_prompt_templates", "Prompt templates"),
+    "4": ("task_4_output_parsers", "Output parsers (--stream)"),
+    "5": ("task_5_complete_chain", "Complete chains (--batch FILE, --chain, --dry-run, ...)"),
+}
+
+_IMPORTTIME_RE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def list_labs():
+    print("🧪 Langchain Labs")
+    print("=" * 50)
+    for number, (module, title) in LABS.items():
+        print(f"  {number}. {title:<58} labs/{module}.py")
+    print("\nRun one with: python main.py <number> [lab options]")
+
+
+def run_lab(number, lab_args):
+    """Run labs/<module>.py exactly as `python labs/<module>.py lab_args` would"""
+    import runpy
+
+    module, _ = LABS[number]
+    path = os.path.join(LABS_DIR, f"{module}.py")
+    sys.argv = [path, *lab_args]
+    sys.path.insert(0, LABS_DIR)
+    runpy.run_path(path, run_name="__main__")
+
+
+def import_profile(number, top=15):
+    """Import one lab in a fresh interpreter under -X importtime and report the slowest imports"""
+    module, _ = LABS[number]
+    code = f"import sys; sys.path.insert(0, {LABS_DIR!r}); import {module}"
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                            capture_output=True, text=True)
+    wall = time.perf_counter() - start
+    if result.returncode != 0:
+        print(result.stderr.strip().splitlines()[-1])
+        sys.exit(result.returncode)
+
+    imports = []  # (self_us, cumulative_us, depth, name)
+    for line in result.stderr.splitlines():
+        match = _IMPORTTIME_RE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            imports.append((int(self_us), int(cumulative_us), len(indent) // 2, name))
+
+    total = next((cumulative for _, cumulative, _, name in imports if name == module), 0)
+    by_package = defaultdict(int)
+    for self_us, _, _, name in imports:
+        by_package[name.split(".")[0]] += self_us
+
+    print(f"⏱️ Import profile: labs/{module}.py")
+    print("=" * 60)
+    print(f"Interpreter start + imports: {wall * 1000:.0f} ms "
+          f"({total / 1000:.0f} ms importing {len(imports)} modules)")
+
+    print(f"\n🐢 Slowest imports (cumulative, includes what they import):")
+    for self_us, cumulative_us, depth, name in sorted(imports, key=lambda i: -i[1])[:top]:
+        print(f"  {cumulative_us / 1000:>8.1f} ms  {'  ' * min(depth, 6)}{name}")
+
+    print(f"\n📦 Time by top-level package (self time only):")
+    for package, self_us in sorted(by_package.items(), key=lambda p: -p[1])[:top]:
+        print(f"  {self_us / 1000:>8.1f} ms  {package}")
+
+
 def main():
-    print("Hello from Langchain-labs!")
+    parser = argparse.ArgumentParser(description="Run a Langchain lab, importing only what it needs")
+    parser.add_argument("lab", nargs="?", choices=list(LABS), help="lab number (omit to list the labs)")
+    parser.add_argument("--import-profile", action="store_true",
+                        help="report the lab's slowest imports instead of running it")
+    parser.add_argument("--top", type=int, default=15, help="rows in the import profile")
+    # Everything after the lab number is the lab's own, --help included
+    parser.add_argument("lab_args", nargs=argparse.REMAINDER, help="arguments passed on to the lab")
+    args = parser.parse_args()
+
+    if args.lab is None:
+        list_labs()
+    elif args.import_profile:
+        import_profile(args.lab, args.top)
+    else:
+        run_lab(args.lab, args.lab_args)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Circuit Breaker Benchmark
+A primary provider that stops answering for the middle third of the run (every
+call hangs past its deadline) with a healthy fallback behind it: per-request
+latency of the fallback chain without and with a circuit breaker on the
+primary, and how soon traffic returns once the primary recovers.
+
+    python scripts/bench_breaker.py --requests 300 --timeout 0.1
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(PROJECT_ROOT)
+
+from langchain_openai import ChatOpenAI
+
+from core.circuit_breaker import CircuitBreaker, CircuitOpenError
+from core.mock_transport import FakeOpenAITransport, mock_clients
+
+
+def mock_llm(model, transport):
+    http_client, async_http_client = mock_clients(transport)
+    return ChatOpenAI(model=model, api_key="mock", max_retries=0,
+                      http_client=http_client, http_async_client=async_http_client)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[2])
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--timeout", type=float, default=0.1, help="deadline per attempt (s)")
+    parser.add_argument("--open-seconds", type=float, default=0.5, help="wait before a recovery probe (s)")
+    args = parser.parse_args()
+
+    outage = range(args.requests // 3, 2 * args.requests // 3)
+    down = {"now": False}
+    primary = mock_llm("gemini-2.5-flash", FakeOpenAITransport(
+        latency=lambda: args.timeout * 3 if down["now"] else 0.01 * random.uniform(0.8, 1.2)))
+    fallback = mock_llm("gpt-4.1-mini", FakeOpenAITransport(latency=lambda: 0.02 * random.uniform(0.8, 1.2)))
+
+    print("🔌 Circuit Breaker Benchmark")
+    print("=" * 78)
+    print(f"Primary down for requests {outage.start}-{outage.stop - 1} of {args.requests}; "
+          f"{args.timeout * 1000:.0f} ms deadline per attempt")
+    print(f"{'strategy':<22}{'avg ms':>9}{'outage avg':>12}{'p99 ms':>9}{'timeouts':>10}{'primary after':>15}")
+
+    def run(strategy, breaker):
+        latencies, timeouts, back = [], 0, None
+        for i in range(args.requests):
+            down["now"] = i in outage
+            start = time.perf_counter()
+            try:
+                breaker.call(lambda: primary.invoke(f"Question {i}"), args.timeout)
+                if i >= outage.stop and back is None:
+                    back = i - outage.stop + 1
+            except CircuitOpenError:
+                fallback.invoke(f"Question {i}")
+            except Exception:
+                timeouts += 1
+                fallback.invoke(f"Question {i}")
+            latencies.append(time.perf_counter() - start)
+        in_outage = [latencies[i] for i in outage]
+        ordered = sorted(latencies)
+        print(f"{strategy:<22}{sum(latencies) / len(latencies) * 1000:>9.1f}"
+              f"{sum(in_outage) / len(in_outage) * 1000:>12.1f}{ordered[int(len(ordered) * 0.99)] * 1000:>9.1f}"
+              f"{timeouts:>10}{(f'{back} requests' if back else 'never'):>15}")
+        return breaker
+
+    # A breaker that can never trip is a plain fallback chain
+    run("fallback only", CircuitBreaker("primary", failure_streak=10**9, failure_rate=2.0))
+    breaker = run("breaker + fallback", CircuitBreaker("primary", open_seconds=args.open_seconds))
+    print(f"\n{breaker.summary()}")
+
+
+if __name__ == "__main__":
+    main()
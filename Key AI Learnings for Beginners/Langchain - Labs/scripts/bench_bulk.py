@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Bulk Runner Benchmark
+Peak memory of the task_5 analysis chain over growing input files, loaded
+into a list for core.batch versus streamed through core.bulk, against a mock
+endpoint (run time of the async list + abatch path alongside, the fair
+comparison for the event-loop based stream). Then a run is killed half way and resumed, and the output is
+checked to hold every record exactly once.
+
+    python scripts/bench_bulk.py --rows 500 2000 --latency 0.002
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(PROJECT_ROOT)
+sys.path.append(os.path.join(PROJECT_ROOT, 'labs'))
+
+from langchain_openai import ChatOpenAI
+
+from core.batch import arun_batch, run_batch
+from core.bulk import BulkRunner, read_records
+from core.mock_transport import FakeOpenAITransport, mock_clients
+from task_5_complete_chain import build_chains
+
+
+def write_input(path, rows):
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(rows):
+            f.write(json.dumps({"technology": f"Technology #{i}"}) + "\n")
+
+
+def peak_mb(run):
+    tracemalloc.start()
+    start = time.perf_counter()
+    run()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak / 1e6, elapsed
+
+
+async def crash_after(runner, path, seconds):
+    task = asyncio.create_task(runner.arun(read_records(path, "technology"), source=path))
+    await asyncio.sleep(seconds)
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[2])
+    parser.add_argument("--rows", type=int, nargs="+", default=[500, 2000], help="input sizes to compare")
+    parser.add_argument("--latency", type=float, default=0.002, help="seconds per mock request")
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+
+    transport = FakeOpenAITransport(latency=args.latency)
+    http_client, async_http_client = mock_clients(transport)
+    llm = ChatOpenAI(model="gpt-4.1-mini", api_key="mock", max_retries=0,
+                     http_client=http_client, http_async_client=async_http_client)
+    chain = build_chains(llm)["analysis"]
+    workdir = tempfile.mkdtemp(prefix="bench_bulk_")
+
+    print("🌊 Bulk Runner Benchmark")
+    print("=" * 78)
+    print(f"{'rows':>8}{'list + batch MB':>18}{'s':>8}{'abatch s':>10}{'stream MB':>12}{'s':>8}")
+    for rows in args.rows:
+        path = os.path.join(workdir, f"input_{rows}.jsonl")
+        write_input(path, rows)
+
+        def listed(run=lambda inputs: run_batch(chain, inputs, args.concurrency)):
+            inputs = list(read_records(path, "technology"))
+            report = run(inputs)
+            with open(os.path.join(workdir, f"listed_{rows}.jsonl"), "w", encoding="utf-8") as f:
+                for item, result in zip(inputs, report.results):
+                    f.write(json.dumps({"input": item, "output": str(result)}) + "\n")
+
+        runner = BulkRunner(chain, os.path.join(workdir, f"streamed_{rows}.jsonl"), name="analysis",
+                            max_concurrency=args.concurrency)
+        list_mb, list_s = peak_mb(listed)
+        _, async_s = peak_mb(lambda: listed(lambda inputs: asyncio.run(arun_batch(chain, inputs, args.concurrency))))
+        stream_mb, stream_s = peak_mb(lambda: runner.run(read_records(path, "technology"), source=path))
+        print(f"{rows:>8}{list_mb:>18.2f}{list_s:>8.2f}{async_s:>10.2f}{stream_mb:>12.2f}{stream_s:>8.2f}")
+
+    # Kill a run part way, then resume it
+    rows = args.rows[-1]
+    path = os.path.join(workdir, f"input_{rows}.jsonl")
+    output = os.path.join(workdir, "resumed.jsonl")
+    runner = BulkRunner(chain, output, name="analysis", max_concurrency=args.concurrency)
+    asyncio.run(crash_after(runner, path, list_s / 3))
+    with open(output, encoding="utf-8") as f:
+        before = sum(1 for _ in f)
+    stats = BulkRunner(chain, output, name="analysis", max_concurrency=args.concurrency).run(
+        read_records(path, "technology"), source=path)
+    with open(output, encoding="utf-8") as f:
+        indices = [json.loads(line)["index"] for line in f]
+    exact = sorted(indices) == list(range(rows))
+    print(f"\n💥 Killed after {before} of {rows} results; resume skipped {stats.skipped}, "
+          f"processed {stats.processed}")
+    print(f"{'✅' if exact else '❌'} Output holds {len(indices)} lines, "
+          f"{'each record exactly once' if exact else 'with gaps or duplicates'}")
+
+
+if __name__ == "__main__":
+    main()
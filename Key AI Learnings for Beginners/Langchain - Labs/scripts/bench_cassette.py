@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Cassette Replay Benchmark
+Records a set of distinct chat completions (plain and streamed) from a mock
+endpoint into a cassette, then replays them with no network: calls per second
+at the transport, through the raw openai SDK and through ChatOpenAI, and a
+check that every replayed response matches its recording.
+
+    python scripts/bench_cassette.py --requests 2000 --calls 50000
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(PROJECT_ROOT)
+
+import httpx
+import openai
+from langchain_openai import ChatOpenAI
+
+from core.cassette import Cassette, CassetteTransport
+from core.mock_transport import FakeOpenAITransport
+
+
+def request_body(i, stream=False):
+    body = {"model": "gpt-4.1-mini", "messages": [{"role": "user", "content": f"Explain technology #{i}"}]}
+    if stream:
+        body.update(stream=True, stream_options={"include_usage": True})
+    return body
+
+
+def rate(calls, run):
+    start = time.perf_counter()
+    run()
+    elapsed = time.perf_counter() - start
+    return calls / elapsed, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[2])
+    parser.add_argument("--requests", type=int, default=2000, help="distinct requests to record")
+    parser.add_argument("--calls", type=int, default=50_000, help="replayed calls at the transport")
+    parser.add_argument("--sdk-calls", type=int, default=5000, help="replayed calls through the SDKs")
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(prefix="bench_cassette_"), "cassette.sqlite")
+    cassette = Cassette(path)
+
+    # Record - through the raw SDK, and through ChatOpenAI, which sends a different body
+    recording = httpx.Client(transport=CassetteTransport(FakeOpenAITransport(), cassette, "record"))
+    recorder = openai.OpenAI(api_key="mock", max_retries=0, http_client=recording)
+    recorder_llm = ChatOpenAI(model="gpt-4.1-mini", api_key="mock", max_retries=0, http_client=recording)
+    recorded, recorded_llm = {}, {}
+    start = time.perf_counter()
+    for i in range(args.requests):
+        if i % 10 == 0:
+            chunks = list(recorder.chat.completions.create(**request_body(i, stream=True)))
+            recorded[i] = "".join(c.choices[0].delta.content or "" for c in chunks if c.choices)
+        else:
+            recorded[i] = recorder.chat.completions.create(**request_body(i)).choices[0].message.content
+            recorded_llm[i] = recorder_llm.invoke(f"Explain technology #{i}").content
+    record_s = time.perf_counter() - start
+
+    print("📼 Cassette Replay Benchmark")
+    print("=" * 78)
+    print(f"Recorded {len(cassette)} responses ({(args.requests + 9) // 10} streamed) in {record_s:.2f}s, "
+          f"{os.path.getsize(path) / 1024:.0f} KB on disk")
+
+    # Replay: nothing below touches the network
+    transport = CassetteTransport(None, cassette, "replay")
+    requests = [httpx.Request("POST", "https://api.openai.com/v1/chat/completions",
+                              content=json.dumps(request_body(i, stream=i % 10 == 0)).encode("utf-8"))
+                for i in range(args.requests)]
+    load_s = rate(1, lambda: transport.handle_request(requests[0]))[1]
+
+    def replay_transport():
+        for n in range(args.calls):
+            transport.handle_request(requests[n % args.requests]).read()
+
+    per_s, elapsed = rate(args.calls, replay_transport)
+    print(f"{'transport':<12}{args.calls:>8} calls in {elapsed:6.2f}s  {per_s:>10,.0f} calls/s "
+          f"(first lookup, loading the cassette: {load_s * 1000:.1f} ms)")
+
+    client = openai.OpenAI(api_key="mock", max_retries=0, http_client=httpx.Client(transport=transport))
+    mismatches = 0
+
+    def replay_sdk():
+        nonlocal mismatches
+        for n in range(args.sdk_calls):
+            i = n % args.requests
+            if i % 10 == 0:
+                chunks = client.chat.completions.create(**request_body(i, stream=True))
+                content = "".join(c.choices[0].delta.content or "" for c in chunks if c.choices)
+            else:
+                content = client.chat.completions.create(**request_body(i)).choices[0].message.content
+            mismatches += content != recorded[i]
+
+    per_s, elapsed = rate(args.sdk_calls, replay_sdk)
+    print(f"{'openai SDK':<12}{args.sdk_calls:>8} calls in {elapsed:6.2f}s  {per_s:>10,.0f} calls/s")
+
+    llm = ChatOpenAI(model="gpt-4.1-mini", api_key="mock", max_retries=0,
+                     http_client=httpx.Client(transport=transport))
+
+    def replay_langchain():
+        nonlocal mismatches
+        for n in range(args.sdk_calls):
+            i = n % args.requests
+            if i % 10:
+                mismatches += llm.invoke(f"Explain technology #{i}").content != recorded_llm[i]
+
+    calls = sum(1 for n in range(args.sdk_calls) if n % args.requests % 10)
+    per_s, elapsed = rate(calls, replay_langchain)
+    print(f"{'ChatOpenAI':<12}{calls:>8} calls in {elapsed:6.2f}s  {per_s:>10,.0f} calls/s")
+
+    print(f"\n{'✅' if not mismatches and not cassette.misses else '❌'} {cassette.summary()}; "
+          f"{mismatches} responses differed from their recording")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Hedged Requests Benchmark
+Tail latency of chat completion calls against a mock endpoint with a heavy
+tail (most answers are fast, a few are very slow), without and with hedging.
+
+    python scripts/bench_hedging.py --calls 400 --slow-rate 0.03
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+
+from openai import AsyncOpenAI, OpenAI
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.hedging import Hedger, LatencyTracker
+from core.mock_transport import FakeOpenAITransport, mock_clients
+
+MESSAGES = [{"role": "user", "content": "Explain machine learning in one sentence"}]
+
+
+def heavy_tail(fast, slow, slow_rate):
+    """Latency sampler: `fast` +-20% jitter, but `slow` for a slow_rate share of requests"""
+    def sample():
+        return slow if random.random() < slow_rate else fast * random.uniform(0.8, 1.2)
+    return sample
+
+
+def run_sync(hedger, client, calls):
+    for _ in range(calls):
+        hedger.call(lambda: client.chat.completions.create(model="gpt-4.1-mini", messages=MESSAGES))
+
+
+async def run_async(hedger, client, calls, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            await hedger.acall(lambda: client.chat.completions.create(model="gpt-4.1-mini", messages=MESSAGES))
+    await asyncio.gather(*(one() for _ in range(calls)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[2])
+    parser.add_argument("--calls", type=int, default=400)
+    parser.add_argument("--fast", type=float, default=0.010, help="usual latency in seconds")
+    parser.add_argument("--slow", type=float, default=0.300, help="tail latency in seconds")
+    parser.add_argument("--slow-rate", type=float, default=0.03, help="share of slow requests")
+    parser.add_argument("--max-extra-load", type=float, default=0.05)
+    parser.add_argument("--concurrency", type=int, default=8, help="in-flight calls in the async run")
+    args = parser.parse_args()
+
+    random.seed(7)
+    transport = FakeOpenAITransport(latency=heavy_tail(args.fast, args.slow, args.slow_rate))
+    http_client, async_http_client = mock_clients(transport)
+    client = OpenAI(api_key="mock", http_client=http_client, max_retries=0)
+    async_client = AsyncOpenAI(api_key="mock", http_client=async_http_client, max_retries=0)
+
+    print("⏱️ Hedged Requests Benchmark")
+    print("=" * 60)
+    print(f"{args.calls} calls per run, {args.fast * 1000:.0f} ms usual / {args.slow * 1000:.0f} ms "
+          f"for {args.slow_rate:.0%} of requests, hedge budget {args.max_extra_load:.0%}")
+
+    runs = (("sync", lambda h: run_sync(h, client, args.calls)),
+            ("async", lambda h: asyncio.run(run_async(h, async_client, args.calls, args.concurrency))))
+    for label, run in runs:
+        print(f"\n{label}:")
+        # Same traffic twice: hedging off (no budget), then on
+        for name, budget in (("without hedging", 0.0), ("with hedging", args.max_extra_load)):
+            hedger = Hedger("gpt-4.1-mini", tracker=LatencyTracker(), max_extra_load=budget)
+            before = transport.requests
+            run(hedger)
+            s = hedger.stats()
+            print(f"  {name:<16} p50 {s['p50'] * 1000:6.1f} ms  p99 {s['p99'] * 1000:6.1f} ms  "
+                  f"{transport.requests - before} requests ({s['extra_load']:.1%} extra, "
+                  f"{s['hedge_wins']} hedges won)  timeout {s['timeout']:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
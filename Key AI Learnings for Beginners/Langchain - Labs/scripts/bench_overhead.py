@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Overhead Benchmark: Raw OpenAI SDK vs LangChain
+Measures what ChatOpenAI and the output parsers add on top of
+client.chat.completions.create - with the network replaced by an in-process
+fake transport, so only our own CPU time is measured.
+
+For every case it records the per-call latency distribution, calls/s per
+CPU core and peak traced memory, and writes everything to a JSON file so
+runs can be compared for regressions:
+
+    python scripts/bench_overhead.py --output bench_results/overhead.json
+    python scripts/bench_overhead.py --compare bench_results/overhead.json
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from importlib import metadata
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(PROJECT_ROOT)
+sys.path.append(os.path.join(PROJECT_ROOT, 'labs'))
+
+import openai
+from langchain_openai import ChatOpenAI
+
+from core.mock_transport import FakeOpenAITransport, mock_clients
+
+MODEL = "gpt-4.1-mini"
+PROMPT = "Explain machine learning in one sentence"
+
+# Inputs for each prompt | llm | parser chain from task_4
+CHAIN_INPUTS = {
+    "str": {"technology": "Blockchain"},
+    "list": {"technology": "Blockchain"},
+    "json": {"topic": "Python Programming"},
+    "pydantic": {"technology": "React"},
+    "structured": {"question": "What is the capital of France?"},
+    "regex": {"topic": "AI Safety"},
+    "enum": {"subject": "Quantum Physics"},
+}
+
+
+def build_cases():
+    """Every code path to measure, as name -> zero-argument callable"""
+    http_client, http_async_client = mock_clients(FakeOpenAITransport())
+    client = openai.OpenAI(api_key="mock", base_url="http://mock/v1", http_client=http_client)
+    llm = ChatOpenAI(
+        model=MODEL, api_key="mock", base_url="http://mock/v1", temperature=0.3,
+        http_client=http_client, http_async_client=http_async_client,
+    )
+
+    cases = {
+        "raw_sdk": lambda: client.chat.completions.create(
+            model=MODEL, messages=[{"role": "user", "content": PROMPT}], temperature=0.3
+        ).choices[0].message.content,
+        "chat_openai": lambda: llm.invoke(PROMPT).content,
+    }
+
+    from task_4_output_parsers import build_chains
+    chains = build_chains(llm)
+    for name, inputs in CHAIN_INPUTS.items():
+        cases[f"chain_{name}"] = lambda chain=chains[name], inputs=inputs: chain.invoke(inputs)
+    return cases
+
+
+def percentile(sorted_values, pct):
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def measure(fn, iterations, warmup):
+    """Latency distribution, CPU throughput and peak memory for one case"""
+    for _ in range(warmup):
+        fn()
+
+    gc.collect()
+    latencies = []
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - start)
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+
+    # Memory is traced in a separate, shorter pass - tracing slows every allocation
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    for _ in range(max(1, iterations // 10)):
+        fn()
+    after = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    allocated = sum(stat.size_diff for stat in after.compare_to(before, "filename") if stat.size_diff > 0)
+
+    latencies.sort()
+    return {
+        "iterations": iterations,
+        "mean_us": statistics.fmean(latencies) * 1e6,
+        "p50_us": percentile(latencies, 50) * 1e6,
+        "p90_us": percentile(latencies, 90) * 1e6,
+        "p99_us": percentile(latencies, 99) * 1e6,
+        "max_us": latencies[-1] * 1e6,
+        "calls_per_s_wall": iterations / wall,
+        "calls_per_s_per_core": iterations / cpu if cpu else 0.0,
+        "peak_traced_kib": peak / 1024,
+        "retained_kib": allocated / 1024,
+    }
+
+
+def environment():
+    versions = {}
+    for package in ("openai", "httpx", "langchain-core", "langchain-openai", "pydantic"):
+        try:
+            versions[package] = metadata.version(package)
+        except metadata.PackageNotFoundError:
+            versions[package] = None
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "packages": versions,
+    }
+
+
+def print_table(results):
+    baseline = results["raw_sdk"]["p50_us"]
+    print(f"\n{'case':<18}{'p50 µs':>10}{'p99 µs':>10}{'calls/s/core':>14}{'peak KiB':>10}{'vs raw':>9}")
+    print("-" * 71)
+    for name, r in results.items():
+        print(f"{name:<18}{r['p50_us']:>10.0f}{r['p99_us']:>10.0f}{r['calls_per_s_per_core']:>14.0f}"
+              f"{r['peak_traced_kib']:>10.0f}{r['p50_us'] / baseline:>8.1f}x")
+
+
+def compare(results, baseline_path, tolerance):
+    """Return the cases whose p50 got slower than the baseline by more than `tolerance`"""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)["results"]
+    regressions = []
+    for name, r in results.items():
+        if name in baseline:
+            ratio = r["p50_us"] / baseline[name]["p50_us"]
+            if ratio > 1 + tolerance:
+                regressions.append((name, ratio))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Raw SDK vs LangChain per-call overhead")
+    parser.add_argument("--iterations", type=int, default=500)
+    parser.add_argument("--warmup", type=int, default=50)
+    parser.add_argument("--cases", nargs="*", help="only run these cases")
+    parser.add_argument("--output", default=os.path.join(PROJECT_ROOT, "bench_results", "overhead.json"))
+    parser.add_argument("--compare", metavar="BASELINE", help="fail if p50 regressed against this file")
+    parser.add_argument("--tolerance", type=float, default=0.20, help="allowed p50 slowdown (0.20 = 20%%)")
+    args = parser.parse_args()
+
+    print("⏱️ Overhead Benchmark: Raw SDK vs LangChain (mock transport)")
+    print("=" * 60)
+
+    cases = build_cases()
+    results = {}
+    for name, fn in cases.items():
+        if args.cases and name not in args.cases:
+            continue
+        print(f"  running {name}...")
+        results[name] = measure(fn, args.iterations, args.warmup)
+
+    if "raw_sdk" in results:
+        print_table(results)
+
+    regressions = compare(results, args.compare, args.tolerance) if args.compare else []
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump({"environment": environment(), "results": results}, f, indent=2)
+    print(f"\n📄 Results written to {args.output}")
+
+    if regressions:
+        for name, ratio in regressions:
+            print(f"❌ {name}: p50 is {ratio:.2f}x the baseline")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Prompt Packing Benchmark
+The task_4 difficulty (enum) chain over many subjects against a mock endpoint
+with per-request latency: one request per item, packed batches, and
+micro-batched single invoke() calls from many threads.
+
+    python scripts/bench_packing.py --items 200 --latency 0.05
+    python scripts/bench_packing.py --drop-rate 0.1   # some packed answers missing -> fallbacks
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(PROJECT_ROOT)
+sys.path.append(os.path.join(PROJECT_ROOT, 'labs'))
+
+from langchain_core.callbacks import UsageMetadataCallbackHandler
+from langchain_openai import ChatOpenAI
+
+from core.mock_transport import FakeOpenAITransport, canned_lab_response, mock_clients
+from task_4_output_parsers import build_chains, build_packers
+
+SUBJECTS = ["Quantum Physics", "HTML", "Rust", "Statistics", "Cooking", "Chess", "Calculus", "Docker"]
+
+
+def dropping_responder(drop_rate):
+    """canned_lab_response, but packed replies lose each item with probability drop_rate"""
+    def respond(body):
+        answer = canned_lab_response(body)
+        if answer.startswith("[{") and drop_rate:
+            answer = json.dumps([item for item in json.loads(answer) if random.random() >= drop_rate])
+        return answer
+    return respond
+
+
+def prompt_tokens(handler):
+    return sum(usage.get("input_tokens", 0) for usage in handler.usage_metadata.values())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[2])
+    parser.add_argument("--items", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per mock request")
+    parser.add_argument("--concurrency", type=int, default=8, help="calls/packs in flight")
+    parser.add_argument("--drop-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    random.seed(7)
+    transport = FakeOpenAITransport(responder=dropping_responder(args.drop_rate), latency=args.latency)
+    http_client, async_http_client = mock_clients(transport)
+    llm = ChatOpenAI(model="gpt-4.1-mini", api_key="mock", max_retries=0,
+                     http_client=http_client, http_async_client=async_http_client)
+    chains = build_chains(llm)
+    inputs = [{"subject": f"{SUBJECTS[i % len(SUBJECTS)]} {i}"} for i in range(args.items)]
+
+    print("📦 Prompt Packing Benchmark")
+    print("=" * 72)
+    print(f"{args.items} items, {args.latency * 1000:.0f} ms per request, {args.concurrency} in flight")
+    print(f"\n{'mode':<22}{'wall s':>8}{'items/s':>9}{'requests':>10}{'prompt tok/item':>17}{'fallbacks':>11}")
+
+    def report(name, run, packer=None):
+        handler = UsageMetadataCallbackHandler()
+        before = transport.requests
+        start = time.perf_counter()
+        results = run(handler)
+        wall = time.perf_counter() - start
+        assert len(results) == args.items
+        tokens = prompt_tokens(packer.stats.usage) if packer else prompt_tokens(handler)
+        fallbacks = packer.stats.fallbacks if packer else "-"
+        print(f"{name:<22}{wall:>8.2f}{args.items / wall:>9.0f}{transport.requests - before:>10}"
+              f"{tokens / args.items:>17.1f}{fallbacks:>11}")
+
+    report("one call per item", lambda handler: chains["enum"].batch(
+        inputs, config={"max_concurrency": args.concurrency, "callbacks": [handler]}))
+
+    packer = build_packers(llm, chains)["enum"]
+    report(f"packed ({packer.max_items}/request)", lambda _: packer.batch(inputs), packer)
+
+    # Independent callers each asking for one item; the window groups them
+    packer = build_packers(llm, chains)["enum"]
+    with ThreadPoolExecutor(max_workers=64) as pool:
+        report(f"micro-batched {packer.window * 1000:.0f} ms",
+               lambda _: list(pool.map(packer.invoke, inputs)), packer)
+
+
+if __name__ == "__main__":
+    main()
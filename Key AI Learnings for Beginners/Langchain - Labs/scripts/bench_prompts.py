@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Prompt Formatting Microbenchmark
+CPU time per call spent building and formatting the task_4 / task_5 prompts,
+before (new PromptTemplate + fresh format instructions every time) and after
+(compiled once by core.prompt_registry, then reused).
+
+    python scripts/bench_prompts.py --iterations 2000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(PROJECT_ROOT)
+sys.path.append(os.path.join(PROJECT_ROOT, 'labs'))
+
+from langchain_classic.output_parsers import ResponseSchema, StructuredOutputParser
+from langchain_core.output_parsers import PydanticOutputParser
+from langchain_core.prompts import PromptTemplate
+from langchain_openai import ChatOpenAI
+
+from core.mock_transport import mock_clients
+from core.prompt_registry import prompt_registry
+
+TECH_INFO_TEMPLATE = "Provide details about {technology}.\n{format_instructions}"
+STRUCTURED_TEMPLATE = "Answer the user question as best as possible.\n{format_instructions}\n{question}"
+
+
+def cpu_per_call(fn, iterations):
+    """Mean CPU microseconds per call"""
+    for _ in range(min(50, iterations)):
+        fn()
+    start = time.process_time()
+    for _ in range(iterations):
+        fn()
+    return (time.process_time() - start) / iterations * 1e6
+
+
+def build_cases():
+    from task_4_output_parsers import TechInfo, build_chains
+
+    schemas = [
+        ResponseSchema(name="answer", description="answer to the user's question"),
+        ResponseSchema(name="source", description="source used to answer the user's question, should be a website"),
+    ]
+    pydantic_parser = PydanticOutputParser(pydantic_object=TechInfo)
+    structured_parser = StructuredOutputParser.from_response_schemas(schemas)
+
+    def rebuild_tech_info():
+        prompt = PromptTemplate(
+            template=TECH_INFO_TEMPLATE,
+            input_variables=["technology"],
+            partial_variables={"format_instructions": pydantic_parser.get_format_instructions()},
+        )
+        return prompt.format(technology="React")
+
+    def rebuild_structured():
+        prompt = PromptTemplate(
+            template=STRUCTURED_TEMPLATE,
+            input_variables=["question"],
+            partial_variables={"format_instructions": structured_parser.get_format_instructions()},
+        )
+        return prompt.format(question="What is the capital of France?")
+
+    prebuilt = PromptTemplate(
+        template=TECH_INFO_TEMPLATE,
+        input_variables=["technology"],
+        partial_variables={"format_instructions": pydantic_parser.get_format_instructions()},
+    )
+    tech_info = prompt_registry.compile("tech_info", TECH_INFO_TEMPLATE, parser=pydantic_parser)
+    prompt_registry.compile("answer_with_source", STRUCTURED_TEMPLATE, parser=structured_parser)
+
+    http_client, http_async_client = mock_clients()
+    llm = ChatOpenAI(model="gpt-4.1-mini", api_key="mock", base_url="http://mock/v1",
+                     http_client=http_client, http_async_client=http_async_client)
+
+    def cold_build_chains():
+        prompt_registry.clear()
+        return build_chains(llm)
+
+    # (name, before, after)
+    return [
+        ("tech_info: build + format", rebuild_tech_info,
+         lambda: prompt_registry.compile("tech_info", TECH_INFO_TEMPLATE).render(technology="React")),
+        ("structured: build + format", rebuild_structured,
+         lambda: prompt_registry.compile("answer_with_source", STRUCTURED_TEMPLATE).render(
+             question="What is the capital of France?")),
+        ("tech_info: format only", lambda: prebuilt.format(technology="React"),
+         lambda: tech_info.render(technology="React")),
+        ("tech_info: invoke (PromptValue)", lambda: prebuilt.invoke({"technology": "React"}),
+         lambda: tech_info.prompt.invoke({"technology": "React"})),
+        ("task_4 build_chains()", cold_build_chains, lambda: build_chains(llm)),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prompt build/format CPU cost, before and after the registry")
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    print("⏱️ Prompt Formatting: per-call CPU time")
+    print("=" * 70)
+    print(f"{'case':<34}{'before µs':>12}{'after µs':>12}{'speedup':>10}")
+    print("-" * 70)
+    for name, before, after in build_cases():
+        iterations = args.iterations // 10 if "build_chains" in name else args.iterations
+        before_us = cpu_per_call(before, iterations)
+        # The cold case clears the registry - compile it again before timing the warm path
+        after()
+        after_us = cpu_per_call(after, iterations)
+        print(f"{name:<34}{before_us:>12.1f}{after_us:>12.1f}{before_us / after_us:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
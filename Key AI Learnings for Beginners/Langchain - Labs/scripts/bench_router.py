@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Model Router Benchmark
+Average latency, cost and success rate of a mixed workload (easy tier-1
+questions and tier-2 explanations) against three mock models: everything sent
+to OPENAI_MODEL by hand, versus core.router picking per request. Half way
+through, the second tier-2 model degrades (slow answers and 503s) to show the
+router moving traffic away from it.
+
+    python scripts/bench_router.py --requests 300
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(PROJECT_ROOT)
+
+import httpx
+from langchain_openai import ChatOpenAI
+
+from core.hedging import LatencyTracker
+from core.mock_transport import FakeOpenAITransport, mock_clients
+from core.router import ModelRouter, Route
+from core.tokens import get_model_price
+
+EASY = "What does {n} stand for? Answer in a few words."
+HARD = ("Explain, for a backend team migrating service #{n}, how connection pooling, retries "
+        "with backoff and circuit breakers interact under partial outages. One paragraph.")
+
+
+class DegradingTransport(FakeOpenAITransport):
+    """Mock endpoint that turns slow and flaky once `degraded` is set."""
+
+    def __init__(self, latency, model):
+        super().__init__(latency=lambda: self._sample(latency), model=model)
+        self.degraded = False
+
+    def _sample(self, latency):
+        return latency * 10 if self.degraded else latency * random.uniform(0.8, 1.2)
+
+    def _respond(self, request):
+        if self.degraded and random.random() < 0.3:
+            return httpx.Response(503, json={"error": {"message": "overloaded", "type": "server_error"}})
+        return super()._respond(request)
+
+
+def mock_llm(model, transport):
+    http_client, async_http_client = mock_clients(transport)
+    return ChatOpenAI(model=model, api_key="mock", max_retries=0,
+                      http_client=http_client, http_async_client=async_http_client)
+
+
+def cost(model, message):
+    price = get_model_price(model)
+    usage = message.usage_metadata or {}
+    return usage.get("input_tokens", 0) / 1000 * price["input"] + usage.get("output_tokens", 0) / 1000 * price["output"]
+
+
+def workload(requests):
+    return [(2, HARD.format(n=n)) if n % 3 == 0 else (1, EASY.format(n=f"ACRONYM-{n}")) for n in range(requests)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[2])
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    gemini = DegradingTransport(0.05, "gemini-2.5-flash")
+    models = {
+        "gpt-4.1-mini": mock_llm("gpt-4.1-mini", FakeOpenAITransport(latency=lambda: 0.08 * random.uniform(0.8, 1.2))),
+        "gemini-2.5-flash": mock_llm("gemini-2.5-flash", gemini),
+        "gpt-4.1-nano": mock_llm("gpt-4.1-nano", FakeOpenAITransport(latency=lambda: 0.03 * random.uniform(0.8, 1.2))),
+    }
+    requests = workload(args.requests)
+
+    print("🧭 Model Router Benchmark")
+    print("=" * 78)
+    print(f"{'strategy':<26}{'requests':>9}{'success':>9}{'avg ms':>9}{'p95 ms':>9}{'$ / request':>14}")
+
+    def run(strategy, call):
+        gemini.degraded = False
+        latencies, costs, ok = [], [], 0
+        for i, (tier, prompt) in enumerate(requests):
+            gemini.degraded = i >= len(requests) // 2
+            start = time.perf_counter()
+            try:
+                model, message = call(tier, prompt)
+                ok += 1
+                costs.append(cost(model, message))
+            except Exception:
+                pass
+            latencies.append(time.perf_counter() - start)
+        latencies.sort()
+        print(f"{strategy:<26}{len(requests):>9}{ok / len(requests):>9.1%}"
+              f"{sum(latencies) / len(latencies) * 1000:>9.0f}{latencies[int(len(latencies) * 0.95)] * 1000:>9.0f}"
+              f"{sum(costs) / max(ok, 1):>14.6f}")
+
+    run("fixed: gpt-4.1-mini", lambda tier, prompt: ("gpt-4.1-mini", models["gpt-4.1-mini"].invoke(prompt)))
+
+    router = ModelRouter([Route("OpenAI", "gpt-4.1-mini", models["gpt-4.1-mini"]),
+                          Route("Google", "gemini-2.5-flash", models["gemini-2.5-flash"]),
+                          Route("OpenAI", "gpt-4.1-nano", models["gpt-4.1-nano"])],
+                         tracker=LatencyTracker(window=50, min_samples=5))
+    chains = {1: router.runnable(tier=1, name="easy"), 2: router.runnable(tier=2, name="explain")}
+
+    def routed(tier, prompt):
+        message = chains[tier].invoke(prompt)
+        return router.decisions[-1].route.split("/", 1)[1], message
+
+    run("router", routed)
+    print()
+    for line in router.report():
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
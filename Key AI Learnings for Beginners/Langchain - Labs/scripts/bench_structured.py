@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Structured Output Benchmark
+Format-instruction prompts + text parsers versus the native JSON-schema
+response format, for the TechInfo, Difficulty and answer/source chains of
+task_4, against a mock endpoint.
+
+Free-text answers are corrupted at --noise rate (chatty preamble, cut off),
+the way real models occasionally break format; schema-constrained answers
+are not. A third run points the native chains at a model that rejects
+response_format, to show the automatic fallback.
+
+    python scripts/bench_structured.py --calls 100 --noise 0.05
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+import warnings
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(PROJECT_ROOT)
+sys.path.append(os.path.join(PROJECT_ROOT, 'labs'))
+
+from langchain_core.callbacks import UsageMetadataCallbackHandler
+from langchain_openai import ChatOpenAI
+
+from core.mock_transport import FakeOpenAITransport, canned_lab_response, mock_clients
+from core.structured import structured_stats
+from task_4_output_parsers import build_chains
+
+CASES = {
+    "pydantic": {"technology": "React"},
+    "enum": {"subject": "Quantum Physics"},
+    "structured": {"question": "What is the capital of France?"},
+}
+
+
+def noisy_responder(noise):
+    """canned_lab_response, with free-text answers sometimes chatty and truncated"""
+    def respond(body):
+        answer = canned_lab_response(body)
+        if "response_format" not in body and random.random() < noise:
+            return "Sure! Here you go: " + answer[:len(answer) // 2]
+        return answer
+    return respond
+
+
+def make_llm(model, transport):
+    http_client, async_http_client = mock_clients(transport)
+    return ChatOpenAI(model=model, api_key="mock", max_retries=0,
+                      http_client=http_client, http_async_client=async_http_client)
+
+
+def measure(chain, inputs, calls, transport):
+    handler = UsageMetadataCallbackHandler()
+    before = transport.requests
+    latencies, failures = [], 0
+    for _ in range(calls):
+        start = time.perf_counter()
+        try:
+            chain.invoke(inputs, config={"callbacks": [handler]})
+        except Exception:
+            failures += 1
+        latencies.append(time.perf_counter() - start)
+    prompt_tokens = sum(usage.get("input_tokens", 0) for usage in handler.usage_metadata.values())
+    return {
+        "prompt_tokens": prompt_tokens / calls,
+        "failure_rate": failures / calls,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "requests": transport.requests - before,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[2])
+    parser.add_argument("--calls", type=int, default=100, help="calls per chain and mode")
+    parser.add_argument("--noise", type=float, default=0.05, help="share of malformed free-text answers")
+    parser.add_argument("--latency", type=float, default=0.01, help="seconds per mock request")
+    args = parser.parse_args()
+
+    random.seed(7)
+    # langchain-openai warns when a model rejects response_format; the fallback is the point here
+    warnings.filterwarnings("ignore", message="This model does not support OpenAI's structured output")
+    transport = FakeOpenAITransport(responder=noisy_responder(args.noise), latency=args.latency)
+    chains = build_chains(make_llm("gpt-4.1-mini", transport))
+    # A model that answers 400 to response_format: the native chains must fall back
+    legacy = FakeOpenAITransport(responder=noisy_responder(args.noise), latency=args.latency,
+                                 structured_output=False)
+    legacy_chains = build_chains(make_llm("gpt-4o", legacy))
+
+    print("🧩 Structured Output Benchmark")
+    print("=" * 78)
+    print(f"{args.calls} calls per row, {args.noise:.0%} malformed free-text answers, "
+          f"{args.latency * 1000:.0f} ms per request")
+    print(f"\n{'chain':<12}{'mode':<22}{'prompt tok':>11}{'parse fail':>12}{'p50 ms':>9}{'requests':>10}")
+    for name, inputs in CASES.items():
+        rows = (
+            ("format instructions", chains[name], transport),
+            ("native json_schema", chains[f"{name}_native"], transport),
+            ("native, unsupported", legacy_chains[f"{name}_native"], legacy),
+        )
+        for mode, chain, used in rows:
+            r = measure(chain, inputs, args.calls, used)
+            print(f"{name:<12}{mode:<22}{r['prompt_tokens']:>11.0f}{r['failure_rate']:>12.1%}"
+                  f"{r['p50_ms']:>9.1f}{r['requests']:>10}")
+    print(f"\n📊 {structured_stats.summary()}")
+
+
+if __name__ == "__main__":
+    main()
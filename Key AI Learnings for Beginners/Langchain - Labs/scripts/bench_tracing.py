@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Tracing Overhead Benchmark
+Cost of core.tracing on the hot path: the task_5 analysis chain against a
+zero-latency mock endpoint with and without the Tracer, and raw ring-buffer
+pushes from several threads while the background flush runs.
+
+    python scripts/bench_tracing.py --calls 500 --threads 4
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(PROJECT_ROOT)
+sys.path.append(os.path.join(PROJECT_ROOT, 'labs'))
+
+import httpx
+from langchain_openai import ChatOpenAI
+
+from core.mock_transport import FakeOpenAITransport, mock_clients
+from core.tracing import CallTrace, Tracer, TracingTransport
+from task_5_complete_chain import build_chains
+
+
+def per_call_us(chain, calls, config=None):
+    timings = []
+    for i in range(calls):
+        start = time.perf_counter()
+        chain.invoke({"technology": f"Technology {i}"}, config=config)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[2])
+    parser.add_argument("--calls", type=int, default=500)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--pushes", type=int, default=200_000, help="ring-buffer pushes per thread")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_tracing_")
+    tracer = Tracer()
+    tracer.start(os.path.join(workdir, "calls.jsonl"), interval=0.05)
+
+    http_client, async_http_client = mock_clients(FakeOpenAITransport())
+    chain = build_chains(ChatOpenAI(model="gpt-4.1-mini", api_key="mock", max_retries=0,
+                                    http_client=http_client, http_async_client=async_http_client))["analysis"]
+    traced_client = httpx.Client(transport=TracingTransport(FakeOpenAITransport(), tracer))
+    traced_chain = build_chains(ChatOpenAI(model="gpt-4.1-mini", api_key="mock", max_retries=0,
+                                           http_client=traced_client))["analysis"]
+
+    print("🛰️ Tracing Overhead Benchmark")
+    print("=" * 78)
+    per_call_us(chain, 20)  # warm up
+    plain = per_call_us(chain, args.calls)
+    traced = per_call_us(traced_chain, args.calls, config={"callbacks": [tracer]})
+    print(f"chain.invoke p50: {plain:.0f} µs untraced, {traced:.0f} µs traced "
+          f"(+{traced - plain:.0f} µs per call)")
+
+    sample = CallTrace(ts=time.time(), chain="analysis", template="pros_cons", model="gpt-4.1-mini", latency=0.5)
+
+    def push():
+        for _ in range(args.pushes):
+            tracer.buffer.push(sample)
+
+    threads = [threading.Thread(target=push) for _ in range(args.threads)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    total = args.pushes * args.threads
+    tracer.stop()
+    print(f"ring buffer: {total} pushes from {args.threads} threads in {elapsed:.2f}s "
+          f"({elapsed / total * 1e9:.0f} ns/push), {tracer.buffer.dropped} overwritten before the flush")
+    print(f"traced calls: {tracer.traced}, trace file: {os.path.join(workdir, 'calls.jsonl')}")
+
+
+if __name__ == "__main__":
+    main()